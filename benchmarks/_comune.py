@@ -0,0 +1,99 @@
+"""
+# _comune.py
+Utility condivise dagli script di benchmark.
+
+Ogni benchmark lavora su un database temporaneo, così da non toccare
+data/database.db.
+"""
+
+import sys
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Iterator, List, Tuple
+
+# Aggiungi la root del progetto al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.database.database_connection import (
+    DatabaseConfig, set_db_config, init_database, execute_query
+)
+from src.models.models import ContoFinanziario, Transazione, TipoFlusso
+from src.repositories.conto_repository import ContoRepository
+
+
+@contextmanager
+def database_temporaneo(pragma_profile: str = "safe") -> Iterator[str]:
+    """
+    Crea e inizializza un database temporaneo come database globale.
+    
+    Args:
+        pragma_profile: Profilo PRAGMA da applicare alle connessioni
+    
+    Yields:
+        Percorso del file database
+    """
+    directory = tempfile.mkdtemp(prefix="gestfin_bench_")
+    db_path = str(Path(directory) / "bench.db")
+    connessione = set_db_config(DatabaseConfig(db_path, pragma_profile=pragma_profile))
+    try:
+        init_database()
+        yield db_path
+    finally:
+        connessione.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def crea_conto_bench(nome: str = "Conto Benchmark") -> ContoFinanziario:
+    """Crea un conto di test con saldo iniziale."""
+    return ContoRepository().create(
+        ContoFinanziario(nome_conto=nome, saldo_iniziale=1000.0)
+    )
+
+
+def genera_transazioni(id_conto: int, numero: int,
+                       data_fine: date = date(2024, 12, 31)) -> List[Transazione]:
+    """
+    Genera transazioni sintetiche distribuite all'indietro da data_fine.
+    
+    Args:
+        id_conto: Conto a cui associare le transazioni
+        numero: Numero di transazioni da generare
+        data_fine: Data della transazione più recente
+    
+    Returns:
+        Lista di transazioni non ancora salvate
+    """
+    categorie = [r["id_categoria"] for r in execute_query(
+        "SELECT id_categoria FROM categoria_transazione ORDER BY id_categoria"
+    )]
+    transazioni = []
+    for i in range(numero):
+        importo = round(((i * 37) % 500) - 300.5, 2) or 1.0
+        transazioni.append(Transazione(
+            data=data_fine - timedelta(days=i % 3650),
+            importo=importo,
+            descrizione=f"Movimento sintetico {i}",
+            id_categoria=categorie[i % len(categorie)],
+            id_conto_finanziario=id_conto,
+            tipo_flusso=TipoFlusso.PERSONALE,
+            flag_deducibile_o_rilevante_fiscalmente=(i % 7 == 0)
+        ))
+    return transazioni
+
+
+def cronometra(funzione: Callable, ripetizioni: int = 1) -> Tuple[float, object]:
+    """
+    Esegue una funzione e ne misura il tempo medio.
+    
+    Returns:
+        Tupla (secondi medi per esecuzione, risultato dell'ultima esecuzione)
+    """
+    risultato = None
+    inizio = time.perf_counter()
+    for _ in range(ripetizioni):
+        risultato = funzione()
+    return (time.perf_counter() - inizio) / ripetizioni, risultato
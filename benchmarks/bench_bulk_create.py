@@ -0,0 +1,54 @@
+"""
+# bench_bulk_create.py
+Confronta l'inserimento riga per riga (create) con quello batch (create_many).
+
+Uso:
+    python benchmarks/bench_bulk_create.py [numero_transazioni]
+"""
+
+import sys
+
+from _comune import (
+    database_temporaneo, crea_conto_bench, genera_transazioni, cronometra
+)
+from src.database.database_connection import execute_query
+from src.repositories.transazione_repository import TransazioneRepository
+
+
+def esegui(modalita: str, numero: int) -> float:
+    """Inserisce numero transazioni su un database nuovo e restituisce i secondi."""
+    with database_temporaneo():
+        conto = crea_conto_bench()
+        transazioni = genera_transazioni(conto.id_conto, numero)
+        repo = TransazioneRepository()
+
+        if modalita == "create":
+            def importa():
+                for t in transazioni:
+                    repo.create(t)
+        else:
+            def importa():
+                repo.create_many(transazioni)
+
+        tempo, _ = cronometra(importa)
+        inserite = execute_query("SELECT COUNT(*) AS n FROM transazione")[0]["n"]
+        audit = execute_query(
+            "SELECT COUNT(*) AS n FROM audit_log WHERE tabella = 'transazione'"
+        )[0]["n"]
+        assert inserite == numero and audit == numero, (inserite, audit)
+        return tempo
+
+
+def main():
+    numero = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"Benchmark inserimento transazioni ({numero} righe)\n")
+    print(f"{'Modalità':12} {'Tempo (s)':>10} {'Righe/s':>10}")
+    tempi = {}
+    for modalita in ("create", "create_many"):
+        tempi[modalita] = esegui(modalita, numero)
+        print(f"{modalita:12} {tempi[modalita]:>10.3f} {numero / tempi[modalita]:>10.0f}")
+    print(f"\nSpeedup create_many: {tempi['create'] / tempi['create_many']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+# bench_parser.py
+Misura BPERParser.parse su un estratto conto sintetico di più pagine,
+con estrazione del testo sequenziale e in un pool di processi.
+
+Il PDF viene generato senza dipendenze esterne (testo Helvetica su pagine
+A4, nel formato della tabella movimenti BPER). Per ogni numero di processi
+riporta tempo, speedup e speedup per core, e verifica che il risultato sia
+identico a quello sequenziale. Confronta poi la memoria di picco di parse()
+e di iter_transazioni() su estratti di lunghezza diversa.
+
+Uso:
+    python benchmarks/bench_parser.py [numero_pagine] [righe_per_pagina]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+from _comune import cronometra
+from src.ingestion.bper_parser_improved import BPERParser
+
+DESCRIZIONI_USCITA = (
+    "PAGAMENTO POS SUPERMERCATO CONAD", "PAGAMENTO POS FARMACIA COMUNALE",
+    "ADDEBITO SDD ITALIA POWER LUCE", "PREL. ATM CIRCUITO BANCOMAT",
+    "PAGAMENTO POS BAR CENTRALE", "ADDEBITO PAYPAL EUROPE",
+)
+DESCRIZIONI_ENTRATA = (
+    "BONIFICO SEPA DA DATORE DI LAVORO STIPENDIO",
+    "BONIFICO SEPA AFFITTO APPARTAMENTO VIA ROMA",
+)
+
+
+def _importo(valore: float) -> str:
+    """Formatta un importo all'italiana: 1.234,56."""
+    return f"{valore:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _righe_pagine(numero_pagine: int, righe_per_pagina: int):
+    """Restituisce le righe di testo di ogni pagina dell'estratto sintetico."""
+    inizio = date(2024, 1, 1)
+    pagine = []
+    progressivo = 0
+    for p in range(numero_pagine):
+        righe = [f"Estratto conto sintetico - pagina {p + 1} di {numero_pagine}"]
+        if p == 0:
+            righe += [
+                "IBAN IT 60 X 05428 11101 000000123456",
+                "Filiale ROMA-CENTRO",
+                "Saldo iniziale al 01/01/2024 1.000,00 €",
+            ]
+        righe.append("DATA VALUTA USCITE ENTRATE DESCRIZIONE")
+        for _ in range(righe_per_pagina):
+            giorno = (inizio + timedelta(days=progressivo * 365 // (numero_pagine * righe_per_pagina))).strftime("%d/%m/%y")
+            if progressivo % 7 == 0:
+                descrizione = DESCRIZIONI_ENTRATA[progressivo % len(DESCRIZIONI_ENTRATA)]
+                righe.append(f"{giorno} {giorno} {descrizione} {_importo(800 + progressivo % 900)}")
+            else:
+                descrizione = DESCRIZIONI_USCITA[progressivo % len(DESCRIZIONI_USCITA)]
+                righe.append(f"{giorno} {giorno} {_importo(5 + (progressivo * 37) % 250 + 0.5)} {descrizione}")
+                righe.append(f"RIF. OPERAZIONE {100000 + progressivo}")
+            progressivo += 1
+        if p == numero_pagine - 1:
+            righe.append("Saldo finale al 31/12/2024 2.000,00 €")
+        righe.append("Mod. 05.13.0011")
+        pagine.append(righe)
+    return pagine
+
+
+def genera_pdf_estratto(percorso: str, numero_pagine: int, righe_per_pagina: int):
+    """Scrive un PDF di testo con le pagine dell'estratto sintetico."""
+    pagine = _righe_pagine(numero_pagine, righe_per_pagina)
+    oggetti = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Albero delle pagine, scritto quando si conoscono gli ID delle pagine
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    id_pagine = []
+    for righe in pagine:
+        testo = ["BT /F1 8 Tf 10 TL 30 810 Td"]
+        for riga in righe:
+            escapata = riga.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            testo.append(f"({escapata}) Tj T*")
+        testo.append("ET")
+        contenuto = "\n".join(testo).encode("cp1252")
+        oggetti.append(b"<< /Length %d >>\nstream\n" % len(contenuto) + contenuto + b"\nendstream")
+        id_contenuto = len(oggetti)
+        oggetti.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % id_contenuto
+        )
+        id_pagine.append(len(oggetti))
+    figli = " ".join(f"{i} 0 R" for i in id_pagine).encode()
+    oggetti[1] = b"<< /Type /Pages /Kids [" + figli + b"] /Count %d >>" % len(id_pagine)
+
+    dati = bytearray(b"%PDF-1.4\n")
+    posizioni = []
+    for numero, oggetto in enumerate(oggetti, 1):
+        posizioni.append(len(dati))
+        dati += b"%d 0 obj\n" % numero + oggetto + b"\nendobj\n"
+    inizio_xref = len(dati)
+    dati += b"xref\n0 %d\n0000000000 65535 f \n" % (len(oggetti) + 1)
+    for posizione in posizioni:
+        dati += b"%010d 00000 n \n" % posizione
+    dati += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(oggetti) + 1, inizio_xref)
+    Path(percorso).write_bytes(bytes(dati))
+
+
+def memoria_di_picco(funzione) -> float:
+    """Esegue una funzione e restituisce il picco di memoria allocata, in MB."""
+    tracemalloc.start()
+    try:
+        funzione()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    numero_pagine = int(sys.argv[1]) if len(sys.argv) > 1 else 48
+    righe_per_pagina = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    core = os.cpu_count() or 1
+    configurazioni = sorted({1, 2, 4, core} & set(range(1, core + 1)))
+
+    directory = tempfile.mkdtemp(prefix="gestfin_bench_")
+    try:
+        percorso = str(Path(directory) / "estratto_sintetico.pdf")
+        genera_pdf_estratto(percorso, numero_pagine, righe_per_pagina)
+        risultati = {}
+        tempi = {}
+        for processi in configurazioni:
+            parser = BPERParser(processi=processi)
+            tempi[processi], risultati[processi] = cronometra(lambda: parser.parse(percorso), 3)
+        
+        memoria = {}
+        parser = BPERParser(processi=1)
+        for pagine in sorted({max(1, numero_pagine // 4), numero_pagine}):
+            percorso_memoria = str(Path(directory) / f"estratto_{pagine}.pdf")
+            genera_pdf_estratto(percorso_memoria, pagine, righe_per_pagina)
+            memoria[pagine] = (
+                memoria_di_picco(lambda: parser.parse(percorso_memoria)),
+                memoria_di_picco(lambda: sum(1 for _ in parser.iter_transazioni(percorso_memoria))),
+            )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    atteso = risultati[1]
+    assert atteso["transazioni"], "Nessuna transazione estratta dal PDF sintetico"
+    for processi, risultato in risultati.items():
+        assert risultato == atteso, f"Risultato con {processi} processi diverso da quello sequenziale"
+
+    print(f"Benchmark BPERParser.parse ({numero_pagine} pagine, "
+          f"{len(atteso['transazioni'])} transazioni, {core} core)\n")
+    print(f"{'Processi':>8} {'Tempo (ms)':>11} {'Speedup':>8} {'Per core':>9}")
+    for processi in configurazioni:
+        speedup = tempi[1] / tempi[processi]
+        print(f"{processi:>8} {tempi[processi] * 1000:>11.1f} {speedup:>7.2f}x {speedup / processi:>8.2f}x")
+    
+    print(f"\nMemoria di picco (MB)\n{'Pagine':>8} {'parse()':>9} {'iter_transazioni()':>19}")
+    for pagine, (picco_parse, picco_stream) in memoria.items():
+        print(f"{pagine:>8} {picco_parse:>9.1f} {picco_stream:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
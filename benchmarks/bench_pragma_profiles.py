@@ -0,0 +1,53 @@
+"""
+# bench_pragma_profiles.py
+Confronta latenza di import e di report con i diversi profili PRAGMA.
+
+Uso:
+    python benchmarks/bench_pragma_profiles.py [numero_transazioni]
+"""
+
+import sys
+
+from _comune import (
+    database_temporaneo, crea_conto_bench, genera_transazioni, cronometra
+)
+from src.database.database_connection import PRAGMA_PROFILES
+from src.repositories.transazione_repository import TransazioneRepository
+from src.services.report_generator import ReportGenerator
+
+
+def esegui_profilo(profilo: str, numero: int) -> dict:
+    """Esegue import e report su un database nuovo con il profilo indicato."""
+    with database_temporaneo(profilo):
+        conto = crea_conto_bench()
+        transazioni = genera_transazioni(conto.id_conto, numero)
+        repo = TransazioneRepository()
+
+        def importa():
+            for t in transazioni:
+                repo.create(t)
+
+        tempo_import, _ = cronometra(importa)
+        report = ReportGenerator()
+        tempo_cash_flow, _ = cronometra(lambda: report.generate_cash_flow_personale(2024), 20)
+        tempo_fiscale, _ = cronometra(lambda: report.generate_riepilogo_fiscale(2024), 20)
+        return {
+            "import_s": tempo_import,
+            "righe_al_s": numero / tempo_import,
+            "cash_flow_ms": tempo_cash_flow * 1000,
+            "fiscale_ms": tempo_fiscale * 1000,
+        }
+
+
+def main():
+    numero = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"Benchmark profili PRAGMA ({numero} transazioni)\n")
+    print(f"{'Profilo':12} {'Import (s)':>11} {'Righe/s':>10} {'Cash flow (ms)':>15} {'Fiscale (ms)':>13}")
+    for profilo in PRAGMA_PROFILES:
+        r = esegui_profilo(profilo, numero)
+        print(f"{profilo:12} {r['import_s']:>11.2f} {r['righe_al_s']:>10.0f} "
+              f"{r['cash_flow_ms']:>15.2f} {r['fiscale_ms']:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+# bench_report.py
+Confronta il cruscotto mensile calcolato mese per mese (generate_cash_flow_personale
+e generate_pl_proprieta in ciclo) con le API batch a query raggruppata.
+
+Uso:
+    python benchmarks/bench_report.py [numero_transazioni] [numero_proprieta]
+"""
+
+import sys
+from datetime import date, timedelta
+
+from _comune import database_temporaneo, crea_conto_bench, cronometra
+from src.models.models import Proprieta, TipoProprieta, Transazione, TipoFlusso
+from src.repositories.categoria_repository import CategoriaRepository
+from src.repositories.proprieta_repository import ProprietaRepository
+from src.repositories.transazione_repository import TransazioneRepository
+from src.services.report_generator import ReportGenerator
+
+ANNO = 2024
+
+
+def popola(numero: int, numero_proprieta: int):
+    """Crea proprietà affittate con le loro categorie e transazioni sintetiche sull'anno."""
+    conto = crea_conto_bench()
+    cat_repo = CategoriaRepository()
+    props = []
+    categorie = []
+    for i in range(numero_proprieta):
+        nome = f"Immobile Bench {i}"
+        props.append(ProprietaRepository().create(Proprieta(
+            nome_o_indirizzo_breve=nome, tipo=TipoProprieta.POSSESSO_AFFITTATA,
+            valore_acquisto_o_stima_attuale=150000.0, canone_affitto_mensile_attivo=700.0
+        )))
+        categorie.append(cat_repo.crea_categorie_per_nuova_proprieta(nome, TipoProprieta.POSSESSO_AFFITTATA.value))
+    generiche = [c.id_categoria for c in cat_repo.get_all() if not c.tipo_macro.startswith("Immobile ")]
+
+    transazioni = []
+    for i in range(numero):
+        giorno = date(ANNO, 1, 1) + timedelta(days=i % 366)
+        if i % 3 == 0:
+            # Movimento di una proprietà: affitto (prima categoria) o spesa
+            p = i % numero_proprieta
+            affitto = i % 2 == 0
+            cat = categorie[p][0] if affitto else categorie[p][1 + i % (len(categorie[p]) - 1)]
+            transazioni.append(Transazione(
+                data=giorno, importo=700.0 if affitto else -round(50 + i % 400, 2),
+                descrizione=f"Movimento immobile {i}", id_categoria=cat.id_categoria,
+                id_conto_finanziario=conto.id_conto, id_proprieta_associata=props[p].id_proprieta,
+                tipo_flusso=TipoFlusso.IMMOBILIARE
+            ))
+        else:
+            transazioni.append(Transazione(
+                data=giorno, importo=round(((i * 37) % 500) - 300.5, 2),
+                descrizione=f"Movimento personale {i}", id_categoria=generiche[i % len(generiche)],
+                id_conto_finanziario=conto.id_conto, tipo_flusso=TipoFlusso.PERSONALE
+            ))
+    TransazioneRepository().create_many(transazioni)
+    return [p.id_proprieta for p in props]
+
+
+def main():
+    numero = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    numero_proprieta = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with database_temporaneo():
+        id_props = popola(numero, numero_proprieta)
+        report = ReportGenerator()
+
+        def ciclo():
+            risultati = {}
+            for mese in list(range(1, 13)) + [None]:
+                risultati[(ANNO, mese)] = report.generate_cash_flow_personale(ANNO, mese)
+                for id_p in id_props:
+                    risultati[(id_p, ANNO, mese)] = report.generate_pl_proprieta(id_p, ANNO, mese)
+            return risultati
+
+        def batch():
+            risultati = dict(report.generate_cash_flow_personale_periodi([ANNO]))
+            risultati.update(report.generate_pl_proprieta_periodi([ANNO], id_props))
+            return risultati
+
+        t_ciclo, atteso = cronometra(ciclo)
+        t_batch, ottenuto = cronometra(batch, 5)
+        assert atteso == ottenuto, "I report batch differiscono da quelli calcolati in ciclo"
+
+    print(f"Benchmark cruscotto mensile {ANNO} ({numero} transazioni, {numero_proprieta} proprietà)\n")
+    print(f"{'Modalità':10} {'Tempo (ms)':>11}")
+    print(f"{'ciclo':10} {t_ciclo * 1000:>11.1f}")
+    print(f"{'batch':10} {t_batch * 1000:>11.1f}")
+    print(f"\nSpeedup batch: {t_ciclo / t_batch:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+# bench_saldo.py
+Misura la latenza del ricalcolo del saldo di un conto al crescere dello storico.
+
+Confronta la somma in Python sulle transazioni caricate come entità
+(comportamento precedente) con la SUM in SQL sull'indice coprente
+(id_conto_finanziario, importo).
+
+Uso:
+    python benchmarks/bench_saldo.py [ripetizioni]
+"""
+
+import sys
+
+from _comune import (
+    database_temporaneo, crea_conto_bench, genera_transazioni, cronometra
+)
+from src.repositories.transazione_repository import (
+    TransazioneRepository, CriteriTransazione
+)
+from src.services.saldo_calculator import SaldoCalculator
+
+DIMENSIONI_STORICO = (1000, 5000, 20000, 50000)
+
+
+def saldo_python(repo: TransazioneRepository, conto) -> float:
+    """Somma gli importi caricando ogni transazione come entità."""
+    saldo = conto.saldo_iniziale
+    for t in repo.iter_cerca(CriteriTransazione(id_conto=conto.id_conto, ordina_per=None)):
+        saldo += t.importo
+    return round(saldo, 2)
+
+
+def main():
+    ripetizioni = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print("Benchmark ricalcolo saldo conto\n")
+    print(f"{'Transazioni':>12} {'Python (ms)':>12} {'SQL SUM (ms)':>13} {'Speedup':>8}")
+    for numero in DIMENSIONI_STORICO:
+        with database_temporaneo():
+            conto = crea_conto_bench()
+            repo = TransazioneRepository()
+            repo.create_many(genera_transazioni(conto.id_conto, numero))
+            calcolatore = SaldoCalculator(transazione_repo=repo)
+
+            t_python, atteso = cronometra(lambda: saldo_python(repo, conto), ripetizioni)
+            t_sql, ottenuto = cronometra(lambda: calcolatore.calcola_saldo_conto(conto), ripetizioni)
+            assert atteso == ottenuto, (atteso, ottenuto)
+            print(f"{numero:>12} {t_python * 1000:>12.2f} {t_sql * 1000:>13.2f} "
+                  f"{t_python / t_sql:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
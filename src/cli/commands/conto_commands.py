@@ -1,8 +1,11 @@
 # ... gestione_conti e funzioni correlate qui ...
 
+from datetime import date
 from src.repositories.conto_repository import ContoRepository
-from src.repositories.transazione_repository import TransazioneRepository
+from src.repositories.transazione_repository import TransazioneRepository, CriteriTransazione
 from src.services.saldo_calculator import SaldoCalculator
+from src.services.storico_saldi import StoricoSaldi
+from src.cli.commands.transazione_commands import input_data
 from src.models.conto_finanziario import ContoFinanziario, TipoConto
 from src.cli.utils import print_colored
 
@@ -25,6 +28,7 @@ def gestione_conti():
     repo = ContoRepository()
     trans_repo = TransazioneRepository()
     saldo_calc = SaldoCalculator()
+    storico = StoricoSaldi()
     while True:
         print_colored("\n--- Gestione Conti Finanziari ---", "blue", bold=True)
         print("1. Visualizza tutti i conti")
@@ -34,6 +38,7 @@ def gestione_conti():
         print("5. Visualizza conti per tipo")
         print("6. Ricalcola saldo di un conto")
         print("7. Verifica coerenza saldi di tutti i conti")
+        print("8. Saldo di un conto a una data")
         print("0. Torna al menu principale")
         scelta = input("\nSeleziona un'opzione: ").strip()
         if scelta == "1":
@@ -103,8 +108,7 @@ def gestione_conti():
             except ValueError:
                 print("ID non valido.")
                 continue
-            transazioni = trans_repo.get_by_conto_id(id_conto)
-            if transazioni:
+            if trans_repo.conta(CriteriTransazione(id_conto=id_conto)) > 0:
                 print_colored("Impossibile eliminare: il conto ha transazioni associate. Considera di spostare le transazioni o archiviare il conto.", "yellow")
                 input("\nPremi Invio per continuare...")
                 continue
@@ -145,17 +149,33 @@ def gestione_conti():
             input("\nPremi Invio per continuare...")
         elif scelta == "7":
             print("\n--- Verifica Coerenza Saldi Tutti i Conti ---")
-            risultati = saldo_calc.verifica_coerenza_saldi_tutti_conti()
-            conti = repo.get_all()
-            incoerenti = False
-            for c in conti:
-                coerente = risultati.get(c.id_conto, True)
-                stato = "OK" if coerente else "NON COERENTE"
-                print(f"ID: {c.id_conto}, Nome: {c.nome_conto}, Saldo Attuale: €{c.saldo_attuale:.2f} [{stato}]")
-                if not coerente:
-                    incoerenti = True
+            risultati = saldo_calc.calcola_scostamenti_saldi()
+            incoerenti = [r for r in risultati if r["scostamento"]]
+            for r in risultati:
+                stato = "OK" if not r["scostamento"] else f"NON COERENTE, scostamento €{r['scostamento']:+.2f}"
+                print(f"ID: {r['id_conto']}, Nome: {r['nome_conto']}, Saldo Attuale: €{r['saldo_registrato'] or 0:.2f}, Saldo Calcolato: €{r['saldo_calcolato']:.2f} [{stato}]")
             if not incoerenti:
                 print_colored("\nTutti i saldi sono coerenti.", "green")
+            elif input(f"\nCorreggere i {len(incoerenti)} conti non coerenti? (s/N): ").strip().lower() == "s":
+                try:
+                    corretti = [r for r in saldo_calc.calcola_scostamenti_saldi(correggi=True) if r["corretto"]]
+                    print_colored(f"Saldi corretti: {len(corretti)} conti.", "green")
+                except Exception as e:
+                    print_colored(f"\nErrore: {e}", "red")
+            input("\nPremi Invio per continuare...")
+        elif scelta == "8":
+            print("\n--- Saldo a una Data ---")
+            try:
+                id_conto = int(input("ID conto: ").strip())
+            except ValueError:
+                print("ID non valido.")
+                continue
+            giorno = input_data("Data") or date.today()
+            try:
+                saldo = storico.saldo_al(id_conto, giorno)
+                print_colored(f"Saldo al {giorno.strftime('%d/%m/%Y')}: €{saldo:.2f}", "green")
+            except Exception as e:
+                print_colored(f"\nErrore: {e}", "red")
             input("\nPremi Invio per continuare...")
         elif scelta == "0":
             break
@@ -6,8 +6,11 @@ from src.repositories.proprieta_repository import ProprietaRepository
 from src.repositories.transazione_repository import TransazioneRepository
 from src.models.transazione import Transazione, TipoFlusso
 from src.services.saldo_calculator import SaldoCalculator
+from src.services.isee_calculator import ISEECalculator
+from src.database.database_connection import transaction
 from src.ingestion.bper_parser_improved import BPERParser
 from src.ingestion.bper_integration import BPERImporter
+from src.ingestion.cache_parsing import CacheParsing
 from src.cli.utils import print_colored
 import os
 from datetime import datetime
@@ -54,6 +57,12 @@ def gestione_import_pdf():
         print_colored("File non trovato.", "red")
         input("\nPremi Invio per continuare...")
         return
+    # Una sola cache per importazione e revisione manuale: il PDF viene analizzato una volta
+    cache = CacheParsing.predefinita()
+    if cache is not None and cache.contiene(cache.chiave(percorso_pdf, BPERParser.VERSIONE)):
+        print("\nEstratto conto già analizzato. Usare il risultato in cache? (S/n): ", end='')
+        if input().strip().lower() == 'n':
+            cache.invalida(percorso_pdf)
     print("\nVuoi associare le transazioni a un conto esistente? (s/N): ", end='')
     usa_conto_esistente = input().strip().lower() == 's'
     conto_id = None
@@ -73,7 +82,7 @@ def gestione_import_pdf():
                 conto_id = None
     print("\nParsing e importazione automatica in corso...")
     try:
-        importer = BPERImporter()
+        importer = BPERImporter(cache=cache)
         risultati = importer.import_from_pdf(percorso_pdf, conto_id)
         print_colored("\nImportazione completata!", "green", bold=True)
         input("\nPremi Invio per continuare...")
@@ -104,7 +113,7 @@ def gestione_import_pdf():
             return
         print("Parsing PDF in corso...")
         try:
-            parser = BPERParser()
+            parser = BPERParser(cache=cache)
             parsed = parser.parse(percorso_pdf)
         except Exception as e:
             print_colored(f"Errore durante il parsing del PDF: {e}", "red")
@@ -164,8 +173,9 @@ def gestione_import_pdf():
                     flag_deducibile_o_rilevante_fiscalmente=flag_fiscale,
                     note_aggiuntive=note
                 )
-                trans_creata = trans_repo.create(trans)
-                saldo_calc.aggiorna_saldo_dopo_modifica_transazione(trans_creata, 'create')
+                with transaction():
+                    trans_creata = trans_repo.create(trans)
+                    saldo_calc.aggiorna_saldo_dopo_modifica_transazione(trans_creata, 'create')
                 importate += 1
                 print_colored("Transazione importata con successo.", "green")
             except Exception as e:
@@ -177,4 +187,39 @@ def gestione_import_pdf():
                 print_colored(f"Saldo finale del conto (€{conto_aggiornato.saldo_attuale:.2f}) coincide con quello dell'estratto conto.", "green")
             else:
                 print_colored(f"ATTENZIONE: Saldo finale del conto (€{conto_aggiornato.saldo_attuale:.2f}) DIVERSO da quello dell'estratto conto (€{info_conto['saldo_finale']:.2f})!", "red")
-        input("\nPremi Invio per tornare al menu principale...") 
\ No newline at end of file
+        info_isee = parsed.get('info_isee') or {}
+        if info_isee.get('anno'):
+            verifica = ISEECalculator().confronta_con_estratto(conto.id_conto, info_isee)
+            print(f"\nDati ISEE {verifica['anno']} (calcolati / estratto conto):")
+            for chiave, etichetta in (("saldo_fine_anno", "Saldo al 31/12"), ("giacenza_media", "Giacenza media")):
+                if verifica[f"{chiave}_estratto"] is not None:
+                    print(f"  {etichetta}: €{verifica[f'{chiave}_calcolato']:.2f} / €{verifica[f'{chiave}_estratto']:.2f}")
+            if verifica['coerente']:
+                print_colored("I dati ISEE calcolati coincidono con quelli dell'estratto conto.", "green")
+            else:
+                print_colored("ATTENZIONE: i dati ISEE calcolati differiscono da quelli dell'estratto conto (date valuta o transazioni mancanti).", "yellow")
+        input("\nPremi Invio per tornare al menu principale...") 
+
+
+def gestione_cache_parsing():
+    print_colored("\n--- Cache Parsing Estratti Conto ---", "cyan", bold=True)
+    cache = CacheParsing()
+    stats = cache.statistiche()
+    print(f"Directory: {cache.directory}")
+    print(f"Estratti in cache: {stats['voci']}")
+    print(f"Occupazione: {stats['byte'] / 1024:.1f} KiB su {stats['max_byte'] / 1024:.0f} KiB")
+    if CacheParsing.predefinita() is None:
+        print_colored("La cache è disattivata (PARSE_CACHE_ATTIVA / GESTFIN_PARSE_CACHE).", "yellow")
+    print("\n1. Invalida un estratto conto")
+    print("2. Svuota la cache")
+    print("0. Indietro")
+    scelta = input("\nSeleziona un'opzione: ").strip()
+    if scelta == "1":
+        percorso_pdf = input("Percorso file PDF: ").strip()
+        if not os.path.isfile(percorso_pdf):
+            print_colored("File non trovato.", "red")
+        else:
+            print_colored(f"Voci eliminate: {cache.invalida(percorso_pdf)}", "green")
+    elif scelta == "2":
+        print_colored(f"Voci eliminate: {cache.invalida()}", "green")
+    input("\nPremi Invio per continuare...")
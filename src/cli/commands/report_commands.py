@@ -1,9 +1,10 @@
 from src.services.report_generator import ReportGenerator
+from src.services.cache_report import CacheReport
 from src.repositories.proprieta_repository import ProprietaRepository
 from src.cli.utils import print_colored
 
 def visualizza_report():
-    report_gen = ReportGenerator()
+    report_gen = ReportGenerator(cache=CacheReport.predefinita())
     prop_repo = ProprietaRepository()
     while True:
         print_colored("\n--- Visualizza Report ---", "magenta", bold=True)
@@ -11,6 +12,9 @@ def visualizza_report():
         print("2. Profit & Loss per Singola Proprietà (Mensile/Annuale)")
         print("3. Riepilogo Spese Fiscalmente Rilevanti (Annuale)")
         print("4. Patrimonio Netto Semplificato (Snapshot)")
+        print("5. Portafoglio Immobiliare: P&L e Rendimenti per Anno")
+        print("6. Confronto Periodi (Anno Precedente / Ultimi 12 Mesi)")
+        print("7. Statistiche cache dei report")
         print("0. Torna al menu principale")
         scelta = input("\nSeleziona un report: ").strip()
         if scelta == "1":
@@ -100,7 +104,76 @@ def visualizza_report():
             except Exception as e:
                 print_colored(f"\nErrore: {e}", "red")
             input("\nPremi Invio per continuare...")
+        elif scelta == "5":
+            print("\n--- Portafoglio Immobiliare ---")
+            anno_str = input("Anno (Invio per tutti gli anni): ").strip()
+            try:
+                anno = int(anno_str) if anno_str else None
+                res = report_gen.generate_portafoglio_proprieta(anno, anno)
+                for r in res['per_proprieta']:
+                    affitti = f"€{r['totale_affitti_incassati']:.2f}" if r['totale_affitti_incassati'] is not None else "-"
+                    lordo = f"{r['rendimento_annuo_lordo']:.2f}%" if r['rendimento_annuo_lordo'] is not None else "-"
+                    netto = f"{r['rendimento_annuo_netto']:.2f}%" if r['rendimento_annuo_netto'] is not None else "-"
+                    print(f"  {r['anno']} {r['nome_proprieta']}: Affitti {affitti}, Spese €{r['totale_spese_proprieta']:.2f}, "
+                          f"P&L €{r['profit_loss_netto']:.2f}, Rend. lordo {lordo}, Rend. netto {netto}")
+                for a, tot in res['totali_per_anno'].items():
+                    print_colored(f"Totale {a}: Affitti €{tot['totale_affitti_incassati']:.2f}, Spese €{tot['totale_spese_proprieta']:.2f}, "
+                                  f"P&L €{tot['profit_loss_netto']:.2f}", "cyan")
+            except ValueError:
+                print_colored("Anno non valido.", "red")
+            except Exception as e:
+                print_colored(f"\nErrore: {e}", "red")
+            input("\nPremi Invio per continuare...")
+        elif scelta == "6":
+            print("\n--- Confronto Periodi ---")
+            print("1. Anno (o mese) rispetto all'anno precedente")
+            print("2. Ultimi 12 mesi rispetto ai 12 precedenti")
+            modo = input("Scelta: ").strip()
+            try:
+                anno = int(input("Anno (es. 2024): ").strip())
+                mese_str = input("Mese (1-12" + (", Invio per tutto l'anno" if modo == "1" else "") + "): ").strip()
+                mese = int(mese_str) if mese_str else None
+                if modo == "1":
+                    res = report_gen.generate_confronto_anno_precedente(anno, mese)
+                elif modo == "2" and mese:
+                    res = report_gen.generate_confronto_ultimi_12_mesi(anno, mese)
+                else:
+                    raise ValueError("scelta o mese mancante")
+            except ValueError as e:
+                print_colored(f"Dati non validi: {e}", "red")
+                input("\nPremi Invio per continuare...")
+                continue
+            except Exception as e:
+                print_colored(f"\nErrore: {e}", "red")
+                input("\nPremi Invio per continuare...")
+                continue
+
+            def variazione(voce):
+                perc = voce['variazione_netto_percentuale']
+                return f"€{voce['variazione_netto']:+.2f}" + (f" ({perc:+.1f}%)" if perc is not None else "")
+
+            print(f"\nA: {res['periodo_a']}  -  B: {res['periodo_b']}")
+            print_colored("\nPer tipo macro (netto A / netto B / variazione):", "cyan")
+            for v in res['per_tipo_macro']:
+                print(f"  {v['tipo_macro']}: €{v['netto_a']:.2f} / €{v['netto_b']:.2f} / {variazione(v)}")
+            print_colored("\nPer categoria:", "cyan")
+            for v in res['per_categoria']:
+                print(f"  {v['nome_categoria']} ({v['tipo_macro']}): €{v['netto_a']:.2f} / €{v['netto_b']:.2f} / {variazione(v)}")
+            tot = res['totale']
+            print_colored(f"\nTotale: €{tot['netto_a']:.2f} / €{tot['netto_b']:.2f} / {variazione(tot)}", "cyan")
+            input("\nPremi Invio per continuare...")
+        elif scelta == "7":
+            print("\n--- Statistiche Cache dei Report ---")
+            stats = report_gen.cache.statistiche()
+            print(f"Report in cache: {stats['voci']}")
+            print(f"Hit: {stats['hit']}, Miss: {stats['miss']} (hit ratio {stats['hit_ratio']:.1%})")
+            print(f"Invalidazioni: {stats['invalidazioni']}, Evizioni: {stats['evizioni']}")
+            if input("Svuotare la cache? (s/N): ").strip().lower() == "s":
+                report_gen.cache.svuota()
+                print_colored("Cache svuotata.", "green")
+            input("\nPremi Invio per continuare...")
         elif scelta == "0":
+            report_gen.cache.salva()
             break
         else:
             print_colored("\nOpzione non valida. Riprova.", "red")
@@ -1,10 +1,11 @@
 # ... gestione_transazioni e funzioni correlate qui ...
 
-from src.repositories.transazione_repository import TransazioneRepository
+from src.repositories.transazione_repository import TransazioneRepository, CriteriTransazione
 from src.repositories.categoria_repository import CategoriaRepository
 from src.repositories.conto_repository import ContoRepository
 from src.repositories.proprieta_repository import ProprietaRepository
 from src.services.saldo_calculator import SaldoCalculator
+from src.database.database_connection import transaction
 from src.models.transazione import Transazione, TipoFlusso
 from src.cli.utils import print_colored
 from datetime import datetime, date, timedelta
@@ -45,9 +46,10 @@ def seleziona_da_elenco(elenco, label, attr_nome="nome_categoria", attr_id="id_c
         print("ID non valido. Riprova.")
 
 def stampa_transazione(t, cat_repo, conto_repo, prop_repo):
-    cat = cat_repo.get_by_id(t.id_categoria)
-    conto = conto_repo.get_by_id(t.id_conto_finanziario)
-    prop = prop_repo.get_by_id(t.id_proprieta_associata) if t.id_proprieta_associata else None
+    # Le transazioni lette con con_dettagli=True hanno già le entità collegate
+    cat = t.categoria or cat_repo.get_by_id(t.id_categoria)
+    conto = t.conto or conto_repo.get_by_id(t.id_conto_finanziario)
+    prop = t.proprieta or (prop_repo.get_by_id(t.id_proprieta_associata) if t.id_proprieta_associata else None)
     data_str = t.data.strftime("%Y-%m-%d")
     importo_str = f"+€{t.importo:.2f}" if t.importo > 0 else f"-€{abs(t.importo):.2f}"
     print(f"ID: {t.id_transazione}, Data: {data_str}, Importo: {importo_str}, Desc: {t.descrizione}, Categoria: {cat.nome_categoria if cat else t.id_categoria}, Conto: {conto.nome_conto if conto else t.id_conto_finanziario}, Proprietà: {prop.nome_o_indirizzo_breve if prop else '-'}")
@@ -92,17 +94,29 @@ def gestione_transazioni():
             sub = input("Scegli criterio (1/2/3): ").strip()
             oggi = date.today()
             if sub == "1":
-                trans = repo.get_by_periodo(date(1900,1,1), oggi, order_by="data DESC")[:10]
+                # Paginazione keyset: legge solo le righe mostrate
+                criteri = CriteriTransazione(data_fine=oggi)
+                trans, cursore = repo.cerca_pagina(criteri, limite=10, con_dettagli=True)
+                while cursore is not None:
+                    print("\nTransazioni:")
+                    for t in trans:
+                        stampa_transazione(t, cat_repo, conto_repo, prop_repo)
+                    if input("\nMostrare le 10 precedenti? (s/N): ").strip().lower() != "s":
+                        break
+                    trans, cursore = repo.cerca_pagina(criteri, cursore, limite=10, con_dettagli=True)
+                if cursore is not None:
+                    continue
+                # L'ultima pagina viene mostrata sotto come negli altri casi
             elif sub == "2":
                 data_inizio = oggi.replace(day=1)
                 data_fine = oggi
-                trans = repo.get_by_periodo(data_inizio, data_fine, order_by="data DESC")
+                trans = repo.cerca(CriteriTransazione(data_inizio=data_inizio, data_fine=data_fine), con_dettagli=True)
             elif sub == "3":
                 primo_oggi = oggi.replace(day=1)
                 mese_prec = primo_oggi - timedelta(days=1)
                 data_inizio = mese_prec.replace(day=1)
                 data_fine = mese_prec.replace(day=mese_prec.day)
-                trans = repo.get_by_periodo(data_inizio, data_fine, order_by="data DESC")
+                trans = repo.cerca(CriteriTransazione(data_inizio=data_inizio, data_fine=data_fine), con_dettagli=True)
             else:
                 print("Criterio non valido.")
                 continue
@@ -141,8 +155,10 @@ def gestione_transazioni():
                     flag_deducibile_o_rilevante_fiscalmente=flag_fiscale,
                     note_aggiuntive=note
                 )
-                trans_creata = repo.create(trans)
-                saldo_calc.aggiorna_saldo_dopo_modifica_transazione(trans_creata, 'create')
+                # Insert, audit e saldo con un solo commit
+                with transaction():
+                    trans_creata = repo.create(trans)
+                    saldo_calc.aggiorna_saldo_dopo_modifica_transazione(trans_creata, 'create')
                 print_colored(f"\nTransazione creata con successo! ID: {trans_creata.id_transazione}", "green")
             except Exception as e:
                 print_colored(f"\nErrore: {e}", "red")
@@ -194,8 +210,9 @@ def gestione_transazioni():
                 trans.tipo_flusso = tipo_flusso
                 trans.flag_deducibile_o_rilevante_fiscalmente = flag_fiscale
                 trans.note_aggiuntive = note
-                trans_aggiornata = repo.update(trans)
-                saldo_calc.aggiorna_saldo_dopo_modifica_transazione(trans_aggiornata, 'update', trans_precedente)
+                with transaction():
+                    trans_aggiornata = repo.update(trans)
+                    saldo_calc.aggiorna_saldo_dopo_modifica_transazione(trans_aggiornata, 'update', trans_precedente)
                 print_colored(f"\nTransazione aggiornata con successo! ID: {trans_aggiornata.id_transazione}", "green")
             except Exception as e:
                 print_colored(f"\nErrore: {e}", "red")
@@ -217,8 +234,11 @@ def gestione_transazioni():
                 print("Operazione annullata.")
                 continue
             try:
-                if repo.delete(id_tr):
-                    saldo_calc.aggiorna_saldo_dopo_modifica_transazione(trans, 'delete')
+                with transaction():
+                    eliminata = repo.delete(id_tr)
+                    if eliminata:
+                        saldo_calc.aggiorna_saldo_dopo_modifica_transazione(trans, 'delete')
+                if eliminata:
                     print_colored("Transazione eliminata con successo.", "green")
                 else:
                     print("Transazione non trovata.")
@@ -239,24 +259,22 @@ def gestione_transazioni():
             if input("Filtrare per tipo flusso? (s/N): ").strip().lower() == "s":
                 tipo_flusso = seleziona_tipo_flusso()
             solo_fiscale = input("Solo fiscalmente rilevanti? (s/N): ").strip().lower() == "s"
-            trans = repo.get_all(order_by="data DESC")
-            risultati = []
-            for t in trans:
-                if data_inizio and t.data < data_inizio:
-                    continue
-                if data_fine and t.data > data_fine:
-                    continue
-                if cat and t.id_categoria != cat.id_categoria:
-                    continue
-                if conto and t.id_conto_finanziario != conto.id_conto:
-                    continue
-                if prop and t.id_proprieta_associata != prop.id_proprieta:
-                    continue
-                if tipo_flusso and t.tipo_flusso != tipo_flusso:
-                    continue
-                if solo_fiscale and not t.flag_deducibile_o_rilevante_fiscalmente:
-                    continue
-                risultati.append(t)
+            importo_min = input_float("Importo minimo (Invio per nessun filtro)")
+            importo_max = input_float("Importo massimo (Invio per nessun filtro)")
+            testo = input("Testo in descrizione o note (Invio per nessun filtro): ").strip() or None
+            criteri = CriteriTransazione(
+                data_inizio=data_inizio,
+                data_fine=data_fine,
+                id_categoria=cat.id_categoria if cat else None,
+                id_conto=conto.id_conto if conto else None,
+                id_proprieta=prop.id_proprieta if prop else None,
+                tipo_flusso=tipo_flusso,
+                solo_fiscali=solo_fiscale,
+                importo_min=importo_min,
+                importo_max=importo_max,
+                testo=testo
+            )
+            risultati = repo.cerca(criteri, con_dettagli=True)
             if not risultati:
                 print("\nNessuna transazione trovata per i filtri selezionati.")
             else:
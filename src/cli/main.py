@@ -5,7 +5,7 @@ from src.cli.commands.conto_commands import gestione_conti
 from src.cli.commands.proprieta_commands import gestione_proprieta
 from src.cli.commands.transazione_commands import gestione_transazioni
 from src.cli.commands.report_commands import visualizza_report
-from src.cli.commands.ingestion_commands import gestione_import_pdf
+from src.cli.commands.ingestion_commands import gestione_import_pdf, gestione_cache_parsing
 import os
 from pathlib import Path
 
@@ -13,14 +13,15 @@ def setup_iniziale():
     """
     Inizializza il database e applica le migrazioni se necessario.
     """
-    from src.database.database_connection import init_database
+    from src.database.database_connection import init_database, get_db_connection
     from src.database.migrations import migrate_to_latest
-    db_path = Path(__file__).parent.parent.parent / "data" / "database.db"
+    # Percorso configurato (GESTFIN_DB_PATH, settings.DB_PATH o data/database.db)
+    db_path = Path(get_db_connection().config.db_path)
     if not db_path.exists() or os.path.getsize(db_path) < 1024:  # file non esiste o troppo piccolo
         print_colored("\n[Setup] Inizializzazione database in corso...", "yellow", bold=True)
         try:
+            # init_database applica anche le migrazioni
             init_database()
-            migrate_to_latest()
             print_colored("Database creato e aggiornato con successo!", "green")
         except Exception as e:
             print_colored(f"Errore durante l'inizializzazione del database: {e}", "red")
@@ -46,6 +47,7 @@ def menu_principale():
         print("5. Visualizza Report")
         print("6. Importa Estratto Conto PDF")
         print("7. Tutorial/Guida Rapida")
+        print("8. Cache Parsing Estratti Conto")
         print("0. Esci")
         scelta = input("\nSeleziona un'opzione: ").strip()
         if scelta == "1":
@@ -62,6 +64,8 @@ def menu_principale():
             gestione_import_pdf()
         elif scelta == "7":
             show_tutorial()
+        elif scelta == "8":
+            gestione_cache_parsing()
         elif scelta == "0":
             print_colored("\nArrivederci!", "green", bold=True)
             sys.exit(0)
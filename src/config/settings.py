@@ -0,0 +1,45 @@
+"""
+# settings.py
+Impostazioni globali dell'applicazione.
+
+I valori qui definiti sono i default; dove indicato possono essere
+sovrascritti tramite variabili d'ambiente al momento dell'uso.
+"""
+
+# Percorso del database SQLite (None = data/database.db).
+# Variabile d'ambiente: GESTFIN_DB_PATH
+DB_PATH = None
+
+# Profilo di PRAGMA applicato a ogni connessione ("safe", "throughput", "bulk-load").
+# Variabile d'ambiente: GESTFIN_DB_PROFILE
+DB_PRAGMA_PROFILE = "safe"
+
+# Override puntuali dei PRAGMA del profilo, es. {"cache_size": -32000}.
+# Variabili d'ambiente: GESTFIN_DB_PRAGMA_<NOME>, es. GESTFIN_DB_PRAGMA_CACHE_SIZE=-32000
+DB_PRAGMA_OVERRIDES = {}
+
+# Numero massimo di report tenuti nella cache dei report (LRU).
+REPORT_CACHE_MAX_VOCI = 128
+
+# Salva la cache dei report su file (cache_report.json accanto al database)
+# all'uscita dal menu report, per riusarla tra una sessione CLI e l'altra.
+# Variabile d'ambiente: GESTFIN_REPORT_CACHE_PERSISTENTE (0/1)
+REPORT_CACHE_PERSISTENTE = False
+
+# Processi usati da BPERParser per estrarre il testo delle pagine del PDF
+# (1 = estrazione sequenziale, 0 = uno per core).
+# Variabile d'ambiente: GESTFIN_PDF_PARSER_PROCESSI
+PDF_PARSER_PROCESSI = 1
+
+# Cache su disco dei risultati del parsing degli estratti conto PDF
+# (chiave: SHA-256 del file e versione del parser).
+# Variabile d'ambiente: GESTFIN_PARSE_CACHE (0/1)
+PARSE_CACHE_ATTIVA = True
+
+# Directory della cache di parsing (None = data/cache_parsing).
+# Variabile d'ambiente: GESTFIN_PARSE_CACHE_DIR
+PARSE_CACHE_DIR = None
+
+# Dimensione massima della cache di parsing in MB: oltre vengono eliminate
+# le voci usate meno di recente.
+PARSE_CACHE_MAX_MB = 64
@@ -1,47 +1,39 @@
+"""
+Accesso semplificato al database, mantenuto per compatibilità.
+
+Non apre più una propria connessione: tutte le funzioni delegano al pool
+globale di database_connection, così esiste una sola gestione delle
+connessioni verso il file del database.
+"""
+
 import sqlite3
 from contextlib import contextmanager
-from pathlib import Path
 
-# Singleton per la connessione globale
-_connection = None
+from src.database.database_connection import (
+    DatabaseConfig, get_db_connection, get_db_cursor, set_db_config,
+    init_database, get_database_stats, backup_database
+)
 
-def get_connection(db_path=None):
+def get_connection(db_path=None) -> sqlite3.Connection:
     """
-    Restituisce una connessione SQLite pronta all'uso (singleton).
-    Abilita foreign keys e row_factory.
+    Restituisce una connessione di scrittura del pool globale (deprecato,
+    vedi DatabaseConnection.get_connection).
+    Se db_path è indicato e diverso da quello attuale, riconfigura il pool.
     """
-    global _connection
-    if _connection is None:
-        if db_path is None:
-            data_dir = Path(__file__).parent.parent.parent / "data"
-            data_dir.mkdir(exist_ok=True)
-            db_path = str(data_dir / "database.db")
-        _connection = sqlite3.connect(db_path, check_same_thread=False)
-        _connection.execute("PRAGMA foreign_keys = ON")
-        _connection.row_factory = sqlite3.Row
-    return _connection
+    if db_path is not None and db_path != get_db_connection().config.db_path:
+        set_db_config(DatabaseConfig(db_path))
+    return get_db_connection().get_connection()
 
 @contextmanager
-def db_cursor():
+def db_cursor(readonly=False):
     """
     Context manager per ottenere un cursore e gestire commit/rollback.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
+    with get_db_cursor(readonly=readonly) as cursor:
         yield cursor
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        cursor.close()
 
 def close_connection():
     """
-    Chiude la connessione globale se aperta.
+    Chiude le connessioni del pool globale.
     """
-    global _connection
-    if _connection:
-        _connection.close()
-        _connection = None
+    get_db_connection().close()
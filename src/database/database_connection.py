@@ -1,30 +1,81 @@
 """
 Modulo per la gestione della connessione al database SQLite.
 
-Fornisce un connection manager thread-safe e funzioni utility
-per l'inizializzazione e gestione del database.
+Fornisce un connection manager thread-safe, basato sul pool di
+connessioni in pool.py, e funzioni utility per l'inizializzazione
+e gestione del database.
 """
 
 import sqlite3
 import os
+import threading
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Sequence, Tuple
 import logging
 from datetime import datetime
 import json
 
+from src.config import settings
+from src.database.pool import ConnectionPool
+
+
+# Profili di PRAGMA predefiniti.
+# L'ordine conta: journal_mode va impostato prima degli altri PRAGMA.
+PRAGMA_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Massima durabilità: WAL per non bloccare i lettori, fsync a ogni commit
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -8000,        # ~8 MB
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 30000,
+    },
+    # Uso interattivo e report: in WAL, NORMAL resta consistente dopo un crash
+    "throughput": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,       # ~64 MB
+        "mmap_size": 268435456,     # 256 MB
+        "temp_store": "MEMORY",
+        "busy_timeout": 30000,
+    },
+    # Import massivi: nessun fsync, da usare solo con un backup a portata di mano
+    "bulk-load": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -262144,      # ~256 MB
+        "mmap_size": 1073741824,    # 1 GB
+        "temp_store": "MEMORY",
+        "busy_timeout": 60000,
+    },
+}
+
+_PRAGMA_ENV_PREFIX = "GESTFIN_DB_PRAGMA_"
+
+# INSERT/UPDATE/DELETE ... RETURNING sono disponibili da SQLite 3.35
+SUPPORTA_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
 
 class DatabaseConfig:
     """Configurazione per il database."""
     
-    def __init__(self, db_path: Optional[str] = None):
+    def __init__(self, db_path: Optional[str] = None,
+                 pragma_profile: Optional[str] = None,
+                 pragma_overrides: Optional[Dict[str, Any]] = None):
         """
         Inizializza la configurazione del database.
         
         Args:
-            db_path: Percorso del file database. Se None, usa il default.
+            db_path: Percorso del file database. Se None, usa GESTFIN_DB_PATH
+                o il default data/database.db.
+            pragma_profile: Nome del profilo di PRAGMA (vedi PRAGMA_PROFILES).
+                Se None, usa GESTFIN_DB_PROFILE o il default in settings.
+            pragma_overrides: PRAGMA da sovrascrivere rispetto al profilo.
         """
+        if db_path is None:
+            db_path = os.environ.get("GESTFIN_DB_PATH") or settings.DB_PATH
         if db_path is None:
             # Crea directory data se non esiste
             data_dir = Path(__file__).parent.parent.parent / "data"
@@ -39,70 +90,117 @@ class DatabaseConfig:
         self.timeout = 30.0  # timeout per lock del database
         self.isolation_level = None  # autocommit disabilitato
         
+        # Profilo PRAGMA
+        self.pragma_profile = (
+            pragma_profile
+            or os.environ.get("GESTFIN_DB_PROFILE")
+            or settings.DB_PRAGMA_PROFILE
+        )
+        if self.pragma_profile not in PRAGMA_PROFILES:
+            raise ValueError(
+                f"Profilo PRAGMA '{self.pragma_profile}' non valido. "
+                f"Usa uno di: {', '.join(PRAGMA_PROFILES)}"
+            )
+        self.pragmas = dict(PRAGMA_PROFILES[self.pragma_profile])
+        self.pragmas.update(settings.DB_PRAGMA_OVERRIDES)
+        self.pragmas.update(self._pragma_da_ambiente())
+        if pragma_overrides:
+            self.pragmas.update(pragma_overrides)
+        
         # Setup logging
         self.logger = logging.getLogger(__name__)
+    
+    @staticmethod
+    def _pragma_da_ambiente() -> Dict[str, str]:
+        """Legge gli override dei PRAGMA dalle variabili GESTFIN_DB_PRAGMA_<NOME>."""
+        overrides = {}
+        for chiave, valore in os.environ.items():
+            if chiave.startswith(_PRAGMA_ENV_PREFIX):
+                nome = chiave[len(_PRAGMA_ENV_PREFIX):].lower()
+                if nome:
+                    overrides[nome] = valore
+        return overrides
+    
+    def apply_pragmas(self, connection: sqlite3.Connection):
+        """
+        Applica i PRAGMA del profilo a una connessione appena aperta.
+        
+        Args:
+            connection: Connessione SQLite su cui applicare i PRAGMA
+        """
+        connection.execute("PRAGMA foreign_keys = ON")
+        for nome, valore in self.pragmas.items():
+            if not nome.replace("_", "").isalnum():
+                raise ValueError(f"Nome PRAGMA non valido: {nome}")
+            valore = str(valore)
+            if not valore.lstrip("-").replace("_", "").isalnum():
+                raise ValueError(f"Valore non valido per PRAGMA {nome}: {valore}")
+            connection.execute(f"PRAGMA {nome} = {valore}")
 
 
 class DatabaseConnection:
-    """Gestisce la connessione al database SQLite."""
+    """
+    Gestisce l'accesso al database SQLite tramite un pool di connessioni.
+    
+    Le scritture passano da un'unica connessione concessa in esclusiva a un
+    thread per volta; le letture usano connessioni di sola lettura del pool.
+    """
     
-    def __init__(self, config: Optional[DatabaseConfig] = None):
+    def __init__(self, config: Optional[DatabaseConfig] = None,
+                 max_size: int = 5, idle_timeout: float = 300.0):
         """
         Inizializza il gestore della connessione.
         
         Args:
             config: Configurazione del database. Se None, usa default.
+            max_size: Numero massimo di connessioni di sola lettura
+            idle_timeout: Secondi di inattività prima di chiudere un lettore
         """
         self.config = config or DatabaseConfig()
-        self._connection: Optional[sqlite3.Connection] = None
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self.pool = ConnectionPool(self.config, max_size, idle_timeout)
+        self._contesti = threading.local()
     
     def get_connection(self) -> sqlite3.Connection:
         """
-        Ottiene una connessione al database.
+        Ottiene una connessione di scrittura per il codice legacy.
+        
+        Deprecato: la connessione è separata dal writer del pool, che resta
+        in uso esclusivo alle unità di lavoro; il nuovo codice deve usare
+        get_db_cursor() o pool.connection().
         
         Returns:
             Connessione SQLite attiva
         """
-        if self._connection is None:
-            self._connection = sqlite3.connect(
-                self.config.db_path,
-                timeout=self.config.timeout,
-                isolation_level=self.config.isolation_level,
-                check_same_thread=False
-            )
-            
-            # Abilita foreign keys
-            self._connection.execute("PRAGMA foreign_keys = ON")
-            
-            # Imposta row factory per risultati come dizionari
-            self._connection.row_factory = sqlite3.Row
-            
-            self.config.logger.info(f"Connessione database aperta: {self.config.db_path}")
-        
-        return self._connection
+        return self.pool.connessione_legacy()
     
     def close(self):
-        """Chiude la connessione al database se aperta."""
-        if self._connection:
-            self._connection.close()
-            self._connection = None
-            self.config.logger.info("Connessione database chiusa")
+        """Chiude tutte le connessioni del pool; il pool resta riutilizzabile."""
+        self.pool.close()
+        self.pool = ConnectionPool(self.config, self._max_size, self._idle_timeout)
+        self.config.logger.info("Connessioni database chiuse")
     
     def __enter__(self):
-        """Context manager entry."""
-        return self.get_connection()
+        """Context manager entry: apre un'unità di lavoro con transaction()."""
+        contesto = transaction()
+        conn = contesto.__enter__()
+        if not hasattr(self._contesti, "pila"):
+            self._contesti.pila = []
+        self._contesti.pila.append(contesto)
+        return conn
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        """Context manager exit."""
-        if exc_type is None:
-            self.get_connection().commit()
-        else:
-            self.get_connection().rollback()
+        """Context manager exit: commit o rollback dell'unità di lavoro."""
+        contesto = self._contesti.pila.pop()
+        if exc_type is not None:
             self.config.logger.error(f"Transazione rollback per errore: {exc_val}")
+        return contesto.__exit__(exc_type, exc_val, exc_tb)
 
 
 # Singleton per connessione globale
 _db_connection: Optional[DatabaseConnection] = None
+_db_connection_lock = threading.Lock()
 
 
 def get_db_connection() -> DatabaseConnection:
@@ -114,29 +212,146 @@ def get_db_connection() -> DatabaseConnection:
     """
     global _db_connection
     if _db_connection is None:
-        _db_connection = DatabaseConnection()
+        with _db_connection_lock:
+            if _db_connection is None:
+                _db_connection = DatabaseConnection()
     return _db_connection
 
 
+def set_db_config(config: DatabaseConfig) -> DatabaseConnection:
+    """
+    Sostituisce la configurazione della connessione globale.
+    
+    Chiude l'eventuale connessione aperta; la successiva verrà aperta
+    con il nuovo percorso e profilo PRAGMA.
+    
+    Args:
+        config: Nuova configurazione del database
+    
+    Returns:
+        DatabaseConnection singleton configurata
+    """
+    global _db_connection
+    with _db_connection_lock:
+        if _db_connection is not None:
+            _db_connection.close()
+        _db_connection = DatabaseConnection(config)
+    return _db_connection
+
+
+# Profondità delle unità di lavoro aperte dal thread corrente
+_stato_transazioni = threading.local()
+
+
 @contextmanager
-def get_db_cursor():
+def transaction(savepoint: bool = True):
+    """
+    Apre un'unità di lavoro sulla connessione di scrittura.
+    
+    La scope più esterna apre la transazione (BEGIN IMMEDIATE) e fa un solo
+    commit all'uscita. Le scope annidate diventano SAVEPOINT: un errore al
+    loro interno annulla solo il lavoro del savepoint e l'eccezione risale.
+    
+    Args:
+        savepoint: Se False, una scope annidata si unisce alla transazione
+            esterna senza creare un savepoint
+    
+    Yields:
+        Connessione di scrittura in uso esclusivo al thread corrente
+    """
+    with get_db_connection().pool.connection() as conn:
+        profondita = getattr(_stato_transazioni, "profondita", 0)
+        nome_savepoint = None
+        if profondita == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        elif savepoint:
+            nome_savepoint = f"sp_{profondita}"
+            conn.execute(f"SAVEPOINT {nome_savepoint}")
+        _stato_transazioni.profondita = profondita + 1
+        try:
+            yield conn
+        except BaseException:
+            _stato_transazioni.profondita = profondita
+            if profondita == 0:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            elif nome_savepoint:
+                conn.execute(f"ROLLBACK TO {nome_savepoint}")
+                conn.execute(f"RELEASE {nome_savepoint}")
+            raise
+        _stato_transazioni.profondita = profondita
+        if profondita == 0:
+            # executescript() fa già commit della transazione aperta
+            if conn.in_transaction:
+                try:
+                    conn.execute("COMMIT")
+                except sqlite3.Error:
+                    conn.execute("ROLLBACK")
+                    raise
+        elif nome_savepoint:
+            conn.execute(f"RELEASE {nome_savepoint}")
+
+
+@contextmanager
+def lettura_coerente():
+    """
+    Esegue più letture sullo stesso stato del database senza usare il writer.
+    
+    Le letture del thread passano da un solo lettore del pool, in una
+    transazione di lettura (BEGIN DEFERRED): un import in corso non le
+    blocca e i suoi commit non diventano visibili a metà. Dentro
+    un'unità di lavoro aperta, o se anche le letture usano il writer
+    (database in memoria), non apre nulla e le letture vedono le modifiche
+    non ancora confermate.
+    
+    Yields:
+        Connessione usata per le letture
+    """
+    pool = get_db_connection().pool
+    with pool.connection(readonly=True) as conn:
+        if in_transaction() or pool.solo_writer or conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+
+
+def in_transaction() -> bool:
+    """Indica se il thread corrente ha un'unità di lavoro aperta."""
+    return getattr(_stato_transazioni, "profondita", 0) > 0
+
+
+@contextmanager
+def get_db_cursor(readonly: bool = False):
     """
     Context manager per ottenere un cursore database.
     
+    In scrittura il cursore partecipa all'unità di lavoro già aperta dal
+    thread; se non ce n'è una, ne apre una che fa commit all'uscita.
+    
+    Args:
+        readonly: Se True, usa una connessione di sola lettura del pool
+    
     Yields:
         Cursore SQLite per eseguire query
     """
-    conn = get_db_connection()
-    cursor = conn.get_connection().cursor()
-    try:
-        yield cursor
-        conn.get_connection().commit()
-    except Exception as e:
-        conn.get_connection().rollback()
-        logging.error(f"Errore database: {e}")
-        raise
-    finally:
-        cursor.close()
+    if readonly:
+        contesto = get_db_connection().pool.connection(readonly=True)
+    else:
+        contesto = transaction(savepoint=False)
+    with contesto as conn:
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        except Exception as e:
+            logging.error(f"Errore database: {e}")
+            raise
+        finally:
+            cursor.close()
 
 
 def init_database(force_recreate: bool = False):
@@ -146,11 +361,15 @@ def init_database(force_recreate: bool = False):
     Args:
         force_recreate: Se True, ricrea il database da zero
     """
-    config = DatabaseConfig()
+    config = get_db_connection().config
     
     # Se force_recreate, elimina il database esistente
     if force_recreate and os.path.exists(config.db_path):
+        get_db_connection().close()
         os.remove(config.db_path)
+        for suffisso in ("-wal", "-shm"):
+            if os.path.exists(config.db_path + suffisso):
+                os.remove(config.db_path + suffisso)
         config.logger.warning(f"Database eliminato: {config.db_path}")
     
     # Leggi lo schema SQL
@@ -161,7 +380,6 @@ def init_database(force_recreate: bool = False):
         schema_sql = f.read()
     
     # Esegui lo schema
-    conn = get_db_connection()
     with get_db_cursor() as cursor:
         cursor.executescript(schema_sql)
     
@@ -169,6 +387,10 @@ def init_database(force_recreate: bool = False):
     
     # Inserisci categorie predefinite se non esistono
     _inserisci_categorie_predefinite()
+    
+    # Applica le migrazioni successive allo schema iniziale
+    from src.database.migrations import migrate_to_latest
+    migrate_to_latest()
 
 
 def _inserisci_categorie_predefinite():
@@ -198,7 +420,7 @@ def backup_database(backup_dir: Optional[str] = None) -> str:
     Returns:
         Path del file di backup creato
     """
-    config = DatabaseConfig()
+    config = get_db_connection().config
     
     if backup_dir is None:
         backup_dir = Path(config.db_path).parent / "backups"
@@ -211,9 +433,14 @@ def backup_database(backup_dir: Optional[str] = None) -> str:
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     backup_file = backup_dir / f"backup_{timestamp}.db"
     
-    # Copia il database
-    import shutil
-    shutil.copy2(config.db_path, backup_file)
+    # Copia il database con la backup API: in WAL una copia del solo
+    # file principale potrebbe non includere le pagine ancora nel -wal
+    destinazione = sqlite3.connect(str(backup_file))
+    try:
+        with get_db_connection().pool.connection(readonly=True) as conn:
+            conn.backup(destinazione)
+    finally:
+        destinazione.close()
     
     config.logger.info(f"Backup creato: {backup_file}")
     return str(backup_file)
@@ -230,7 +457,7 @@ def execute_query(query: str, params: Optional[tuple] = None) -> List[Dict[str,
     Returns:
         Lista di dizionari con i risultati
     """
-    with get_db_cursor() as cursor:
+    with get_db_cursor(readonly=True) as cursor:
         if params:
             cursor.execute(query, params)
         else:
@@ -240,6 +467,37 @@ def execute_query(query: str, params: Optional[tuple] = None) -> List[Dict[str,
         return [dict(row) for row in cursor.fetchall()]
 
 
+def iter_query(query: str, params: Optional[tuple] = None,
+               dimensione_blocco: int = 500) -> Iterator[Dict[str, Any]]:
+    """
+    Esegue una query SELECT e restituisce i risultati un blocco alla volta.
+    
+    A differenza di execute_query non materializza tutto il risultato:
+    le righe vengono lette con fetchmany. La connessione di lettura resta
+    in uso finché il generatore non è esaurito o chiuso.
+    
+    Args:
+        query: Query SQL da eseguire
+        params: Parametri per la query (optional)
+        dimensione_blocco: Numero di righe lette per ogni fetchmany
+    
+    Yields:
+        Dizionari con i risultati, una riga alla volta
+    """
+    with get_db_cursor(readonly=True) as cursor:
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        
+        while True:
+            blocco = cursor.fetchmany(dimensione_blocco)
+            if not blocco:
+                break
+            for row in blocco:
+                yield dict(row)
+
+
 def execute_non_query(query: str, params: Optional[tuple] = None) -> int:
     """
     Esegue una query INSERT/UPDATE/DELETE.
@@ -264,6 +522,43 @@ def execute_non_query(query: str, params: Optional[tuple] = None) -> int:
             return cursor.rowcount
 
 
+def execute_returning(query: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+    """
+    Esegue una query INSERT/UPDATE/DELETE con clausola RETURNING.
+    
+    Richiede SQLite 3.35 o successivo (vedi SUPPORTA_RETURNING).
+    
+    Args:
+        query: Query SQL con clausola RETURNING
+        params: Parametri per la query (optional)
+    
+    Returns:
+        Lista di dizionari con le righe restituite
+    """
+    with get_db_cursor() as cursor:
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def execute_many(query: str, params_seq: Iterable[Sequence]) -> int:
+    """
+    Esegue la stessa query INSERT/UPDATE/DELETE per più insiemi di parametri.
+    
+    Args:
+        query: Query SQL da eseguire
+        params_seq: Sequenza di tuple di parametri, una per esecuzione
+    
+    Returns:
+        Numero totale di righe affected
+    """
+    with get_db_cursor() as cursor:
+        cursor.executemany(query, params_seq)
+        return cursor.rowcount
+
+
 def log_audit(tabella: str, operazione: str, id_record: int, 
               dati_precedenti: Optional[Dict] = None, 
               dati_nuovi: Optional[Dict] = None):
@@ -293,6 +588,33 @@ def log_audit(tabella: str, operazione: str, id_record: int,
     execute_non_query(query, params)
 
 
+def log_audit_many(tabella: str, operazione: str,
+                   record: Iterable[Tuple[int, Optional[Dict], Optional[Dict]]]):
+    """
+    Registra più operazioni nell'audit log con un solo executemany.
+    
+    Args:
+        tabella: Nome della tabella
+        operazione: Tipo di operazione (INSERT, UPDATE, DELETE)
+        record: Tuple (id_record, dati_precedenti, dati_nuovi)
+    """
+    query = """
+        INSERT INTO audit_log (tabella, operazione, id_record, dati_precedenti, dati_nuovi)
+        VALUES (?, ?, ?, ?, ?)
+    """
+    
+    execute_many(query, [
+        (
+            tabella,
+            operazione,
+            id_record,
+            json.dumps(dati_precedenti) if dati_precedenti else None,
+            json.dumps(dati_nuovi) if dati_nuovi else None
+        )
+        for id_record, dati_precedenti, dati_nuovi in record
+    ])
+
+
 def get_database_stats() -> Dict[str, Any]:
     """
     Ottiene statistiche sul database.
@@ -311,7 +633,7 @@ def get_database_stats() -> Dict[str, Any]:
         stats[f"{table}_count"] = result[0]['count'] if result else 0
     
     # Dimensione database
-    config = DatabaseConfig()
+    config = get_db_connection().config
     if os.path.exists(config.db_path):
         stats['database_size_mb'] = os.path.getsize(config.db_path) / (1024 * 1024)
     
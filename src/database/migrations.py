@@ -1,11 +1,218 @@
-from src.database.connection import db_cursor, get_connection
-from pathlib import Path
-import os
+from src.database.database_connection import get_db_cursor, get_db_connection, in_transaction
 
 # Esempio: lista hardcoded di migrazioni (in produzione meglio file separati)
 MIGRATIONS = [
     # (version, sql, description)
     (1, None, "Schema iniziale con tabelle base e viste"),
+    (2, """
+        -- Indici compositi per i filtri di CriteriTransazione ordinati per data
+        CREATE INDEX IF NOT EXISTS idx_transazione_conto_data ON transazione(id_conto_finanziario, data);
+        CREATE INDEX IF NOT EXISTS idx_transazione_categoria_data ON transazione(id_categoria, data);
+        CREATE INDEX IF NOT EXISTS idx_transazione_proprieta_data ON transazione(id_proprieta_associata, data);
+        CREATE INDEX IF NOT EXISTS idx_transazione_flusso_data ON transazione(tipo_flusso, data);
+    """, "Indici compositi per la ricerca transazioni"),
+    (3, """
+        -- Contatore delle modifiche per tabella, usato dalla cache dei dati di riferimento
+        CREATE TABLE IF NOT EXISTS versione_tabella (
+            tabella TEXT PRIMARY KEY,
+            versione INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT OR IGNORE INTO versione_tabella (tabella) VALUES
+            ('categoria_transazione'), ('conto_finanziario'), ('proprieta');
+        CREATE TRIGGER IF NOT EXISTS versione_categoria_transazione_insert AFTER INSERT ON categoria_transazione
+        BEGIN
+            UPDATE versione_tabella SET versione = versione + 1 WHERE tabella = 'categoria_transazione';
+        END;
+        CREATE TRIGGER IF NOT EXISTS versione_categoria_transazione_update AFTER UPDATE ON categoria_transazione
+        BEGIN
+            UPDATE versione_tabella SET versione = versione + 1 WHERE tabella = 'categoria_transazione';
+        END;
+        CREATE TRIGGER IF NOT EXISTS versione_categoria_transazione_delete AFTER DELETE ON categoria_transazione
+        BEGIN
+            UPDATE versione_tabella SET versione = versione + 1 WHERE tabella = 'categoria_transazione';
+        END;
+        CREATE TRIGGER IF NOT EXISTS versione_conto_finanziario_insert AFTER INSERT ON conto_finanziario
+        BEGIN
+            UPDATE versione_tabella SET versione = versione + 1 WHERE tabella = 'conto_finanziario';
+        END;
+        CREATE TRIGGER IF NOT EXISTS versione_conto_finanziario_update AFTER UPDATE ON conto_finanziario
+        BEGIN
+            UPDATE versione_tabella SET versione = versione + 1 WHERE tabella = 'conto_finanziario';
+        END;
+        CREATE TRIGGER IF NOT EXISTS versione_conto_finanziario_delete AFTER DELETE ON conto_finanziario
+        BEGIN
+            UPDATE versione_tabella SET versione = versione + 1 WHERE tabella = 'conto_finanziario';
+        END;
+        CREATE TRIGGER IF NOT EXISTS versione_proprieta_insert AFTER INSERT ON proprieta
+        BEGIN
+            UPDATE versione_tabella SET versione = versione + 1 WHERE tabella = 'proprieta';
+        END;
+        CREATE TRIGGER IF NOT EXISTS versione_proprieta_update AFTER UPDATE ON proprieta
+        BEGIN
+            UPDATE versione_tabella SET versione = versione + 1 WHERE tabella = 'proprieta';
+        END;
+        CREATE TRIGGER IF NOT EXISTS versione_proprieta_delete AFTER DELETE ON proprieta
+        BEGIN
+            UPDATE versione_tabella SET versione = versione + 1 WHERE tabella = 'proprieta';
+        END;
+    """, "Contatori di versione per le tabelle di riferimento"),
+    (4, """
+        -- Indice coprente per SUM(importo) per conto: il saldo si calcola senza leggere la tabella
+        CREATE INDEX IF NOT EXISTS idx_transazione_conto_importo ON transazione(id_conto_finanziario, importo);
+    """, "Indice coprente per il calcolo dei saldi"),
+    (5, """
+        -- Checkpoint mensili dei saldi: somma cumulata degli importi del conto
+        -- fino all'ultimo giorno del mese (saldo_iniziale escluso)
+        CREATE TABLE IF NOT EXISTS saldo_checkpoint (
+            id_conto INTEGER NOT NULL,
+            anno_mese TEXT NOT NULL, -- formato YYYY-MM
+            somma_cumulata REAL NOT NULL,
+            PRIMARY KEY (id_conto, anno_mese),
+            FOREIGN KEY (id_conto) REFERENCES conto_finanziario(id_conto) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+        -- Una scrittura datata invalida solo i checkpoint del suo conto dal suo mese in poi
+        CREATE TRIGGER IF NOT EXISTS saldo_checkpoint_transazione_insert AFTER INSERT ON transazione
+        BEGIN
+            DELETE FROM saldo_checkpoint
+            WHERE id_conto = NEW.id_conto_finanziario AND anno_mese >= substr(NEW.data, 1, 7);
+        END;
+        CREATE TRIGGER IF NOT EXISTS saldo_checkpoint_transazione_delete AFTER DELETE ON transazione
+        BEGIN
+            DELETE FROM saldo_checkpoint
+            WHERE id_conto = OLD.id_conto_finanziario AND anno_mese >= substr(OLD.data, 1, 7);
+        END;
+        CREATE TRIGGER IF NOT EXISTS saldo_checkpoint_transazione_update
+        AFTER UPDATE OF data, importo, id_conto_finanziario ON transazione
+        BEGIN
+            DELETE FROM saldo_checkpoint
+            WHERE id_conto = OLD.id_conto_finanziario AND anno_mese >= substr(OLD.data, 1, 7);
+            DELETE FROM saldo_checkpoint
+            WHERE id_conto = NEW.id_conto_finanziario AND anno_mese >= substr(NEW.data, 1, 7);
+        END;
+    """, "Checkpoint mensili per i saldi storici"),
+    (6, """
+        -- Aggregato mensile delle transazioni ("cubo"): conteggio, entrate e uscite per
+        -- mese, conto, categoria, proprietà (0 = nessuna), tipo di flusso e flag fiscale.
+        -- I trigger lo tengono allineato; AggregatoMensileRepository.ricostruisci lo ricalcola da zero.
+        CREATE TABLE IF NOT EXISTS aggregato_mensile (
+            anno_mese TEXT NOT NULL, -- formato YYYY-MM
+            id_conto_finanziario INTEGER NOT NULL,
+            id_categoria INTEGER NOT NULL,
+            id_proprieta_associata INTEGER NOT NULL DEFAULT 0,
+            tipo_flusso TEXT NOT NULL,
+            flag_deducibile_o_rilevante_fiscalmente INTEGER NOT NULL,
+            numero INTEGER NOT NULL,
+            entrate REAL NOT NULL,
+            uscite REAL NOT NULL,
+            PRIMARY KEY (anno_mese, id_conto_finanziario, id_categoria, id_proprieta_associata,
+                         tipo_flusso, flag_deducibile_o_rilevante_fiscalmente)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_aggregato_mensile_categoria ON aggregato_mensile(id_categoria, anno_mese);
+        CREATE INDEX IF NOT EXISTS idx_aggregato_mensile_proprieta ON aggregato_mensile(id_proprieta_associata, anno_mese);
+        INSERT OR IGNORE INTO aggregato_mensile
+        SELECT substr(data, 1, 7), id_conto_finanziario, id_categoria,
+               COALESCE(id_proprieta_associata, 0), tipo_flusso,
+               flag_deducibile_o_rilevante_fiscalmente, COUNT(*),
+               ROUND(COALESCE(SUM(CASE WHEN importo > 0 THEN importo END), 0), 2),
+               ROUND(COALESCE(-SUM(CASE WHEN importo < 0 THEN importo END), 0), 2)
+        FROM transazione
+        GROUP BY 1, 2, 3, 4, 5, 6;
+        CREATE TRIGGER IF NOT EXISTS aggregato_mensile_transazione_insert AFTER INSERT ON transazione
+        BEGIN
+            INSERT INTO aggregato_mensile VALUES (
+                substr(NEW.data, 1, 7), NEW.id_conto_finanziario, NEW.id_categoria,
+                COALESCE(NEW.id_proprieta_associata, 0), NEW.tipo_flusso,
+                NEW.flag_deducibile_o_rilevante_fiscalmente, 1,
+                CASE WHEN NEW.importo > 0 THEN NEW.importo ELSE 0 END,
+                CASE WHEN NEW.importo < 0 THEN -NEW.importo ELSE 0 END
+            )
+            ON CONFLICT DO UPDATE SET
+                numero = numero + 1,
+                entrate = ROUND(entrate + excluded.entrate, 2),
+                uscite = ROUND(uscite + excluded.uscite, 2);
+        END;
+        CREATE TRIGGER IF NOT EXISTS aggregato_mensile_transazione_delete AFTER DELETE ON transazione
+        BEGIN
+            UPDATE aggregato_mensile SET
+                numero = numero - 1,
+                entrate = ROUND(entrate - CASE WHEN OLD.importo > 0 THEN OLD.importo ELSE 0 END, 2),
+                uscite = ROUND(uscite - CASE WHEN OLD.importo < 0 THEN -OLD.importo ELSE 0 END, 2)
+            WHERE anno_mese = substr(OLD.data, 1, 7)
+              AND id_conto_finanziario = OLD.id_conto_finanziario
+              AND id_categoria = OLD.id_categoria
+              AND id_proprieta_associata = COALESCE(OLD.id_proprieta_associata, 0)
+              AND tipo_flusso = OLD.tipo_flusso
+              AND flag_deducibile_o_rilevante_fiscalmente = OLD.flag_deducibile_o_rilevante_fiscalmente;
+            DELETE FROM aggregato_mensile
+            WHERE numero <= 0
+              AND anno_mese = substr(OLD.data, 1, 7)
+              AND id_conto_finanziario = OLD.id_conto_finanziario
+              AND id_categoria = OLD.id_categoria
+              AND id_proprieta_associata = COALESCE(OLD.id_proprieta_associata, 0)
+              AND tipo_flusso = OLD.tipo_flusso
+              AND flag_deducibile_o_rilevante_fiscalmente = OLD.flag_deducibile_o_rilevante_fiscalmente;
+        END;
+        CREATE TRIGGER IF NOT EXISTS aggregato_mensile_transazione_update
+        AFTER UPDATE OF data, importo, id_conto_finanziario, id_categoria, id_proprieta_associata,
+                        tipo_flusso, flag_deducibile_o_rilevante_fiscalmente ON transazione
+        BEGIN
+            UPDATE aggregato_mensile SET
+                numero = numero - 1,
+                entrate = ROUND(entrate - CASE WHEN OLD.importo > 0 THEN OLD.importo ELSE 0 END, 2),
+                uscite = ROUND(uscite - CASE WHEN OLD.importo < 0 THEN -OLD.importo ELSE 0 END, 2)
+            WHERE anno_mese = substr(OLD.data, 1, 7)
+              AND id_conto_finanziario = OLD.id_conto_finanziario
+              AND id_categoria = OLD.id_categoria
+              AND id_proprieta_associata = COALESCE(OLD.id_proprieta_associata, 0)
+              AND tipo_flusso = OLD.tipo_flusso
+              AND flag_deducibile_o_rilevante_fiscalmente = OLD.flag_deducibile_o_rilevante_fiscalmente;
+            DELETE FROM aggregato_mensile
+            WHERE numero <= 0
+              AND anno_mese = substr(OLD.data, 1, 7)
+              AND id_conto_finanziario = OLD.id_conto_finanziario
+              AND id_categoria = OLD.id_categoria
+              AND id_proprieta_associata = COALESCE(OLD.id_proprieta_associata, 0)
+              AND tipo_flusso = OLD.tipo_flusso
+              AND flag_deducibile_o_rilevante_fiscalmente = OLD.flag_deducibile_o_rilevante_fiscalmente;
+            INSERT INTO aggregato_mensile VALUES (
+                substr(NEW.data, 1, 7), NEW.id_conto_finanziario, NEW.id_categoria,
+                COALESCE(NEW.id_proprieta_associata, 0), NEW.tipo_flusso,
+                NEW.flag_deducibile_o_rilevante_fiscalmente, 1,
+                CASE WHEN NEW.importo > 0 THEN NEW.importo ELSE 0 END,
+                CASE WHEN NEW.importo < 0 THEN -NEW.importo ELSE 0 END
+            )
+            ON CONFLICT DO UPDATE SET
+                numero = numero + 1,
+                entrate = ROUND(entrate + excluded.entrate, 2),
+                uscite = ROUND(uscite + excluded.uscite, 2);
+        END;
+    """, "Aggregato mensile delle transazioni mantenuto da trigger"),
+    (7, """
+        -- Contatore di versione anche per le transazioni, usato dalla cache dei report,
+        -- e identificativo casuale del database: un file ricreato non riusa i report salvati
+        INSERT OR IGNORE INTO versione_tabella (tabella) VALUES ('transazione');
+        INSERT OR IGNORE INTO versione_tabella (tabella, versione) VALUES ('istanza_database', abs(random()));
+        CREATE TRIGGER IF NOT EXISTS versione_transazione_insert AFTER INSERT ON transazione
+        BEGIN
+            UPDATE versione_tabella SET versione = versione + 1 WHERE tabella = 'transazione';
+        END;
+        CREATE TRIGGER IF NOT EXISTS versione_transazione_update AFTER UPDATE ON transazione
+        BEGIN
+            UPDATE versione_tabella SET versione = versione + 1 WHERE tabella = 'transazione';
+        END;
+        CREATE TRIGGER IF NOT EXISTS versione_transazione_delete AFTER DELETE ON transazione
+        BEGIN
+            UPDATE versione_tabella SET versione = versione + 1 WHERE tabella = 'transazione';
+        END;
+    """, "Contatore di versione delle transazioni per la cache dei report"),
+    (8, """
+        -- Impronta delle transazioni importate da estratto conto (hash di conto, data,
+        -- data valuta, importo in centesimi e descrizione normalizzata): l'indice unico
+        -- rende idempotente la reimportazione. NULL per le transazioni inserite a mano
+        ALTER TABLE transazione ADD COLUMN impronta TEXT;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_transazione_impronta
+            ON transazione(impronta) WHERE impronta IS NOT NULL;
+    """, "Impronta univoca delle transazioni importate"),
     # Aggiungi qui tuple (version, sql, description) per nuove migrazioni
 ]
 
@@ -13,7 +220,7 @@ def get_current_schema_version():
     """
     Ritorna la versione attuale dello schema dal database.
     """
-    with db_cursor() as cursor:
+    with get_db_cursor(readonly=True) as cursor:
         cursor.execute("SELECT MAX(version) FROM schema_version")
         row = cursor.fetchone()
         return row[0] if row and row[0] is not None else 0
@@ -21,15 +228,30 @@ def get_current_schema_version():
 def apply_migration(version, sql, description):
     """
     Applica una singola migrazione e aggiorna la tabella schema_version.
+
+    Lo script e la registrazione della versione vengono eseguiti in
+    un'unica transazione: se l'esecuzione si interrompe, nessuna delle due
+    resta applicata e la migrazione viene ripetuta al prossimo avvio
+    (altrimenti un ALTER TABLE già confermato fallirebbe con "duplicate
+    column name").
     """
-    if sql:
-        with db_cursor() as cursor:
-            cursor.executescript(sql)
-    with db_cursor() as cursor:
-        cursor.execute(
-            "INSERT INTO schema_version (version, description) VALUES (?, ?)",
-            (version, description)
-        )
+    if in_transaction():
+        # executescript() confermerebbe l'unità di lavoro aperta
+        raise RuntimeError("Le migrazioni non possono essere applicate dentro un'unità di lavoro aperta")
+    descrizione_sql = "'" + description.replace("'", "''") + "'"
+    script = (
+        "BEGIN IMMEDIATE;\n"
+        f"{sql or ''}\n"
+        f"INSERT INTO schema_version (version, description) VALUES ({int(version)}, {descrizione_sql});\n"
+        "COMMIT;"
+    )
+    with get_db_connection().pool.connection() as conn:
+        try:
+            conn.executescript(script)
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
 
 def migrate_to_latest():
     """
@@ -46,7 +268,7 @@ def list_migrations():
     """
     Mostra lo stato delle migrazioni applicate.
     """
-    with db_cursor() as cursor:
+    with get_db_cursor(readonly=True) as cursor:
         cursor.execute("SELECT version, applied_at, description FROM schema_version ORDER BY version")
         rows = cursor.fetchall()
         if not rows:
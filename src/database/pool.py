@@ -0,0 +1,353 @@
+"""
+# pool.py
+Pool di connessioni SQLite thread-safe.
+
+Il pool gestisce una sola connessione di scrittura, concessa in uso
+esclusivo a un thread per volta, e fino a max_size connessioni di sola
+lettura condivise tra i thread. Con journal_mode=WAL i lettori non
+vengono bloccati da un import in corso.
+
+Un thread che ha già in uso la connessione di scrittura la riusa anche
+per le letture, così vede le proprie modifiche non ancora confermate.
+Ogni connessione prestata ha un contatore dei riferimenti: torna al pool
+solo quando l'ultima richiesta che la usa è terminata, anche se questa
+(ad esempio un generatore con un cursore aperto) sopravvive a quella che
+l'ha ottenuta.
+"""
+
+import sqlite3
+import threading
+import time
+import logging
+import warnings
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from src.database.database_connection import DatabaseConfig
+
+
+class ConnectionPool:
+    """Pool di connessioni con un writer esclusivo e lettori in sola lettura."""
+
+    def __init__(self, config: "DatabaseConfig", max_size: int = 5,
+                 idle_timeout: float = 300.0,
+                 health_check_interval: float = 30.0):
+        """
+        Inizializza il pool.
+
+        Args:
+            config: Configurazione del database
+            max_size: Numero massimo di connessioni di sola lettura aperte
+            idle_timeout: Secondi dopo i quali un lettore inattivo viene chiuso
+            health_check_interval: Secondi di inattività dopo i quali una
+                connessione viene verificata prima di essere riusata
+        """
+        if max_size < 1:
+            raise ValueError("max_size deve essere almeno 1")
+
+        self.config = config
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.logger = logging.getLogger(__name__)
+
+        # Un database in memoria esiste solo nella connessione che lo ha
+        # creato: in quel caso anche le letture passano dal writer
+        self._solo_writer = config.db_path == ":memory:"
+
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.Lock()
+        self._writer_ultimo_uso = 0.0
+        # Thread che ha in uso il writer e richieste aperte su di esso
+        self._writer_proprietario: Optional[int] = None
+        self._writer_riferimenti = 0
+        # Connessione separata per il codice legacy (connessione_legacy)
+        self._legacy: Optional[sqlite3.Connection] = None
+
+        self._condizione = threading.Condition()
+        self._lettori_liberi: List[Tuple[sqlite3.Connection, float]] = []
+        self._lettori_aperti = 0
+        self._chiuso = False
+
+        # Per ogni thread: [lettore in uso, richieste aperte su di esso]
+        self._lettori_in_uso: Dict[int, List] = {}
+        self._statistiche = {
+            "connessioni_aperte": 0,
+            "connessioni_scartate": 0,
+            "lettori_rimossi_per_inattivita": 0,
+            "attese_pool_esaurito": 0,
+        }
+
+    def _incrementa(self, contatore: str):
+        """Incrementa un contatore statistico in modo thread-safe."""
+        with self._condizione:
+            self._statistiche[contatore] += 1
+
+    def _apri(self, readonly: bool) -> sqlite3.Connection:
+        """Apre una nuova connessione e applica il profilo PRAGMA."""
+        conn = sqlite3.connect(
+            self.config.db_path,
+            timeout=self.config.timeout,
+            isolation_level=self.config.isolation_level,
+            check_same_thread=False
+        )
+        self.config.apply_pragmas(conn)
+        conn.row_factory = sqlite3.Row
+        if readonly:
+            conn.execute("PRAGMA query_only = ON")
+        self._incrementa("connessioni_aperte")
+        self.logger.debug(
+            f"Aperta connessione {'lettura' if readonly else 'scrittura'}: {self.config.db_path}"
+        )
+        return conn
+
+    def _verifica(self, conn: sqlite3.Connection, ultimo_uso: float) -> bool:
+        """
+        Verifica che una connessione inattiva sia ancora utilizzabile.
+
+        Returns:
+            True se la connessione è sana, False se è stata scartata
+        """
+        if time.monotonic() - ultimo_uso < self.health_check_interval:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            self.logger.warning(f"Connessione scartata dopo health check fallito: {e}")
+            self._incrementa("connessioni_scartate")
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            return False
+
+    def _rimuovi_lettori_inattivi(self):
+        """Chiude i lettori inattivi da più di idle_timeout. Chiamare con il lock."""
+        adesso = time.monotonic()
+        ancora_validi = []
+        for conn, ultimo_uso in self._lettori_liberi:
+            if adesso - ultimo_uso > self.idle_timeout:
+                conn.close()
+                self._lettori_aperti -= 1
+                self._incrementa("lettori_rimossi_per_inattivita")
+            else:
+                ancora_validi.append((conn, ultimo_uso))
+        self._lettori_liberi = ancora_validi
+
+    def _prendi_lettore(self) -> sqlite3.Connection:
+        """Preleva un lettore libero, ne apre uno nuovo o attende."""
+        scadenza = time.monotonic() + self.config.timeout
+        with self._condizione:
+            while True:
+                if self._chiuso:
+                    raise sqlite3.ProgrammingError("Pool di connessioni chiuso")
+                self._rimuovi_lettori_inattivi()
+                while self._lettori_liberi:
+                    conn, ultimo_uso = self._lettori_liberi.pop()
+                    if self._verifica(conn, ultimo_uso):
+                        return conn
+                    self._lettori_aperti -= 1
+                if self._lettori_aperti < self.max_size:
+                    self._lettori_aperti += 1
+                    break
+                rimanente = scadenza - time.monotonic()
+                if rimanente <= 0:
+                    raise sqlite3.OperationalError(
+                        f"Pool di connessioni esaurito ({self.max_size} lettori in uso)"
+                    )
+                self._incrementa("attese_pool_esaurito")
+                self._condizione.wait(rimanente)
+        try:
+            return self._apri(readonly=True)
+        except Exception:
+            with self._condizione:
+                self._lettori_aperti -= 1
+                self._condizione.notify()
+            raise
+
+    def _restituisci_lettore(self, conn: sqlite3.Connection):
+        """Rimette un lettore nel pool e sveglia un eventuale thread in attesa."""
+        with self._condizione:
+            if self._chiuso:
+                conn.close()
+                self._lettori_aperti -= 1
+            else:
+                self._lettori_liberi.append((conn, time.monotonic()))
+            self._condizione.notify()
+
+    def _prendi_writer(self) -> sqlite3.Connection:
+        """Acquisisce in esclusiva la connessione di scrittura."""
+        if not self._writer_lock.acquire(timeout=self.config.timeout):
+            raise sqlite3.OperationalError("Timeout in attesa della connessione di scrittura")
+        try:
+            if self._chiuso:
+                raise sqlite3.ProgrammingError("Pool di connessioni chiuso")
+            if self._writer is not None and not self._verifica(self._writer, self._writer_ultimo_uso):
+                self._writer = None
+            if self._writer is None:
+                self._writer = self._apri(readonly=False)
+            return self._writer
+        except Exception:
+            self._writer_lock.release()
+            raise
+
+    def _restituisci_writer(self):
+        """Rilascia la connessione di scrittura."""
+        self._writer_ultimo_uso = time.monotonic()
+        self._writer_lock.release()
+
+    def _rilascia_writer(self):
+        """Chiude una richiesta sul writer; all'ultima lo rilascia."""
+        with self._condizione:
+            self._writer_riferimenti -= 1
+            if self._writer_riferimenti > 0:
+                return
+            self._writer_proprietario = None
+        self._restituisci_writer()
+
+    def _rilascia_lettore(self, thread_id: int):
+        """Chiude una richiesta sul lettore del thread; all'ultima lo rimette nel pool."""
+        with self._condizione:
+            voce = self._lettori_in_uso[thread_id]
+            voce[1] -= 1
+            if voce[1] > 0:
+                return
+            del self._lettori_in_uso[thread_id]
+        self._restituisci_lettore(voce[0])
+
+    @contextmanager
+    def connection(self, readonly: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Presta una connessione al thread corrente.
+
+        Le richieste annidate nello stesso thread riusano la connessione
+        già ottenuta; una richiesta di lettura dentro una di scrittura usa
+        il writer. La connessione torna al pool quando si chiude l'ultima
+        richiesta che la usa, in qualunque ordine vengano chiuse.
+
+        Args:
+            readonly: Se True, ottiene una connessione di sola lettura
+
+        Yields:
+            Connessione SQLite in uso esclusivo al thread corrente
+        """
+        thread_id = threading.get_ident()
+
+        # Il thread ha già il writer: lo riusa per tutto
+        with self._condizione:
+            ha_writer = self._writer_proprietario == thread_id
+            if ha_writer:
+                self._writer_riferimenti += 1
+        if ha_writer:
+            try:
+                yield self._writer
+            finally:
+                self._rilascia_writer()
+            return
+
+        if readonly and not self._solo_writer:
+            # Lettura annidata in un'altra lettura ancora aperta: stesso lettore
+            with self._condizione:
+                voce = self._lettori_in_uso.get(thread_id)
+                if voce is not None:
+                    voce[1] += 1
+            if voce is None:
+                conn = self._prendi_lettore()
+                with self._condizione:
+                    self._lettori_in_uso[thread_id] = [conn, 1]
+            else:
+                conn = voce[0]
+            try:
+                yield conn
+            finally:
+                self._rilascia_lettore(thread_id)
+            return
+
+        conn = self._prendi_writer()
+        with self._condizione:
+            self._writer_proprietario = thread_id
+            self._writer_riferimenti = 1
+        try:
+            yield conn
+        finally:
+            self._rilascia_writer()
+
+    def connessione_legacy(self) -> sqlite3.Connection:
+        """
+        Restituisce una connessione di scrittura separata dal writer del pool.
+
+        Deprecato: mantenuto per il codice che usa direttamente la
+        connessione, senza passare da connection(). La connessione non è il
+        writer del pool, così non può interferire con un'unità di lavoro di
+        un altro thread; i conflitti di scrittura sono gestiti da SQLite
+        (busy_timeout).
+
+        Raises:
+            sqlite3.ProgrammingError: Per un database in memoria, visibile
+                solo dal writer del pool
+        """
+        warnings.warn(
+            "La connessione diretta è deprecata: usare get_db_cursor() o pool.connection()",
+            DeprecationWarning, stacklevel=3
+        )
+        if self._solo_writer:
+            raise sqlite3.ProgrammingError(
+                "Un database in memoria è accessibile solo tramite pool.connection()"
+            )
+        with self._condizione:
+            if self._chiuso:
+                raise sqlite3.ProgrammingError("Pool di connessioni chiuso")
+            if self._legacy is None:
+                self._legacy = self._apri(readonly=False)
+            return self._legacy
+
+    @property
+    def solo_writer(self) -> bool:
+        """True se anche le letture usano il writer (database in memoria)."""
+        return self._solo_writer
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Restituisce statistiche sull'uso del pool.
+
+        Returns:
+            Dizionario con contatori e connessioni attualmente aperte
+        """
+        with self._condizione:
+            stats = dict(self._statistiche)
+            stats["lettori_aperti"] = self._lettori_aperti
+            stats["lettori_liberi"] = len(self._lettori_liberi)
+            stats["writer_aperto"] = int(self._writer is not None)
+            return stats
+
+    def close(self):
+        """
+        Chiude tutte le connessioni inattive e il writer.
+
+        Raises:
+            sqlite3.ProgrammingError: se il thread corrente usa ancora il writer
+            sqlite3.OperationalError: se il writer non si libera entro il timeout
+        """
+        if self._writer_proprietario == threading.get_ident():
+            raise sqlite3.ProgrammingError(
+                "Impossibile chiudere il pool mentre il thread corrente usa il writer")
+        with self._condizione:
+            self._chiuso = True
+            for conn, _ in self._lettori_liberi:
+                conn.close()
+                self._lettori_aperti -= 1
+            self._lettori_liberi = []
+            if self._legacy is not None:
+                self._legacy.close()
+                self._legacy = None
+            self._condizione.notify_all()
+        if not self._writer_lock.acquire(timeout=self.config.timeout):
+            raise sqlite3.OperationalError("Timeout in attesa della connessione di scrittura")
+        try:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        finally:
+            self._writer_lock.release()
@@ -4,32 +4,35 @@ Importa automaticamente le transazioni dall'estratto conto nel database.
 """
 
 import sys
+import time
 from pathlib import Path
 from datetime import datetime, date
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 # Aggiungi path per importare i moduli del sistema
 sys.path.insert(0, str(Path(__file__).parent / 'src'))
 
 from src.ingestion.bper_parser_improved import BPERParser
+from src.ingestion.cache_parsing import CacheParsing
 from src.models.conto_finanziario import (
     ContoFinanziario,
     TipoConto
 )
 from src.models.categoria_transazione import CategoriaTransazione
-from src.database.database_connection import init_database, get_db_cursor
+from src.database.database_connection import init_database, get_db_cursor, transaction
 from src.repositories.conto_repository import ContoRepository
 from src.repositories.categoria_repository import CategoriaRepository
 from src.repositories.transazione_repository import TransazioneRepository
 from src.services.saldo_calculator import SaldoCalculator
-from src.models.transazione import TipoFlusso
+from src.models.transazione import Transazione, TipoFlusso
 
 
 class BPERImporter:
     """Importa transazioni da estratti conto BPER nel sistema di gestione finanziaria."""
     
-    def __init__(self):
-        self.parser = BPERParser()
+    def __init__(self, cache: Optional[CacheParsing] = None):
+        # cache: se impostata, un PDF già analizzato non viene riletto con pdfplumber
+        self.parser = BPERParser(cache=cache)
         self.conto_repo = ContoRepository()
         self.categoria_repo = CategoriaRepository()
         self.transazione_repo = TransazioneRepository()
@@ -53,13 +56,18 @@ class BPERImporter:
             'Altro': 'Altro Personale'
         }
     
-    def import_from_pdf(self, pdf_path: str, conto_id: Optional[int] = None) -> Dict:
+    def import_from_pdf(self, pdf_path: str, conto_id: Optional[int] = None,
+                        bulk: bool = True) -> Dict:
         """
         Importa transazioni da un PDF BPER.
         
         Args:
             pdf_path: Percorso del file PDF
             conto_id: ID del conto nel sistema (se None, cerca o crea)
+            bulk: Se True (default) inserisce tutte le righe in un'unica
+                transazione e aggiorna il saldo una volta sola; se una
+                scrittura fallisce non viene importato nulla. Se False
+                importa riga per riga, saltando le righe in errore
             
         Returns:
             Dizionario con risultati dell'importazione
@@ -84,15 +92,20 @@ class BPERImporter:
         
         # 4. Importa transazioni
         print("\n4. Importazione transazioni...")
-        risultati = self._import_transactions(
+        importa = self._import_transactions_bulk if bulk else self._import_transactions
+        inizio = time.perf_counter()
+        risultati = importa(
             data['transazioni'], 
             conto.id_conto, 
             categoria_map
         )
+        durata = time.perf_counter() - inizio
+        risultati['durata_secondi'] = round(durata, 3)
+        risultati['righe_al_secondo'] = round(len(data['transazioni']) / durata, 1) if durata > 0 else None
         
-        # 5. Aggiorna saldo conto
+        # 5. Aggiorna saldo conto (in modalità bulk già aggiornato nella stessa transazione)
         print("\n5. Aggiornamento saldo conto...")
-        nuovo_saldo = self._update_account_balance(conto, data['riepilogo'])
+        nuovo_saldo = self._update_account_balance(conto, data['riepilogo'], risultati.get('saldo_conto'))
         print(f"   ✓ Nuovo saldo: €{nuovo_saldo:.2f}")
         
         # 6. Genera report
@@ -162,10 +175,42 @@ class BPERImporter:
         
         return categoria_map
     
+    def _prepara_transazione(self, trans_data: Dict, conto_id: int,
+                             categoria_map: Dict[str, int]) -> Transazione:
+        """Costruisce la transazione da una riga dell'estratto, risolvendo categoria e flag in memoria."""
+        # Determina categoria
+        cat_suggerita = trans_data.get('categoria_suggerita', 'Altro')
+        cat_sistema = self.categoria_mapping.get(cat_suggerita, 'Altro Personale')
+        id_categoria = categoria_map.get(cat_sistema, 
+                                       categoria_map.get('Altro Personale', 1))
+        
+        # Determina tipo flusso
+        tipo_flusso = self._determine_tipo_flusso(trans_data['descrizione'])
+        
+        return Transazione(
+            data=trans_data['data_transazione'],
+            importo=trans_data['importo'],
+            descrizione=trans_data['descrizione'][:200],  # Limita lunghezza
+            id_categoria=id_categoria,
+            id_conto_finanziario=conto_id,
+            tipo_flusso=tipo_flusso,
+            flag_deducibile_o_rilevante_fiscalmente=self._is_deducibile(
+                trans_data['descrizione'], 
+                cat_sistema
+            ),
+            note_aggiuntive=f"Importato da BPER - Data valuta: {trans_data['data_valuta']}"
+        )
+    
     def _import_transactions(self, transazioni: List[Dict], 
                            conto_id: int, 
                            categoria_map: Dict[str, int]) -> Dict:
-        """Importa le transazioni nel database."""
+        """
+        Importa le transazioni nel database una alla volta.
+        
+        Le transazioni già presenti nel periodo dell'estratto vengono lette
+        con una sola query; ogni riga nuova è un singolo INSERT ... ON
+        CONFLICT DO NOTHING sull'indice unico dell'impronta.
+        """
         risultati = {
             'importate': 0,
             'duplicate': 0,
@@ -173,38 +218,26 @@ class BPERImporter:
             'dettagli_errori': []
         }
         
-        for trans_data in transazioni:
+        impronte = self._impronte_estratto(transazioni, conto_id)
+        date_estratto = [t['data_transazione'] for t in transazioni if t.get('data_transazione')]
+        presenti, senza_impronta = self._transazioni_presenti(
+            conto_id, min(date_estratto), max(date_estratto)
+        ) if date_estratto else (set(), {})
+        for trans_data, impronta in zip(transazioni, impronte):
+            if impronta is None:
+                self._registra_senza_data(risultati, trans_data)
+                continue
             try:
                 # Verifica se già esiste
-                if self._transaction_exists(trans_data, conto_id):
+                if impronta in presenti or self._e_duplicato(
+                        trans_data, senza_impronta.get(str(trans_data['data_transazione']), [])):
                     risultati['duplicate'] += 1
                     continue
                 
-                # Determina categoria
-                cat_suggerita = trans_data.get('categoria_suggerita', 'Altro')
-                cat_sistema = self.categoria_mapping.get(cat_suggerita, 'Altro Personale')
-                id_categoria = categoria_map.get(cat_sistema, 
-                                               categoria_map.get('Altro Personale', 1))
-                
-                # Determina tipo flusso
-                tipo_flusso = self._determine_tipo_flusso(trans_data['descrizione'])
-                
-                # Crea transazione
-                transazione = Transazione(
-                    data=trans_data['data_transazione'],
-                    importo=trans_data['importo'],
-                    descrizione=trans_data['descrizione'][:200],  # Limita lunghezza
-                    id_categoria=id_categoria,
-                    id_conto_finanziario=conto_id,
-                    tipo_flusso=tipo_flusso,
-                    flag_deducibile_o_rilevante_fiscalmente=self._is_deducibile(
-                        trans_data['descrizione'], 
-                        cat_sistema
-                    ),
-                    note_aggiuntive=f"Importato da BPER - Data valuta: {trans_data['data_valuta']}"
-                )
-                
-                self.transazione_repo.create(transazione)
+                transazione = self._prepara_transazione(trans_data, conto_id, categoria_map)
+                if self.transazione_repo.create_nuova(transazione, impronta) is None:
+                    risultati['duplicate'] += 1
+                    continue
                 risultati['importate'] += 1
                 
                 # Progress
@@ -220,23 +253,134 @@ class BPERImporter:
         
         return risultati
     
-    def _transaction_exists(self, trans_data: Dict, conto_id: int) -> bool:
-        """Verifica se una transazione esiste già (per evitare duplicati)."""
-        # Cerca transazioni simili nella stessa data
-        transazioni_esistenti = self.transazione_repo.get_by_date_range(
-            trans_data['data_transazione'],
-            trans_data['data_transazione'],
-            conto_id
-        )
+    def _import_transactions_bulk(self, transazioni: List[Dict],
+                                  conto_id: int,
+                                  categoria_map: Dict[str, int]) -> Dict:
+        """
+        Importa le transazioni con un unico executemany.
         
-        for trans in transazioni_esistenti:
-            # Confronta importo e parte della descrizione
-            if (abs(trans.importo - trans_data['importo']) < 0.01 and
-                trans_data['descrizione'][:30] in trans.descrizione):
-                return True
+        Le righe vengono preparate in memoria e confrontate con le impronte
+        già presenti nel periodo dell'estratto (lette con una sola query);
+        l'indice unico sull'impronta scarta comunque ogni riga già importata.
+        Insert e aggiornamento del saldo avvengono nella stessa transazione:
+        se una scrittura fallisce non viene importato nulla.
+        """
+        risultati = {
+            'importate': 0,
+            'duplicate': 0,
+            'errori': 0,
+            'dettagli_errori': []
+        }
+        
+        impronte = self._impronte_estratto(transazioni, conto_id)
+        date_estratto = [t['data_transazione'] for t in transazioni if t.get('data_transazione')]
+        presenti, senza_impronta = self._transazioni_presenti(
+            conto_id, min(date_estratto), max(date_estratto)
+        ) if date_estratto else (set(), {})
+        
+        da_inserire = []
+        impronte_da_inserire = []
+        for trans_data, impronta in zip(transazioni, impronte):
+            if impronta is None:
+                self._registra_senza_data(risultati, trans_data)
+                continue
+            try:
+                if impronta in presenti or self._e_duplicato(
+                        trans_data, senza_impronta.get(str(trans_data['data_transazione']), [])):
+                    risultati['duplicate'] += 1
+                    continue
+                transazione = self._prepara_transazione(trans_data, conto_id, categoria_map)
+            except Exception as e:
+                risultati['errori'] += 1
+                risultati['dettagli_errori'].append({
+                    'transazione': trans_data,
+                    'errore': str(e)
+                })
+                continue
+            da_inserire.append(transazione)
+            impronte_da_inserire.append(impronta)
+        
+        with transaction():
+            create = self.transazione_repo.create_many_nuove(da_inserire, impronte_da_inserire)
+            variazione = round(sum(t.importo for t in create), 2)
+            nuovi_saldi = self.conto_repo.applica_variazioni_saldo({conto_id: variazione})
+            if conto_id in nuovi_saldi:
+                risultati['saldo_conto'] = nuovi_saldi[conto_id]
+            else:
+                # Nessuna variazione: il saldo resta quello registrato
+                risultati['saldo_conto'] = self.conto_repo.get_by_id(conto_id).saldo_attuale
+        risultati['importate'] = len(create)
+        risultati['duplicate'] += len(da_inserire) - len(create)
         
+        return risultati
+    
+    def _impronte_estratto(self, transazioni: List[Dict], conto_id: int) -> List[Optional[str]]:
+        """
+        Calcola l'impronta di ogni riga dell'estratto.
+        
+        Righe identiche nello stesso estratto (es. due pagamenti uguali nello
+        stesso giorno) ricevono un numero di occorrenza diverso: vengono
+        importate entrambe, e una nuova importazione dello stesso estratto
+        le riconosce entrambe. None per le righe senza data.
+        """
+        occorrenze: Dict[str, int] = {}
+        impronte = []
+        for trans_data in transazioni:
+            if not trans_data.get('data_transazione'):
+                impronte.append(None)
+                continue
+            argomenti = (conto_id, trans_data['data_transazione'], trans_data.get('data_valuta'),
+                         trans_data['importo'], trans_data['descrizione'][:200])
+            base = TransazioneRepository.calcola_impronta(*argomenti)
+            occorrenza = occorrenze.get(base, 0)
+            occorrenze[base] = occorrenza + 1
+            impronte.append(TransazioneRepository.calcola_impronta(*argomenti, occorrenza=occorrenza))
+        return impronte
+    
+    @staticmethod
+    def _registra_senza_data(risultati: Dict, trans_data: Dict):
+        """Conta come errore una riga senza data: non ha impronta e non può essere importata."""
+        risultati['errori'] += 1
+        risultati['dettagli_errori'].append({
+            'transazione': trans_data,
+            'errore': "Data della transazione mancante"
+        })
+    
+    def _transazioni_presenti(self, conto_id: int, data_inizio: date,
+                              data_fine: date) -> Tuple[set, Dict[str, List[Tuple[float, str]]]]:
+        """
+        Legge le transazioni del conto nel periodo: impronte note e, per
+        giorno, importo e descrizione di quelle senza impronta (importate
+        prima dell'introduzione delle impronte o inserite a mano).
+        """
+        presenti = set()
+        senza_impronta: Dict[str, List[Tuple[float, str]]] = {}
+        for riga in self.transazione_repo.impronte_nel_periodo(conto_id, data_inizio, data_fine):
+            if riga['impronta']:
+                presenti.add(riga['impronta'])
+            else:
+                senza_impronta.setdefault(riga['data'], []).append((riga['importo'], riga['descrizione']))
+        return presenti, senza_impronta
+    
+    @staticmethod
+    def _e_duplicato(trans_data: Dict, transazioni_del_giorno: List[Tuple[float, str]]) -> bool:
+        """Confronta importo e inizio della descrizione con le transazioni dello stesso giorno."""
+        for importo, descrizione in transazioni_del_giorno:
+            if (abs(importo - trans_data['importo']) < 0.01 and
+                trans_data['descrizione'][:30] in descrizione):
+                return True
         return False
     
+    def _transaction_exists(self, trans_data: Dict, conto_id: int, impronta: Optional[str] = None) -> bool:
+        """Verifica se una transazione esiste già (per evitare duplicati)."""
+        # Cerca transazioni nella stessa data: per impronta o, se senza impronta, per importo e descrizione
+        presenti, senza_impronta = self._transazioni_presenti(
+            conto_id, trans_data['data_transazione'], trans_data['data_transazione']
+        )
+        return impronta in presenti or self._e_duplicato(
+            trans_data, senza_impronta.get(str(trans_data['data_transazione']), [])
+        )
+    
     def _determine_tipo_flusso(self, descrizione: str) -> TipoFlusso:
         """Determina il tipo di flusso dalla descrizione."""
         desc_lower = descrizione.lower()
@@ -271,10 +415,16 @@ class BPERImporter:
         return any(word in desc_lower for word in parole_deducibili)
     
     def _update_account_balance(self, conto: ContoFinanziario, 
-                              riepilogo: Dict) -> float:
-        """Aggiorna il saldo del conto basandosi sull'estratto."""
-        # Usa il calcolatore per ricalcolare il saldo
-        nuovo_saldo = self.saldo_calculator.calcola_saldo_conto(conto.id_conto)
+                              riepilogo: Dict,
+                              nuovo_saldo: Optional[float] = None) -> float:
+        """
+        Aggiorna il saldo del conto e lo confronta con quello dell'estratto.
+        
+        nuovo_saldo è il saldo già aggiornato dall'importazione bulk; se
+        None il saldo viene ricalcolato e salvato.
+        """
+        if nuovo_saldo is None:
+            nuovo_saldo = self.saldo_calculator.ricalcola_e_aggiorna_saldo_conto(conto.id_conto).saldo_attuale
         
         # Verifica con saldo finale dell'estratto
         saldo_estratto = riepilogo.get('saldo_finale', {}).get('importo', 0)
@@ -291,6 +441,9 @@ class BPERImporter:
         print(f"Transazioni importate: {risultati['importate']}")
         print(f"Transazioni duplicate: {risultati['duplicate']}")
         print(f"Errori: {risultati['errori']}")
+        if risultati.get('righe_al_secondo') is not None:
+            print(f"Tempo di importazione: {risultati['durata_secondi']:.3f}s "
+                  f"({risultati['righe_al_secondo']:.1f} righe/s)")
         
         if risultati['errori'] > 0:
             print("\nErrori riscontrati:")
@@ -1,18 +1,167 @@
 import pdfplumber
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, date
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 import logging
 
+from src.config import settings
+from src.ingestion.cache_parsing import CacheParsing
+
 # Configurazione logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Pagine minime per processo: sotto questa soglia l'avvio dei processi costa più dell'estrazione
+PAGINE_MINIME_PER_PROCESSO = 2
+
+
+def _estrai_testo_pagine(pdf_path: str, inizio: int, fine: int) -> List[Optional[str]]:
+    """
+    Estrae il testo delle pagine [inizio, fine) di un PDF.
+    
+    Funzione di modulo: viene eseguita nei processi del pool, ognuno dei
+    quali apre il PDF per conto proprio.
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        return _testi_pagine(pdf, inizio, fine)
+
+
+def _testi_pagine(pdf, inizio: int, fine: int) -> List[Optional[str]]:
+    """Estrae il testo delle pagine [inizio, fine) di un PDF aperto, liberando ogni pagina dopo l'uso."""
+    testi = []
+    for i in range(inizio, fine):
+        page = pdf.pages[i]
+        testi.append(page.extract_text())
+        _rilascia_pagina(page)
+    return testi
+
+
+def _rilascia_pagina(page):
+    """
+    Libera le cache di una pagina pdfplumber (oggetti, layout e mappa del
+    testo), che altrimenti restano in memoria fino alla chiusura del PDF.
+    """
+    if hasattr(page, "close"):
+        page.close()
+        return
+    page.flush_cache()
+    # Fino a pdfplumber 0.10 la mappa del testo è in un lru_cache non svuotato da flush_cache
+    get_textmap = getattr(page, "get_textmap", None)
+    if hasattr(get_textmap, "cache_clear"):
+        get_textmap.cache_clear()
+
+
+def _processi_configurati() -> int:
+    """Numero di processi da settings o dalla variabile d'ambiente GESTFIN_PDF_PARSER_PROCESSI."""
+    valore = os.environ.get("GESTFIN_PDF_PARSER_PROCESSI")
+    return int(valore) if valore else settings.PDF_PARSER_PROCESSI
+
+
+class StatisticheIncrementali:
+    """
+    Statistiche sulle transazioni calcolate una transazione alla volta.
+    
+    Tiene solo contatori e totali, così le statistiche non richiedono la
+    lista completa delle transazioni. La lista dei numeri progressivi per
+    categoria ('transazioni') cresce con le righe e viene tenuta solo con
+    con_progressivi=True, per compatibilità con la forma di 'statistiche'
+    restituita da parse().
+    """
+    
+    def __init__(self, con_progressivi: bool = True):
+        self.con_progressivi = con_progressivi
+        self.numero = 0
+        self.numero_entrate = 0
+        self.numero_uscite = 0
+        self.totale_entrate = 0
+        self.somma_uscite = 0
+        self.saldo_movimento = 0
+        self.max_entrata = None
+        self.min_uscita = None
+        self.categorie: Dict[str, Dict] = {}
+    
+    def aggiungi(self, trans: Dict):
+        """Aggiunge una transazione (con numero_progressivo) alle statistiche."""
+        importo = trans['importo']
+        self.numero += 1
+        self.saldo_movimento += importo
+        if importo > 0:
+            self.numero_entrate += 1
+            self.totale_entrate += importo
+            self.max_entrata = importo if self.max_entrata is None else max(self.max_entrata, importo)
+        elif importo < 0:
+            self.numero_uscite += 1
+            self.somma_uscite += importo
+            self.min_uscita = importo if self.min_uscita is None else min(self.min_uscita, importo)
+        
+        cat = trans.get('categoria_suggerita', 'Altro')
+        if cat not in self.categorie:
+            self.categorie[cat] = {
+                'numero': 0,
+                'totale': 0
+            }
+            if self.con_progressivi:
+                self.categorie[cat]['transazioni'] = []
+        self.categorie[cat]['numero'] += 1
+        self.categorie[cat]['totale'] += importo
+        if self.con_progressivi:
+            self.categorie[cat]['transazioni'].append(trans['numero_progressivo'])
+    
+    def risultato(self) -> Dict:
+        """Restituisce le statistiche (dizionario vuoto se non ci sono transazioni)."""
+        if not self.numero:
+            return {}
+        
+        totale_uscite = abs(self.somma_uscite)
+        stats = {
+            'numero_transazioni': self.numero,
+            'numero_entrate': self.numero_entrate,
+            'numero_uscite': self.numero_uscite,
+            'totale_entrate': self.totale_entrate,
+            'totale_uscite': totale_uscite,
+            'saldo_movimento': self.saldo_movimento,
+            'media_entrate': 0,
+            'media_uscite': 0,
+            'max_entrata': 0,
+            'max_uscita': 0,
+            'categorie': self.categorie
+        }
+        
+        # Calcola medie
+        if self.numero_entrate > 0:
+            stats['media_entrate'] = round(self.totale_entrate / self.numero_entrate, 2)
+            stats['max_entrata'] = self.max_entrata
+        
+        if self.numero_uscite > 0:
+            stats['media_uscite'] = round(totale_uscite / self.numero_uscite, 2)
+            stats['max_uscita'] = abs(self.min_uscita)
+        
+        return stats
+
+
 class BPERParser:
     """Parser migliorato per estratti conto BPER."""
     
-    def __init__(self):
+    # Versione del risultato di parse(): va incrementata a ogni modifica che
+    # cambia i dati estratti, così la cache di parsing scarta i risultati vecchi
+    VERSIONE = 1
+    
+    def __init__(self, processi: Optional[int] = None, cache: Optional[CacheParsing] = None):
+        """
+        Args:
+            processi: Processi per l'estrazione del testo delle pagine
+                (1 = sequenziale, 0 = uno per core); default da settings
+            cache: Cache dei risultati di parse() (optional)
+        """
+        self.cache = cache
+        processi = _processi_configurati() if processi is None else processi
+        if processi < 0:
+            raise ValueError("Il numero di processi non può essere negativo")
+        self.processi = processi if processi > 0 else (os.cpu_count() or 1)
         # Pattern regex ottimizzati per il formato BPER
         self.patterns = {
             'iban': r'IBAN\s+([A-Z]{2}\s*\d{2}\s*[A-Z]\s*\d{5}\s*\d{5}\s*\d+)',
@@ -30,41 +179,147 @@ class BPERParser:
         """
         Parse completo dell'estratto conto BPER.
         
+        Con una cache impostata, un PDF già analizzato dalla stessa versione
+        del parser viene letto dalla cache senza aprirlo con pdfplumber.
+        
         Args:
             pdf_path: Percorso del file PDF
             
         Returns:
             Dizionario con tutti i dati estratti
         """
-        try:
-            with pdfplumber.open(pdf_path) as pdf:
-                # Estrai testo da tutte le pagine
-                all_text = ""
-                page_texts = []
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if text:
-                        all_text += text + "\n"
-                        page_texts.append(text)
-                
-                # Estrai informazioni
-                result = {
-                    "info_conto": self._extract_account_info(all_text),
-                    "transazioni": self._extract_all_transactions(page_texts),
-                    "riepilogo": self._extract_summary(all_text),
-                    "info_isee": self._extract_isee_info(all_text),
-                    "interessi": self._extract_interests(page_texts)
-                }
-                
-                # Calcola statistiche
-                result["statistiche"] = self._calculate_statistics(result["transazioni"])
-                
+        chiave = None
+        if self.cache is not None:
+            chiave = self.cache.chiave(pdf_path, self.VERSIONE)
+            result = self.cache.leggi(chiave)
+            if result is not None:
+                logger.info(f"Estratto conto letto dalla cache di parsing: {pdf_path}")
                 return result
+        
+        try:
+            # Estrai testo da tutte le pagine
+            page_texts = [text for text in self._extract_page_texts(pdf_path) if text]
+            all_text = "".join(text + "\n" for text in page_texts)
+            
+            # Estrai informazioni
+            result = {
+                "info_conto": self._extract_account_info(all_text),
+                "transazioni": self._extract_all_transactions(page_texts),
+                "riepilogo": self._extract_summary(all_text),
+                "info_isee": self._extract_isee_info(all_text),
+                "interessi": self._extract_interests(page_texts)
+            }
+            
+            # Calcola statistiche
+            result["statistiche"] = self._calculate_statistics(result["transazioni"])
+            
+            if chiave is not None:
+                self.cache.scrivi(chiave, result)
+            return result
                 
         except Exception as e:
             logger.error(f"Errore nel parsing del PDF: {e}")
             raise
     
+    def iter_transazioni(self, pdf_path: str, sezioni: Optional[Dict] = None) -> Iterator[Dict]:
+        """
+        Genera le transazioni dell'estratto una pagina alla volta.
+        
+        A differenza di parse(), non tiene in memoria il testo delle pagine
+        né le transazioni già restituite: ogni pagina viene estratta,
+        analizzata e liberata (cache di layout di pdfplumber) prima di
+        passare alla successiva, quindi la memoria non cresce con il numero
+        di pagine. Le transazioni escono nell'ordine dell'estratto (parse()
+        invece le ordina per data), numerate in quell'ordine.
+        
+        Args:
+            pdf_path: Percorso del file PDF
+            sezioni: Dizionario opzionale che viene riempito man mano con
+                info_conto, riepilogo, info_isee e interessi, e a fine
+                iterazione con statistiche (stesse chiavi di parse(), ma le
+                categorie hanno solo 'numero' e 'totale', senza la lista dei
+                numeri progressivi)
+            
+        Yields:
+            Dizionari transazione, con le stesse chiavi di parse()
+        """
+        info_conto: Dict = {}
+        riepilogo: Dict = {}
+        info_isee: Dict = {}
+        interessi = {
+            'creditori': [],
+            'debitori': [],
+            'totale_creditori': 0,
+            'totale_debitori': 0
+        }
+        statistiche = StatisticheIncrementali(con_progressivi=False)
+        if sezioni is not None:
+            sezioni.update(info_conto=info_conto, riepilogo=riepilogo,
+                           info_isee=info_isee, interessi=interessi)
+        
+        numero_pagina = 0
+        progressivo = 0
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                text = page.extract_text()
+                _rilascia_pagina(page)
+                if not text:
+                    continue
+                numero_pagina += 1
+                
+                # Le sezioni prendono il primo valore trovato, come le ricerche di parse() sul testo completo
+                for sezione, trovati in ((info_conto, self._extract_account_info(text)),
+                                         (riepilogo, self._extract_summary(text)),
+                                         (info_isee, self._extract_isee_info(text))):
+                    for chiave, valore in trovati.items():
+                        sezione.setdefault(chiave, valore)
+                self._add_page_interests(interessi, text)
+                
+                for trans in self._extract_transactions_from_page(text, numero_pagina):
+                    progressivo += 1
+                    trans['numero_progressivo'] = progressivo
+                    statistiche.aggiungi(trans)
+                    yield trans
+        
+        # La variazione dipende dai saldi, che possono trovarsi su pagine diverse
+        riepilogo.pop('variazione', None)
+        if 'saldo_iniziale' in riepilogo and 'saldo_finale' in riepilogo:
+            riepilogo['variazione'] = round(
+                riepilogo['saldo_finale']['importo'] - riepilogo['saldo_iniziale']['importo'], 2
+            )
+        if sezioni is not None:
+            sezioni['statistiche'] = statistiche.risultato()
+    
+    def _extract_page_texts(self, pdf_path: str) -> List[Optional[str]]:
+        """
+        Estrae il testo di ogni pagina, nell'ordine delle pagine.
+        
+        Con più processi le pagine sono divise in intervalli contigui, uno
+        per processo; i risultati vengono ricomposti nell'ordine degli
+        intervalli, quindi il testo è identico a quello sequenziale.
+        """
+        with pdfplumber.open(pdf_path) as pdf:
+            numero_pagine = len(pdf.pages)
+            processi = min(self.processi, numero_pagine // PAGINE_MINIME_PER_PROCESSO)
+            if processi <= 1:
+                return _testi_pagine(pdf, 0, numero_pagine)
+        
+        dimensione, resto = divmod(numero_pagine, processi)
+        intervalli = []
+        inizio = 0
+        for i in range(processi):
+            fine = inizio + dimensione + (1 if i < resto else 0)
+            intervalli.append((inizio, fine))
+            inizio = fine
+        try:
+            with ProcessPoolExecutor(max_workers=processi) as pool:
+                futuri = [pool.submit(_estrai_testo_pagine, pdf_path, inizio, fine)
+                          for inizio, fine in intervalli]
+                return [testo for futuro in futuri for testo in futuro.result()]
+        except (BrokenProcessPool, OSError) as e:
+            logger.warning(f"Estrazione parallela non disponibile, uso quella sequenziale: {e}")
+            return _estrai_testo_pagine(pdf_path, 0, numero_pagine)
+    
     def _extract_account_info(self, text: str) -> Dict:
         """Estrai informazioni generali del conto."""
         info = {}
@@ -340,70 +595,38 @@ class BPERParser:
         }
         
         for page_text in page_texts:
-            # Interessi creditori
-            if 'INTERESSI CREDITORI MATURATI' in page_text:
-                cred_match = re.findall(
-                    r'(\d{2}/\d{2}/\d{2})\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)',
-                    page_text
-                )
-                for match in cred_match:
-                    if len(match) == 4:
-                        interests['creditori'].append({
-                            'data': self._parse_date_short(match[0]),
-                            'tasso': float(match[1].replace(',', '.')),
-                            'numeri': float(match[2].replace('.', '').replace(',', '.')),
-                            'interessi': float(match[3].replace(',', '.'))
-                        })
-            
-            # Totale interessi
-            totale_match = re.search(r'TOTALE NETTO\s+([\d.,]+)', page_text)
-            if totale_match:
-                interests['totale_creditori'] = self._parse_amount(totale_match.group(1))
+            self._add_page_interests(interests, page_text)
         
         return interests
     
+    def _add_page_interests(self, interests: Dict, page_text: str):
+        """Aggiunge agli interessi quelli trovati in una pagina."""
+        # Interessi creditori
+        if 'INTERESSI CREDITORI MATURATI' in page_text:
+            cred_match = re.findall(
+                r'(\d{2}/\d{2}/\d{2})\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)',
+                page_text
+            )
+            for match in cred_match:
+                if len(match) == 4:
+                    interests['creditori'].append({
+                        'data': self._parse_date_short(match[0]),
+                        'tasso': float(match[1].replace(',', '.')),
+                        'numeri': float(match[2].replace('.', '').replace(',', '.')),
+                        'interessi': float(match[3].replace(',', '.'))
+                    })
+        
+        # Totale interessi
+        totale_match = re.search(r'TOTALE NETTO\s+([\d.,]+)', page_text)
+        if totale_match:
+            interests['totale_creditori'] = self._parse_amount(totale_match.group(1))
+    
     def _calculate_statistics(self, transactions: List[Dict]) -> Dict:
         """Calcola statistiche sulle transazioni."""
-        if not transactions:
-            return {}
-        
-        stats = {
-            'numero_transazioni': len(transactions),
-            'numero_entrate': sum(1 for t in transactions if t['importo'] > 0),
-            'numero_uscite': sum(1 for t in transactions if t['importo'] < 0),
-            'totale_entrate': sum(t['importo'] for t in transactions if t['importo'] > 0),
-            'totale_uscite': abs(sum(t['importo'] for t in transactions if t['importo'] < 0)),
-            'saldo_movimento': sum(t['importo'] for t in transactions),
-            'media_entrate': 0,
-            'media_uscite': 0,
-            'max_entrata': 0,
-            'max_uscita': 0,
-            'categorie': {}
-        }
-        
-        # Calcola medie
-        if stats['numero_entrate'] > 0:
-            stats['media_entrate'] = round(stats['totale_entrate'] / stats['numero_entrate'], 2)
-            stats['max_entrata'] = max(t['importo'] for t in transactions if t['importo'] > 0)
-        
-        if stats['numero_uscite'] > 0:
-            stats['media_uscite'] = round(stats['totale_uscite'] / stats['numero_uscite'], 2)
-            stats['max_uscita'] = abs(min(t['importo'] for t in transactions if t['importo'] < 0))
-        
-        # Statistiche per categoria
+        statistiche = StatisticheIncrementali()
         for trans in transactions:
-            cat = trans.get('categoria_suggerita', 'Altro')
-            if cat not in stats['categorie']:
-                stats['categorie'][cat] = {
-                    'numero': 0,
-                    'totale': 0,
-                    'transazioni': []
-                }
-            stats['categorie'][cat]['numero'] += 1
-            stats['categorie'][cat]['totale'] += trans['importo']
-            stats['categorie'][cat]['transazioni'].append(trans['numero_progressivo'])
-        
-        return stats
+            statistiche.aggiungi(trans)
+        return statistiche.risultato()
     
     def _parse_date(self, date_str: str) -> Optional[date]:
         """Parse data in formato DD/MM/YYYY."""
@@ -0,0 +1,223 @@
+"""
+# cache_parsing.py
+Cache su disco dei risultati di BPERParser.parse.
+
+La chiave è l'hash SHA-256 del contenuto del PDF più la versione del
+parser: lo stesso estratto, anche rinominato o spostato, viene letto dalla
+cache senza riaprirlo con pdfplumber, mentre una nuova versione del parser
+ignora i risultati delle versioni precedenti. I risultati sono salvati
+come JSON compresso con zlib (date in formato ISO), un file per voce;
+oltre la dimensione massima vengono eliminate le voci usate meno di recente.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import zlib
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.config import settings
+
+# Estensione dei file di cache
+_ESTENSIONE = ".json.z"
+# Dimensione dei blocchi letti per calcolare l'hash del PDF
+_BLOCCO_HASH = 1024 * 1024
+
+
+def _codifica_json(valore: Any) -> Any:
+    """Serializza le date come {"__data__": "AAAA-MM-GG"} (default di json.dumps)."""
+    if isinstance(valore, date):
+        return {"__data__": valore.isoformat()}
+    raise TypeError(f"Valore non serializzabile nella cache di parsing: {type(valore).__name__}")
+
+
+def _decodifica_json(oggetto: Dict) -> Any:
+    """Ricostruisce le date scritte da _codifica_json (object_hook di json.loads)."""
+    if len(oggetto) == 1 and "__data__" in oggetto:
+        return date.fromisoformat(oggetto["__data__"])
+    return oggetto
+
+
+class CacheParsing:
+    """Cache su disco dei risultati del parsing, indirizzata per contenuto."""
+
+    def __init__(self, directory: Optional[str] = None, max_byte: Optional[int] = None):
+        """
+        Inizializza la cache.
+
+        Args:
+            directory: Directory dei file di cache (default in settings,
+                altrimenti data/cache_parsing)
+            max_byte: Dimensione massima complessiva dei file (default in settings)
+        """
+        self.logger = logging.getLogger(__name__)
+        directory = directory or os.environ.get("GESTFIN_PARSE_CACHE_DIR") or settings.PARSE_CACHE_DIR
+        if directory is None:
+            directory = Path(__file__).parent.parent.parent / "data" / "cache_parsing"
+        self.directory = Path(directory)
+        self.max_byte = max_byte or settings.PARSE_CACHE_MAX_MB * 1024 * 1024
+        self._lock = threading.RLock()
+        self._statistiche = {"hit": 0, "miss": 0, "evizioni": 0}
+
+    @classmethod
+    def predefinita(cls) -> Optional["CacheParsing"]:
+        """
+        Crea la cache per la CLI secondo settings; None se disattivata
+        (GESTFIN_PARSE_CACHE=0).
+        """
+        attiva = os.environ.get("GESTFIN_PARSE_CACHE")
+        attiva = settings.PARSE_CACHE_ATTIVA if attiva is None else attiva == "1"
+        return cls() if attiva else None
+
+    @staticmethod
+    def hash_file(pdf_path: str) -> str:
+        """Restituisce l'hash SHA-256 esadecimale del contenuto del file."""
+        sha = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for blocco in iter(lambda: f.read(_BLOCCO_HASH), b""):
+                sha.update(blocco)
+        return sha.hexdigest()
+
+    def chiave(self, pdf_path: str, versione: Any) -> str:
+        """
+        Calcola la chiave di un PDF per una versione del parser.
+
+        Returns:
+            Chiave '<sha256>_v<versione>', usata come nome del file di cache
+        """
+        return f"{self.hash_file(pdf_path)}_v{versione}"
+
+    def _percorso(self, chiave: str) -> Path:
+        return self.directory / f"{chiave}{_ESTENSIONE}"
+
+    def contiene(self, chiave: str) -> bool:
+        """Verifica se la cache ha un risultato per la chiave, senza leggerlo."""
+        return self._percorso(chiave).is_file()
+
+    def leggi(self, chiave: str) -> Optional[Dict]:
+        """
+        Legge un risultato dalla cache.
+
+        Un file illeggibile viene eliminato e trattato come assente.
+
+        Returns:
+            Risultato del parsing, None se assente
+        """
+        percorso = self._percorso(chiave)
+        with self._lock:
+            try:
+                with open(percorso, "rb") as f:
+                    risultato = json.loads(zlib.decompress(f.read()), object_hook=_decodifica_json)
+            except FileNotFoundError:
+                self._statistiche["miss"] += 1
+                return None
+            except Exception as e:
+                self.logger.warning(f"Voce della cache di parsing non leggibile, verrà ricreata: {e}")
+                percorso.unlink(missing_ok=True)
+                self._statistiche["miss"] += 1
+                return None
+            # L'orario di modifica segna l'ultimo uso, per l'eliminazione LRU
+            os.utime(percorso)
+            self._statistiche["hit"] += 1
+            return risultato
+
+    def scrivi(self, chiave: str, risultato: Dict):
+        """Salva un risultato con sostituzione atomica, poi applica il limite di dimensione."""
+        try:
+            dati = zlib.compress(json.dumps(risultato, default=_codifica_json).encode("utf-8"))
+        except TypeError as e:
+            self.logger.warning(f"Risultato non salvato nella cache di parsing: {e}")
+            return
+        percorso = self._percorso(chiave)
+        temporaneo = percorso.with_name(percorso.name + ".tmp")
+        with self._lock:
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                with open(temporaneo, "wb") as f:
+                    f.write(dati)
+                os.replace(temporaneo, percorso)
+            except OSError as e:
+                self.logger.warning(f"Impossibile salvare la cache di parsing: {e}")
+                return
+            self._applica_limite()
+
+    def _voci(self):
+        """Restituisce (percorso, stat) dei file di cache, dal meno recente."""
+        if not self.directory.is_dir():
+            return []
+        voci = []
+        for percorso in self.directory.glob(f"*{_ESTENSIONE}"):
+            try:
+                voci.append((percorso, percorso.stat()))
+            except FileNotFoundError:
+                continue
+        return sorted(voci, key=lambda v: v[1].st_mtime)
+
+    def _applica_limite(self):
+        """Elimina le voci usate meno di recente finché la cache supera max_byte. Chiamare con il lock."""
+        voci = self._voci()
+        totale = sum(stat.st_size for _, stat in voci)
+        # L'ultima voce (la più recente) resta anche se da sola supera il limite
+        for percorso, stat in voci[:-1]:
+            if totale <= self.max_byte:
+                break
+            percorso.unlink(missing_ok=True)
+            totale -= stat.st_size
+            self._statistiche["evizioni"] += 1
+
+    def invalida(self, pdf_path: Optional[str] = None) -> int:
+        """
+        Elimina voci dalla cache.
+
+        Args:
+            pdf_path: PDF di cui eliminare i risultati (tutte le versioni
+                del parser); None per svuotare la cache
+
+        Returns:
+            Numero di voci eliminate
+        """
+        schema = f"{self.hash_file(pdf_path)}_v*{_ESTENSIONE}" if pdf_path else f"*{_ESTENSIONE}"
+        eliminate = 0
+        with self._lock:
+            if not self.directory.is_dir():
+                return 0
+            for percorso in self.directory.glob(schema):
+                percorso.unlink(missing_ok=True)
+                eliminate += 1
+        return eliminate
+
+    def statistiche(self) -> Dict[str, Any]:
+        """
+        Restituisce i contatori di utilizzo e l'occupazione della cache.
+
+        Returns:
+            Dizionario con hit, miss, evizioni, voci, byte e max_byte
+        """
+        with self._lock:
+            voci = self._voci()
+            stats = dict(self._statistiche)
+            stats["voci"] = len(voci)
+            stats["byte"] = sum(stat.st_size for _, stat in voci)
+            stats["max_byte"] = self.max_byte
+            return stats
+
+
+if __name__ == "__main__":
+    # Uso: python -m src.ingestion.cache_parsing [statistiche | invalida [file.pdf]]
+    cache = CacheParsing()
+    comando = sys.argv[1] if len(sys.argv) > 1 else "statistiche"
+    if comando == "invalida":
+        pdf = sys.argv[2] if len(sys.argv) > 2 else None
+        print(f"Voci eliminate dalla cache di parsing: {cache.invalida(pdf)}")
+    elif comando == "statistiche":
+        stats = cache.statistiche()
+        print(f"Cache di parsing in {cache.directory}: {stats['voci']} voci, "
+              f"{stats['byte'] / 1024:.1f} KiB su {stats['max_byte'] / 1024:.0f} KiB")
+    else:
+        print("Uso: python -m src.ingestion.cache_parsing [statistiche | invalida [file.pdf]]")
+        sys.exit(1)
@@ -1,6 +1,7 @@
 from dataclasses import dataclass
 from typing import Optional, List
 from enum import Enum
+from .tracciamento import TracciaModifiche
 from .proprieta import TipoProprieta
 
 class TipoMacroCategoria(Enum):
@@ -10,7 +11,7 @@ class TipoMacroCategoria(Enum):
     FISCALE_GENERALE = "Fiscale Generale"
 
 @dataclass
-class CategoriaTransazione:
+class CategoriaTransazione(TracciaModifiche):
     """
     Rappresenta una categoria di transazione nel sistema.
     Le categorie sono organizzate in macro-categorie (Personale, Immobile, Fiscale).
@@ -28,8 +29,9 @@ class CategoriaTransazione:
         if not self.tipo_macro or not self.tipo_macro.strip():
             raise ValueError("Il tipo macro della categoria è obbligatorio")
         tipi_validi = [tipo.value for tipo in TipoMacroCategoria]
-        tipo_base = self.tipo_macro.split(" ")[0]
-        if tipo_base not in tipi_validi:
+        # I tipi validi possono contenere spazi (es. "Fiscale Generale"): confronto sul prefisso
+        if not any(self.tipo_macro == tipo or self.tipo_macro.startswith(tipo + " ")
+                   for tipo in tipi_validi):
             raise ValueError(f"Il tipo macro deve iniziare con uno di: {', '.join(tipi_validi)}")
 
     def è_categoria_immobiliare(self) -> bool:
@@ -1,6 +1,7 @@
 from dataclasses import dataclass
 from typing import Optional
 from enum import Enum
+from .tracciamento import TracciaModifiche
 
 class TipoConto(Enum):
     """Enumerazione per i tipi di conto finanziario."""
@@ -10,7 +11,7 @@ class TipoConto(Enum):
     CONTANTI = "Contanti"
 
 @dataclass
-class ContoFinanziario:
+class ContoFinanziario(TracciaModifiche):
     """
     Rappresenta un conto finanziario nel sistema.
     Può essere un conto bancario, di risparmio, investimento o contanti.
@@ -9,6 +9,7 @@ from dataclasses import dataclass, field
 from datetime import datetime, date
 from typing import Optional, List, Dict
 from enum import Enum
+from .tracciamento import TracciaModifiche
 import re
 
 from .proprieta import Proprieta, TipoProprieta
@@ -47,7 +48,7 @@ class TipoFlusso(Enum):
 
 
 @dataclass
-class Proprieta:
+class Proprieta(TracciaModifiche):
     """
     Rappresenta una proprietà immobiliare nel sistema.
     
@@ -110,7 +111,7 @@ class Proprieta:
 
 
 @dataclass
-class ContoFinanziario:
+class ContoFinanziario(TracciaModifiche):
     """
     Rappresenta un conto finanziario nel sistema.
     
@@ -151,7 +152,7 @@ class ContoFinanziario:
 
 
 @dataclass
-class CategoriaTransazione:
+class CategoriaTransazione(TracciaModifiche):
     """
     Rappresenta una categoria di transazione nel sistema.
     
@@ -175,8 +176,9 @@ class CategoriaTransazione:
         
         # Verifica che il tipo macro inizi con uno dei valori validi
         tipi_validi = [tipo.value for tipo in TipoMacroCategoria]
-        tipo_base = self.tipo_macro.split(" ")[0]
-        if tipo_base not in tipi_validi:
+        # I tipi validi possono contenere spazi (es. "Fiscale Generale"): confronto sul prefisso
+        if not any(self.tipo_macro == tipo or self.tipo_macro.startswith(tipo + " ")
+                   for tipo in tipi_validi):
             raise ValueError(f"Il tipo macro deve iniziare con uno di: {', '.join(tipi_validi)}")
     
     def è_categoria_immobiliare(self) -> bool:
@@ -200,7 +202,7 @@ class CategoriaTransazione:
 
 
 @dataclass
-class Transazione:
+class Transazione(TracciaModifiche):
     """
     Rappresenta una transazione finanziaria nel sistema.
     
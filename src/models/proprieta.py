@@ -2,6 +2,7 @@ from dataclasses import dataclass, field
 from datetime import date
 from typing import Optional
 from enum import Enum
+from .tracciamento import TracciaModifiche
 
 class TipoProprieta(Enum):
     """Enumerazione per i tipi di proprietà gestiti."""
@@ -10,7 +11,7 @@ class TipoProprieta(Enum):
     AFFITTO_PASSIVO = "Affitto passivo"
 
 @dataclass
-class Proprieta:
+class Proprieta(TracciaModifiche):
     """
     Rappresenta una proprietà immobiliare nel sistema.
     Può essere una proprietà posseduta (ad uso personale o affittata)
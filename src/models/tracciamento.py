@@ -0,0 +1,57 @@
+"""
+# tracciamento.py
+Tracciamento dei campi modificati per le dataclass delle entità.
+
+I repository registrano i valori di un'entità quando la caricano o la
+salvano; update() scrive poi solo le colonne cambiate da quel momento.
+"""
+
+from dataclasses import fields
+from enum import Enum
+from typing import Any, Dict, Optional, Set
+
+
+def _normalizza(valore: Any) -> Any:
+    """Confronta gli enum per valore, così enum omonimi di moduli diversi coincidono."""
+    return valore.value if isinstance(valore, Enum) else valore
+
+
+class TracciaModifiche:
+    """
+    Mixin per dataclass che ricorda i valori dell'ultimo caricamento o salvataggio.
+
+    Sono considerati solo i campi di init: i riferimenti in memoria
+    (es. Transazione.categoria) non vengono salvati e non sono tracciati.
+    """
+
+    _valori_salvati: Optional[Dict[str, Any]] = None
+
+    def segna_come_salvata(self):
+        """Registra i valori correnti come allineati al database."""
+        self._valori_salvati = {
+            f.name: getattr(self, f.name) for f in fields(self) if f.init
+        }
+
+    def valori_salvati(self) -> Optional[Dict[str, Any]]:
+        """
+        Restituisce i valori registrati all'ultimo caricamento o salvataggio.
+
+        Returns:
+            Dizionario campo -> valore, None se l'entità non è mai stata salvata
+        """
+        return dict(self._valori_salvati) if self._valori_salvati is not None else None
+
+    def campi_modificati(self) -> Optional[Set[str]]:
+        """
+        Restituisce i campi cambiati dall'ultimo caricamento o salvataggio.
+
+        Returns:
+            Insieme dei nomi dei campi modificati, None se l'entità non è
+            mai stata caricata o salvata (tutti i campi vanno scritti)
+        """
+        if self._valori_salvati is None:
+            return None
+        return {
+            nome for nome, valore in self._valori_salvati.items()
+            if _normalizza(getattr(self, nome)) != _normalizza(valore)
+        }
@@ -2,6 +2,7 @@ from dataclasses import dataclass, field
 from datetime import date
 from typing import Optional, Dict
 from enum import Enum
+from .tracciamento import TracciaModifiche
 from .categoria_transazione import CategoriaTransazione
 from .conto_finanziario import ContoFinanziario
 from .proprieta import Proprieta
@@ -13,7 +14,7 @@ class TipoFlusso(Enum):
     FISCALE = "Fiscale"
 
 @dataclass
-class Transazione:
+class Transazione(TracciaModifiche):
     """
     Rappresenta una transazione finanziaria nel sistema.
     Le transazioni sono collegate a conti, categorie e opzionalmente a proprietà.
@@ -0,0 +1,247 @@
+"""
+# aggregato_mensile_repository.py
+Repository per l'aggregato mensile delle transazioni (tabella aggregato_mensile).
+
+L'aggregato contiene numero, entrate e uscite per mese, conto, categoria,
+proprietà, tipo di flusso e flag fiscale. I trigger della migrazione 6 lo
+aggiornano a ogni scrittura sulle transazioni, quindi i report leggono un
+numero di righe che dipende da mesi e categorie, non dalle transazioni.
+"""
+
+from calendar import monthrange
+from typing import Dict, List, Optional, Sequence, Tuple
+from src.database.database_connection import (
+    execute_query, execute_non_query, transaction
+)
+
+
+class AggregatoMensileRepository:
+    """Repository per l'aggregato mensile delle transazioni."""
+
+    table_name = "aggregato_mensile"
+
+    # Colonne di raggruppamento: stessi nomi delle colonne di transazione
+    COLONNE_RAGGRUPPABILI = ("id_conto_finanziario", "id_categoria", "id_proprieta_associata",
+                             "tipo_flusso", "flag_deducibile_o_rilevante_fiscalmente")
+
+    @staticmethod
+    def supporta(criteri) -> bool:
+        """
+        Verifica se i criteri possono essere risolti sull'aggregato.
+
+        Sono ammessi i filtri per conto, categoria, proprietà, tipo di
+        flusso e flag fiscale, con intervalli di date che coprono mesi interi.
+
+        Args:
+            criteri: CriteriTransazione da verificare
+
+        Returns:
+            True se il riepilogo può leggere l'aggregato
+        """
+        if (criteri.solo_entrate or criteri.solo_uscite or criteri.testo
+                or criteri.importo_min is not None or criteri.importo_max is not None):
+            return False
+        if criteri.data_inizio and criteri.data_inizio.day != 1:
+            return False
+        if criteri.data_fine:
+            ultimo_giorno = monthrange(criteri.data_fine.year, criteri.data_fine.month)[1]
+            if criteri.data_fine.day != ultimo_giorno:
+                return False
+        return True
+
+    def _clausola_where(self, criteri) -> Tuple[str, tuple]:
+        condizioni = []
+        params = []
+        if criteri.data_inizio:
+            condizioni.append("anno_mese >= ?")
+            params.append(criteri.data_inizio.strftime("%Y-%m"))
+        if criteri.data_fine:
+            condizioni.append("anno_mese <= ?")
+            params.append(criteri.data_fine.strftime("%Y-%m"))
+        if criteri.id_categoria is not None:
+            condizioni.append("id_categoria = ?")
+            params.append(criteri.id_categoria)
+        if criteri.id_conto is not None:
+            condizioni.append("id_conto_finanziario = ?")
+            params.append(criteri.id_conto)
+        if criteri.id_proprieta is not None:
+            condizioni.append("id_proprieta_associata = ?")
+            params.append(criteri.id_proprieta)
+        if criteri.tipo_flusso is not None:
+            condizioni.append("tipo_flusso = ?")
+            params.append(getattr(criteri.tipo_flusso, "value", criteri.tipo_flusso))
+        if criteri.solo_fiscali:
+            condizioni.append("flag_deducibile_o_rilevante_fiscalmente = 1")
+        return " AND ".join(condizioni), tuple(params)
+
+    def riepilogo(self, criteri, raggruppa_per: Sequence[str] = ()) -> List[Dict]:
+        """
+        Totali mensili letti dall'aggregato.
+
+        Args:
+            criteri: CriteriTransazione ammessi da supporta()
+            raggruppa_per: Colonne aggiuntive di raggruppamento, scelte tra
+                COLONNE_RAGGRUPPABILI
+
+        Returns:
+            Lista di dizionari con anno_mese, le colonne di raggruppamento
+            (id_proprieta_associata None se assente), numero, entrate e uscite
+
+        Raises:
+            ValueError: Se i criteri non sono supportati o una colonna di
+                raggruppamento non è ammessa
+        """
+        if not self.supporta(criteri):
+            raise ValueError("Criteri non risolvibili sull'aggregato mensile")
+        for colonna in raggruppa_per:
+            if colonna not in self.COLONNE_RAGGRUPPABILI:
+                raise ValueError(f"Raggruppamento non valido: '{colonna}'")
+        colonne_select = "".join(
+            ", NULLIF(id_proprieta_associata, 0) AS id_proprieta_associata"
+            if c == "id_proprieta_associata" else f", {c}"
+            for c in raggruppa_per
+        )
+        colonne_group = "".join(f", {c}" for c in raggruppa_per)
+        where, params = self._clausola_where(criteri)
+        query = f"""
+            SELECT anno_mese{colonne_select},
+                   SUM(numero) AS numero,
+                   ROUND(SUM(entrate), 2) AS entrate,
+                   ROUND(SUM(uscite), 2) AS uscite
+            FROM {self.table_name}
+            {f"WHERE {where}" if where else ""}
+            GROUP BY anno_mese{colonne_group}
+            ORDER BY anno_mese{colonne_group}
+        """
+        return execute_query(query, params)
+
+    def totali_annui_per_proprieta(self, anno_inizio: Optional[int] = None,
+                                   anno_fine: Optional[int] = None) -> List[Dict]:
+        """
+        Totali annui di ogni proprietà in un'unica query raggruppata.
+
+        Gli affitti incassati sono le entrate delle categorie 'Affitto
+        Incassato ...', con lo stesso criterio LIKE di
+        TransazioneRepository.get_entrate_da_affitto_per_proprieta.
+
+        Args:
+            anno_inizio: Primo anno incluso (optional)
+            anno_fine: Ultimo anno incluso (optional)
+
+        Returns:
+            Lista di dizionari con anno, id_proprieta, numero, affitti,
+            entrate (tutte le entrate) e uscite, ordinati per anno e proprietà
+        """
+        condizioni = ["a.id_proprieta_associata <> 0"]
+        params = []
+        if anno_inizio is not None:
+            condizioni.append("a.anno_mese >= ?")
+            params.append(f"{anno_inizio:04d}-01")
+        if anno_fine is not None:
+            condizioni.append("a.anno_mese <= ?")
+            params.append(f"{anno_fine:04d}-12")
+        query = f"""
+            SELECT CAST(substr(a.anno_mese, 1, 4) AS INTEGER) AS anno,
+                   a.id_proprieta_associata AS id_proprieta,
+                   SUM(a.numero) AS numero,
+                   ROUND(SUM(CASE WHEN c.nome_categoria LIKE 'Affitto Incassato%' THEN a.entrate ELSE 0 END), 2) AS affitti,
+                   ROUND(SUM(a.entrate), 2) AS entrate,
+                   ROUND(SUM(a.uscite), 2) AS uscite
+            FROM {self.table_name} a
+            JOIN categoria_transazione c ON c.id_categoria = a.id_categoria
+            WHERE {" AND ".join(condizioni)}
+            GROUP BY anno, a.id_proprieta_associata
+            ORDER BY anno, a.id_proprieta_associata
+        """
+        return execute_query(query, tuple(params))
+
+    def confronto_per_categoria(self, periodo_a: Tuple[str, str], periodo_b: Tuple[str, str],
+                                tipo_flusso=None) -> List[Dict]:
+        """
+        Totali per categoria di due periodi in un'unica query raggruppata.
+
+        Le due colonne di ogni totale si ottengono con aggregazione
+        condizionale sullo stesso passaggio: i periodi possono anche
+        sovrapporsi.
+
+        Args:
+            periodo_a: Primo e ultimo mese ('YYYY-MM') del periodo A
+            periodo_b: Primo e ultimo mese ('YYYY-MM') del periodo B
+            tipo_flusso: Filtra per tipo di flusso (optional)
+
+        Returns:
+            Lista di dizionari con id_categoria, nome_categoria, tipo_macro e
+            numero, entrate, uscite con suffisso _a e _b, ordinati per
+            tipo_macro e nome_categoria
+        """
+        colonne = []
+        params: list = []
+        for suffisso, (mese_inizio, mese_fine) in (("a", periodo_a), ("b", periodo_b)):
+            colonne.append(f"""
+                   SUM(CASE WHEN a.anno_mese BETWEEN ? AND ? THEN a.numero ELSE 0 END) AS numero_{suffisso},
+                   ROUND(SUM(CASE WHEN a.anno_mese BETWEEN ? AND ? THEN a.entrate ELSE 0 END), 2) AS entrate_{suffisso},
+                   ROUND(SUM(CASE WHEN a.anno_mese BETWEEN ? AND ? THEN a.uscite ELSE 0 END), 2) AS uscite_{suffisso}""")
+            params.extend((mese_inizio, mese_fine) * 3)
+        condizioni = ["(a.anno_mese BETWEEN ? AND ? OR a.anno_mese BETWEEN ? AND ?)"]
+        params.extend(periodo_a + periodo_b)
+        if tipo_flusso is not None:
+            condizioni.append("a.tipo_flusso = ?")
+            params.append(getattr(tipo_flusso, "value", tipo_flusso))
+        query = f"""
+            SELECT a.id_categoria, c.nome_categoria, c.tipo_macro,{",".join(colonne)}
+            FROM {self.table_name} a
+            JOIN categoria_transazione c ON c.id_categoria = a.id_categoria
+            WHERE {" AND ".join(condizioni)}
+            GROUP BY a.id_categoria
+            ORDER BY c.tipo_macro, c.nome_categoria
+        """
+        return execute_query(query, tuple(params))
+
+    def ricostruisci(self) -> int:
+        """
+        Ricalcola l'aggregato da zero a partire dalle transazioni.
+
+        Returns:
+            Numero di righe dell'aggregato dopo la ricostruzione
+        """
+        with transaction():
+            execute_non_query(f"DELETE FROM {self.table_name}")
+            return execute_non_query(f"""
+                INSERT INTO {self.table_name}
+                SELECT substr(data, 1, 7), id_conto_finanziario, id_categoria,
+                       COALESCE(id_proprieta_associata, 0), tipo_flusso,
+                       flag_deducibile_o_rilevante_fiscalmente, COUNT(*),
+                       ROUND(COALESCE(SUM(CASE WHEN importo > 0 THEN importo END), 0), 2),
+                       ROUND(COALESCE(-SUM(CASE WHEN importo < 0 THEN importo END), 0), 2)
+                FROM transazione
+                GROUP BY 1, 2, 3, 4, 5, 6
+            """)
+
+    def verifica(self) -> List[Dict]:
+        """
+        Confronta l'aggregato con un ricalcolo dalle transazioni.
+
+        Returns:
+            Lista delle celle che differiscono, con differenza 'mancante'
+            (valore atteso) o 'in eccesso' (valore presente nell'aggregato);
+            vuota se l'aggregato è allineato
+        """
+        query = f"""
+            WITH atteso AS (
+                SELECT substr(data, 1, 7) AS anno_mese, id_conto_finanziario, id_categoria,
+                       COALESCE(id_proprieta_associata, 0) AS id_proprieta_associata, tipo_flusso,
+                       flag_deducibile_o_rilevante_fiscalmente, COUNT(*) AS numero,
+                       ROUND(COALESCE(SUM(CASE WHEN importo > 0 THEN importo END), 0), 2) AS entrate,
+                       ROUND(COALESCE(-SUM(CASE WHEN importo < 0 THEN importo END), 0), 2) AS uscite
+                FROM transazione
+                GROUP BY 1, 2, 3, 4, 5, 6
+            )
+            SELECT 'mancante' AS differenza, * FROM (
+                SELECT * FROM atteso EXCEPT SELECT * FROM {self.table_name}
+            )
+            UNION ALL
+            SELECT 'in eccesso' AS differenza, * FROM (
+                SELECT * FROM {self.table_name} EXCEPT SELECT * FROM atteso
+            )
+        """
+        return execute_query(query)
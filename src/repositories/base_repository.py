@@ -4,19 +4,41 @@ Repository base con operazioni CRUD comuni per tutte le entità.
 """
 
 from abc import ABC, abstractmethod
-from typing import TypeVar, Generic, List, Optional, Dict, Any, Type
+from typing import TypeVar, Generic, List, Optional, Dict, Any, Type, Iterable, Iterator, Sequence
 from dataclasses import dataclass, fields, asdict
+import copy
 import logging
 from datetime import date
 
 from src.database.database_connection import (
-    get_db_cursor, execute_query, execute_non_query, 
-    log_audit, verifica_esistenza_id, verifica_unicita
+    get_db_cursor, execute_query, iter_query, execute_non_query, execute_many, execute_returning,
+    transaction, log_audit, log_audit_many, verifica_esistenza_id, verifica_unicita,
+    SUPPORTA_RETURNING
 )
+from src.models.tracciamento import TracciaModifiche
+from src.repositories.cache_riferimento import cache_riferimento
 
 
 T = TypeVar('T')  # Tipo generico per le entità
 
+# Numero massimo di parametri per clausola IN (limite prudente per SQLite)
+DIMENSIONE_BLOCCO_IN = 500
+
+
+def a_blocchi(valori: Sequence, dimensione: int = DIMENSIONE_BLOCCO_IN) -> Iterator[Sequence]:
+    """
+    Suddivide una sequenza in blocchi per le query con clausola IN.
+    
+    Args:
+        valori: Valori da suddividere
+        dimensione: Numero massimo di valori per blocco
+        
+    Yields:
+        Blocchi consecutivi di valori
+    """
+    for inizio in range(0, len(valori), dimensione):
+        yield valori[inizio:inizio + dimensione]
+
 
 class BaseRepository(Generic[T], ABC):
     """
@@ -26,9 +48,18 @@ class BaseRepository(Generic[T], ABC):
     per specificare tabella, mapping e conversioni.
     """
     
+    # Se True, get_by_id e get_all leggono dalla cache dei dati di
+    # riferimento (solo per tabelle piccole e modificate di rado)
+    usa_cache_riferimento: bool = False
+    
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
     
+    def _invalida_cache(self):
+        """Scarta la tabella dalla cache dei dati di riferimento dopo una scrittura."""
+        if self.usa_cache_riferimento:
+            cache_riferimento.invalida(self.table_name)
+    
     @property
     @abstractmethod
     def table_name(self) -> str:
@@ -52,6 +83,9 @@ class BaseRepository(Generic[T], ABC):
         """
         Converte una riga del database in entità.
         
+        Le implementazioni chiamano segna_come_salvata() sull'entità
+        creata, così update() può scrivere solo i campi modificati.
+        
         Args:
             row: Dizionario con i dati della riga
             
@@ -99,14 +133,23 @@ class BaseRepository(Generic[T], ABC):
             VALUES ({', '.join(placeholders)})
         """
         
-        # Esegui insert
-        new_id = execute_non_query(query, tuple(data.values()))
-        
-        # Log audit
-        log_audit(self.table_name, "INSERT", new_id, dati_nuovi=data)
-        
-        # Ricarica l'entità per avere tutti i campi aggiornati
-        return self.get_by_id(new_id)
+        # Insert e audit con un solo commit
+        with transaction():
+            if SUPPORTA_RETURNING:
+                # La riga inserita torna dallo stesso statement
+                row = execute_returning(query + " RETURNING *", tuple(data.values()))[0]
+                new_id = row[self.id_column]
+            else:
+                new_id = execute_non_query(query, tuple(data.values()))
+                row = None
+            
+            self._invalida_cache()
+            
+            # Log audit
+            log_audit(self.table_name, "INSERT", new_id, dati_nuovi=data)
+            
+            # Senza RETURNING ricarica l'entità per avere tutti i campi aggiornati
+            return self.to_entity(row) if row is not None else self.get_by_id(new_id)
     
     def get_by_id(self, entity_id: int) -> Optional[T]:
         """
@@ -118,6 +161,10 @@ class BaseRepository(Generic[T], ABC):
         Returns:
             Entità se trovata, None altrimenti
         """
+        if self.usa_cache_riferimento:
+            row = cache_riferimento.per_id(self.table_name, entity_id)
+            return self.to_entity(row) if row is not None else None
+        
         query = f"SELECT * FROM {self.table_name} WHERE {self.id_column} = ?"
         results = execute_query(query, (entity_id,))
         
@@ -135,6 +182,11 @@ class BaseRepository(Generic[T], ABC):
         Returns:
             Lista di tutte le entità
         """
+        if self.usa_cache_riferimento:
+            rows = self._ordina_righe(cache_riferimento.tutte(self.table_name), order_by)
+            if rows is not None:
+                return [self.to_entity(row) for row in rows]
+        
         query = f"SELECT * FROM {self.table_name}"
         if order_by:
             query += f" ORDER BY {order_by}"
@@ -142,10 +194,65 @@ class BaseRepository(Generic[T], ABC):
         results = execute_query(query)
         return [self.to_entity(row) for row in results]
     
+    @staticmethod
+    def _ordina_righe(rows: List[Dict[str, Any]],
+                      order_by: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Ordina in memoria righe lette dalla cache.
+        
+        Args:
+            rows: Righe da ordinare (ordinate per ID)
+            order_by: Clausola ORDER BY nella forma 'colonna [ASC|DESC]', anche
+                con più colonne separate da virgola
+            
+        Returns:
+            Righe ordinate, None se order_by non è gestibile in memoria
+        """
+        if not order_by:
+            return rows
+        termini = []
+        for termine in order_by.split(","):
+            parti = termine.split()
+            if not parti or len(parti) > 2 or (rows and parti[0] not in rows[0]):
+                return None
+            direzione = parti[1].upper() if len(parti) == 2 else "ASC"
+            if direzione not in ("ASC", "DESC"):
+                return None
+            termini.append((parti[0], direzione == "DESC"))
+        # Ordinamenti stabili applicati dall'ultima colonna alla prima;
+        # i NULL vanno per primi come in SQLite
+        for colonna, discendente in reversed(termini):
+            rows.sort(key=lambda r: (r[colonna] is not None, r[colonna]), reverse=discendente)
+        return rows
+    
+    def iter_all(self, order_by: Optional[str] = None,
+                 dimensione_blocco: int = 500) -> Iterator[T]:
+        """
+        Scorre tutte le entità senza caricarle in memoria insieme.
+        
+        Args:
+            order_by: Campo per ordinamento (optional)
+            dimensione_blocco: Righe lette dal database per volta
+            
+        Yields:
+            Entità, una alla volta
+        """
+        query = f"SELECT * FROM {self.table_name}"
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        
+        for row in iter_query(query, dimensione_blocco=dimensione_blocco):
+            yield self.to_entity(row)
+    
     def update(self, entity: T) -> T:
         """
         Aggiorna un'entità esistente.
         
+        Scrive solo le colonne cambiate: per un'entità caricata da un
+        repository il confronto avviene con i valori del caricamento, senza
+        rileggere la riga; altrimenti con la riga corrente del database.
+        L'audit registra solo le colonne cambiate.
+        
         Args:
             entity: Entità da aggiornare
             
@@ -157,35 +264,54 @@ class BaseRepository(Generic[T], ABC):
         """
         data = self.to_dict(entity)
         entity_id = data.pop(self.id_column)
+        precedenti = self._valori_db_salvati(entity)
         
-        # Verifica che l'entità esista
-        if not verifica_esistenza_id(self.table_name, self.id_column, entity_id):
-            raise ValueError(f"{self.entity_class.__name__} con ID {entity_id} non trovato")
-        
-        # Recupera dati precedenti per audit
-        old_data = execute_query(
-            f"SELECT * FROM {self.table_name} WHERE {self.id_column} = ?", 
-            (entity_id,)
-        )[0]
-        
-        # Costruisci query UPDATE
-        set_clauses = [f"{col} = ?" for col in data.keys()]
-        query = f"""
-            UPDATE {self.table_name}
-            SET {', '.join(set_clauses)}
-            WHERE {self.id_column} = ?
-        """
-        
-        # Esegui update
-        params = list(data.values()) + [entity_id]
-        execute_non_query(query, tuple(params))
-        
-        # Log audit
-        log_audit(self.table_name, "UPDATE", entity_id, 
-                 dati_precedenti=dict(old_data), dati_nuovi=data)
-        
-        # Ricarica l'entità
-        return self.get_by_id(entity_id)
+        with transaction():
+            if precedenti is None:
+                # Entità non tracciata: i dati precedenti servono per audit
+                # e come verifica di esistenza
+                old_rows = execute_query(
+                    f"SELECT * FROM {self.table_name} WHERE {self.id_column} = ?", 
+                    (entity_id,)
+                )
+                if not old_rows:
+                    raise ValueError(f"{self.entity_class.__name__} con ID {entity_id} non trovato")
+                precedenti = old_rows[0]
+            
+            # Scrive solo le colonne cambiate
+            modificati = {col: val for col, val in data.items() if val != precedenti.get(col)}
+            if not modificati:
+                return entity
+            
+            # Costruisci query UPDATE
+            set_clauses = [f"{col} = ?" for col in modificati.keys()]
+            query = f"""
+                UPDATE {self.table_name}
+                SET {', '.join(set_clauses)}
+                WHERE {self.id_column} = ?
+            """
+            
+            # Esegui update
+            params = tuple(list(modificati.values()) + [entity_id])
+            if SUPPORTA_RETURNING:
+                rows = execute_returning(query + " RETURNING *", params)
+                row = rows[0] if rows else None
+                aggiornate = len(rows)
+            else:
+                aggiornate = execute_non_query(query, params)
+                row = None
+            if aggiornate == 0:
+                raise ValueError(f"{self.entity_class.__name__} con ID {entity_id} non trovato")
+            self._invalida_cache()
+            
+            # Log audit del solo diff
+            log_audit(self.table_name, "UPDATE", entity_id, 
+                     dati_precedenti={col: precedenti.get(col) for col in modificati},
+                     dati_nuovi=modificati)
+            
+            if isinstance(entity, TracciaModifiche):
+                entity.segna_come_salvata()
+            return self.to_entity(row) if row is not None else self.get_by_id(entity_id)
     
     def delete(self, entity_id: int) -> bool:
         """
@@ -197,24 +323,317 @@ class BaseRepository(Generic[T], ABC):
         Returns:
             True se eliminata, False se non trovata
         """
-        # Recupera dati per audit
-        old_entity = self.get_by_id(entity_id)
-        if not old_entity:
-            return False
-        
-        old_data = self.to_dict(old_entity)
-        
-        # Esegui delete
         query = f"DELETE FROM {self.table_name} WHERE {self.id_column} = ?"
-        rows_affected = execute_non_query(query, (entity_id,))
         
-        if rows_affected > 0:
+        with transaction():
+            if SUPPORTA_RETURNING:
+                # La riga eliminata torna dallo stesso statement
+                rows = execute_returning(query + " RETURNING *", (entity_id,))
+                if not rows:
+                    return False
+                old_entity = self.to_entity(rows[0])
+            else:
+                # Recupera dati per audit
+                old_entity = self.get_by_id(entity_id)
+                if not old_entity:
+                    return False
+                if execute_non_query(query, (entity_id,)) == 0:
+                    return False
+            
+            self._invalida_cache()
+            
             # Log audit
             log_audit(self.table_name, "DELETE", entity_id, 
-                     dati_precedenti=old_data)
+                     dati_precedenti=self.to_dict(old_entity))
             return True
+    
+    def _valori_db_salvati(self, entity: T) -> Optional[Dict[str, Any]]:
+        """
+        Converte i valori registrati all'ultimo caricamento nel formato del database.
+        
+        Args:
+            entity: Entità da aggiornare
+            
+        Returns:
+            Dizionario colonna -> valore, None se l'entità non è tracciata
+        """
+        valori = entity.valori_salvati() if isinstance(entity, TracciaModifiche) else None
+        if valori is None:
+            return None
+        precedente = copy.copy(entity)
+        for nome, valore in valori.items():
+            setattr(precedente, nome, valore)
+        return self.to_dict(precedente)
+    
+    def _campi_cambiati(self, entity: T, *campi: str) -> bool:
+        """
+        Verifica se almeno uno dei campi può essere cambiato dall'ultimo caricamento.
+        
+        Serve a saltare le validazioni su colonne che update() non scriverà.
+        
+        Args:
+            entity: Entità da aggiornare
+            campi: Nomi dei campi da controllare
+            
+        Returns:
+            True se uno dei campi è cambiato o l'entità non è tracciata
+        """
+        modificati = entity.campi_modificati() if isinstance(entity, TracciaModifiche) else None
+        return modificati is None or not modificati.isdisjoint(campi)
+    
+    def _valida_batch(self, entities: List[T], aggiornamento: bool = False):
+        """
+        Valida un gruppo di entità prima di una scrittura batch.
+        
+        Le classi derivate la ridefiniscono per eseguire con poche query
+        i controlli che create/update fanno entità per entità.
+        
+        Args:
+            entities: Entità da scrivere
+            aggiornamento: True per update_many, False per create_many
+            
+        Raises:
+            ValueError: Se la validazione fallisce
+        """
+        pass
+    
+    def _valida_eliminazione_batch(self, entity_ids: List[int]):
+        """
+        Verifica che un gruppo di entità possa essere eliminato.
+        
+        Args:
+            entity_ids: ID delle entità da eliminare
+            
+        Raises:
+            ValueError: Se almeno un'entità non può essere eliminata
+        """
+        pass
+    
+    def _ids_esistenti(self, tabella: str, colonna_id: str,
+                       ids: Iterable[int]) -> set:
+        """
+        Restituisce gli ID presenti in una tabella, con una query per blocco.
+        
+        Args:
+            tabella: Nome della tabella
+            colonna_id: Nome della colonna ID
+            ids: ID da cercare (i duplicati vengono ignorati)
+            
+        Returns:
+            Insieme degli ID trovati
+        """
+        distinti = list({i for i in ids if i is not None})
+        trovati = set()
+        for blocco in a_blocchi(distinti):
+            query = f"""
+                SELECT {colonna_id} FROM {tabella}
+                WHERE {colonna_id} IN ({', '.join('?' for _ in blocco)})
+            """
+            trovati.update(row[colonna_id] for row in execute_query(query, tuple(blocco)))
+        return trovati
+    
+    def _primo_valore_duplicato(self, entities: List[T], colonna: str,
+                                aggiornamento: bool = False) -> Optional[Any]:
+        """
+        Cerca il primo valore non univoco di una colonna in un gruppo di entità.
+        
+        Controlla sia i duplicati interni al gruppo sia i valori già
+        presenti nel database (in aggiornamento esclude la riga stessa).
+        
+        Args:
+            entities: Entità da scrivere
+            colonna: Colonna con vincolo di unicità
+            aggiornamento: True se le entità hanno già un ID
+            
+        Returns:
+            Primo valore duplicato, None se tutti i valori sono univoci
+        """
+        valori = {}
+        for entity in entities:
+            data = self.to_dict(entity)
+            valore = data[colonna]
+            if valore in valori:
+                return valore
+            valori[valore] = data[self.id_column] if aggiornamento else None
+        
+        for blocco in a_blocchi(list(valori.keys())):
+            query = f"""
+                SELECT {self.id_column}, {colonna} FROM {self.table_name}
+                WHERE {colonna} IN ({', '.join('?' for _ in blocco)})
+            """
+            for row in execute_query(query, tuple(blocco)):
+                if row[self.id_column] != valori[row[colonna]]:
+                    return row[colonna]
+        return None
+    
+    def _righe_per_id(self, entity_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Legge le righe correnti di più entità con una query per blocco.
+        
+        Args:
+            entity_ids: ID delle entità
+            
+        Returns:
+            Dizionario ID -> riga
+        """
+        righe = {}
+        for blocco in a_blocchi(list(dict.fromkeys(entity_ids))):
+            query = f"""
+                SELECT * FROM {self.table_name}
+                WHERE {self.id_column} IN ({', '.join('?' for _ in blocco)})
+            """
+            for row in execute_query(query, tuple(blocco)):
+                righe[row[self.id_column]] = row
+        return righe
+    
+    def create_many(self, entities: List[T]) -> List[T]:
+        """
+        Crea più entità con un solo executemany e un solo commit.
+        
+        Gli ID assegnati sono consecutivi: la scrittura avviene con il
+        writer in esclusiva dentro un'unica transazione.
+        
+        Args:
+            entities: Entità da creare
+            
+        Returns:
+            Entità create con ID assegnato, nello stesso ordine
+            
+        Raises:
+            ValueError: Se la validazione fallisce (nessuna entità viene creata)
+        """
+        if not entities:
+            return []
+        
+        righe = []
+        for entity in entities:
+            data = self.to_dict(entity)
+            data.pop(self.id_column, None)
+            righe.append(data)
+        
+        columns = list(righe[0].keys())
+        query = f"""
+            INSERT INTO {self.table_name} ({', '.join(columns)})
+            VALUES ({', '.join('?' for _ in columns)})
+        """
+        
+        with transaction():
+            self._valida_batch(entities)
+            execute_many(query, [tuple(data[col] for col in columns) for data in righe])
+            self._invalida_cache()
+            
+            ultimo_id = execute_query("SELECT last_insert_rowid() AS id")[0]["id"]
+            primo_id = ultimo_id - len(righe) + 1
+            ids = range(primo_id, ultimo_id + 1)
+            
+            log_audit_many(self.table_name, "INSERT",
+                           [(new_id, None, data) for new_id, data in zip(ids, righe)])
+        
+        self.logger.info(f"Creati {len(righe)} record in {self.table_name}")
+        return [self.to_entity({**data, self.id_column: new_id})
+                for new_id, data in zip(ids, righe)]
+    
+    def update_many(self, entities: List[T]) -> List[T]:
+        """
+        Aggiorna più entità con un solo executemany e un solo commit.
+        
+        Args:
+            entities: Entità da aggiornare
+            
+        Returns:
+            Entità aggiornate, nello stesso ordine
+            
+        Raises:
+            ValueError: Se un'entità non esiste o la validazione fallisce
+        """
+        if not entities:
+            return []
+        
+        righe = []
+        for entity in entities:
+            data = self.to_dict(entity)
+            entity_id = data.pop(self.id_column)
+            righe.append((entity_id, data))
+        
+        with transaction():
+            # Dati precedenti per audit, che servono anche da verifica di esistenza
+            precedenti = self._righe_per_id([entity_id for entity_id, _ in righe])
+            mancanti = [entity_id for entity_id, _ in righe if entity_id not in precedenti]
+            if mancanti:
+                raise ValueError(
+                    f"{self.entity_class.__name__} con ID {mancanti[0]} non trovato"
+                )
+            
+            self._valida_batch(entities, aggiornamento=True)
+            
+            # Un executemany per ogni insieme di colonne cambiate
+            gruppi: Dict[tuple, List[tuple]] = {}
+            audit = []
+            for entity_id, data in righe:
+                modificati = {col: val for col, val in data.items()
+                              if val != precedenti[entity_id].get(col)}
+                if not modificati:
+                    continue
+                gruppi.setdefault(tuple(modificati), []).append(
+                    tuple(modificati.values()) + (entity_id,)
+                )
+                audit.append((
+                    entity_id,
+                    {col: precedenti[entity_id].get(col) for col in modificati},
+                    modificati
+                ))
+            
+            for columns, params in gruppi.items():
+                query = f"""
+                    UPDATE {self.table_name}
+                    SET {', '.join(f'{col} = ?' for col in columns)}
+                    WHERE {self.id_column} = ?
+                """
+                execute_many(query, params)
+            if gruppi:
+                self._invalida_cache()
+            
+            if audit:
+                log_audit_many(self.table_name, "UPDATE", audit)
+        
+        self.logger.info(f"Aggiornati {len(audit)} record in {self.table_name}")
+        return [self.to_entity({**data, self.id_column: entity_id})
+                for entity_id, data in righe]
+    
+    def delete_many(self, entity_ids: List[int]) -> int:
+        """
+        Elimina più entità con un solo executemany e un solo commit.
+        
+        Gli ID non presenti vengono ignorati, come in delete().
+        
+        Args:
+            entity_ids: ID delle entità da eliminare
+            
+        Returns:
+            Numero di entità eliminate
+        """
+        if not entity_ids:
+            return 0
+        
+        with transaction():
+            precedenti = self._righe_per_id(entity_ids)
+            if not precedenti:
+                return 0
+            
+            ids = list(precedenti.keys())
+            self._valida_eliminazione_batch(ids)
+            
+            query = f"DELETE FROM {self.table_name} WHERE {self.id_column} = ?"
+            eliminate = execute_many(query, [(entity_id,) for entity_id in ids])
+            self._invalida_cache()
+            
+            log_audit_many(self.table_name, "DELETE", [
+                (entity_id, self.to_dict(self.to_entity(precedenti[entity_id])), None)
+                for entity_id in ids
+            ])
         
-        return False
+        self.logger.info(f"Eliminati {eliminate} record da {self.table_name}")
+        return eliminate
     
     def exists(self, entity_id: int) -> bool:
         """
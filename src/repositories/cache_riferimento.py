@@ -0,0 +1,238 @@
+"""
+# cache_riferimento.py
+Cache in memoria dei dati di riferimento: categorie, conti e proprietà.
+
+Sono tabelle piccole e modificate di rado, ma lette di continuo (menu di
+selezione, import, report). La cache tiene in memoria tutte le righe di
+ciascuna tabella, indicizzate per ID, per nome e per tipo_macro.
+
+Una tabella viene scartata quando:
+- un repository la modifica (invalida());
+- un'altra connessione, anche di un altro processo, ne fa commit.
+  PRAGMA data_version su una connessione dedicata segnala che il database
+  è cambiato; la tabella versione_tabella (aggiornata da trigger, vedi
+  migrazione 3) indica quali tabelle di riferimento sono cambiate, così
+  un commit sulle sole transazioni non svuota la cache.
+
+Le righe lette dentro un'unità di lavoro aperta non vengono memorizzate,
+perché potrebbero includere modifiche non ancora confermate.
+"""
+
+import logging
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+from src.database.database_connection import (
+    get_db_connection, execute_query, in_transaction
+)
+
+
+class _DatiTabella:
+    """Righe di una tabella con gli indici di ricerca."""
+
+    def __init__(self, righe: List[Dict[str, Any]], colonna_id: str, colonna_nome: str,
+                 versione: Optional[int]):
+        self.righe = righe
+        self.versione = versione
+        self.per_id = {r[colonna_id]: r for r in righe}
+        self.per_nome = {r[colonna_nome]: r for r in righe}
+        self.per_tipo_macro: Dict[str, List[Dict[str, Any]]] = {}
+        if righe and "tipo_macro" in righe[0]:
+            for r in righe:
+                self.per_tipo_macro.setdefault(r["tipo_macro"], []).append(r)
+
+
+class CacheRiferimento:
+    """Cache thread-safe delle tabelle di riferimento, condivisa dal processo."""
+
+    # Tabella -> (colonna ID, colonna nome)
+    TABELLE = {
+        "categoria_transazione": ("id_categoria", "nome_categoria"),
+        "conto_finanziario": ("id_conto", "nome_conto"),
+        "proprieta": ("id_proprieta", "nome_o_indirizzo_breve"),
+    }
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._tabelle: Dict[str, _DatiTabella] = {}
+        self._db_path: Optional[str] = None
+        self._conn_versione: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        # Incrementata a ogni invalidazione: un caricamento iniziato prima
+        # di un'invalidazione non viene memorizzato
+        self._generazione = 0
+        self._statistiche = {
+            "hit": 0,
+            "miss": 0,
+            "invalidazioni": 0,
+            "invalidazioni_esterne": 0,
+        }
+
+    def _verifica_validita(self):
+        """Scarta le tabelle modificate da altre connessioni. Chiamare con il lock."""
+        config = get_db_connection().config
+        if config.db_path != self._db_path:
+            self._reset(config)
+
+        if self._conn_versione is None:
+            return
+        versione_db = self._conn_versione.execute("PRAGMA data_version").fetchone()[0]
+        if versione_db == self._data_version:
+            return
+        self._data_version = versione_db
+        if not self._tabelle:
+            return
+
+        versioni = self._leggi_versioni(self._conn_versione)
+        for tabella, dati in list(self._tabelle.items()):
+            if versioni is None or versioni.get(tabella) != dati.versione:
+                del self._tabelle[tabella]
+                self._generazione += 1
+                self._statistiche["invalidazioni_esterne"] += 1
+
+    def _leggi_versioni(self, conn: Optional[sqlite3.Connection] = None) -> Optional[Dict[str, int]]:
+        """
+        Legge i contatori di versione delle tabelle di riferimento.
+
+        Returns:
+            Dizionario tabella -> versione, None se il database non ha
+            ancora la tabella versione_tabella (migrazione 3)
+        """
+        query = "SELECT tabella, versione FROM versione_tabella"
+        try:
+            if conn is not None:
+                return {r[0]: r[1] for r in conn.execute(query).fetchall()}
+            return {r["tabella"]: r["versione"] for r in execute_query(query)}
+        except sqlite3.OperationalError:
+            return None
+
+    def _reset(self, config):
+        """Svuota la cache e apre la connessione per data_version sul database configurato."""
+        self._tabelle.clear()
+        self._generazione += 1
+        if self._conn_versione is not None:
+            self._conn_versione.close()
+            self._conn_versione = None
+        self._db_path = config.db_path
+        self._data_version = None
+        # Un database in memoria non è visibile da altre connessioni:
+        # valgono solo le invalidazioni esplicite
+        if config.db_path != ":memory:":
+            self._conn_versione = sqlite3.connect(
+                config.db_path, timeout=config.timeout, check_same_thread=False
+            )
+            self._conn_versione.execute("PRAGMA query_only = ON")
+
+    def _dati(self, tabella: str) -> _DatiTabella:
+        """Restituisce le righe di una tabella, caricandole se necessario."""
+        if tabella not in self.TABELLE:
+            raise ValueError(f"Tabella '{tabella}' non gestita dalla cache")
+        with self._lock:
+            self._verifica_validita()
+            dati = self._tabelle.get(tabella)
+            if dati is not None:
+                self._statistiche["hit"] += 1
+                return dati
+            self._statistiche["miss"] += 1
+            generazione = self._generazione
+
+        # La versione va letta prima delle righe: se cambia nel frattempo,
+        # la prossima verifica scarta le righe invece di tenerle per buone
+        versioni = self._leggi_versioni()
+        colonna_id, colonna_nome = self.TABELLE[tabella]
+        righe = execute_query(f"SELECT * FROM {tabella} ORDER BY {colonna_id}")
+        dati = _DatiTabella(righe, colonna_id, colonna_nome,
+                            versioni.get(tabella) if versioni else None)
+        if not in_transaction():
+            with self._lock:
+                if generazione == self._generazione:
+                    self._tabelle[tabella] = dati
+        return dati
+
+    def tutte(self, tabella: str) -> List[Dict[str, Any]]:
+        """
+        Restituisce tutte le righe di una tabella, ordinate per ID.
+
+        Args:
+            tabella: Nome della tabella
+
+        Returns:
+            Lista di righe (copie, modificabili dal chiamante)
+        """
+        return [dict(r) for r in self._dati(tabella).righe]
+
+    def per_id(self, tabella: str, id_valore: int) -> Optional[Dict[str, Any]]:
+        """
+        Cerca una riga per ID.
+
+        Args:
+            tabella: Nome della tabella
+            id_valore: Valore della chiave primaria
+
+        Returns:
+            Copia della riga, None se non esiste
+        """
+        riga = self._dati(tabella).per_id.get(id_valore)
+        return dict(riga) if riga is not None else None
+
+    def per_nome(self, tabella: str, nome: str) -> Optional[Dict[str, Any]]:
+        """
+        Cerca una riga per nome (nome_categoria, nome_conto, nome_o_indirizzo_breve).
+
+        Args:
+            tabella: Nome della tabella
+            nome: Valore della colonna nome
+
+        Returns:
+            Copia della riga, None se non esiste
+        """
+        riga = self._dati(tabella).per_nome.get(nome)
+        return dict(riga) if riga is not None else None
+
+    def per_tipo_macro(self, tabella: str, tipo_macro: str) -> List[Dict[str, Any]]:
+        """
+        Restituisce le righe con un dato tipo_macro.
+
+        Args:
+            tabella: Nome della tabella (deve avere la colonna tipo_macro)
+            tipo_macro: Valore di tipo_macro
+
+        Returns:
+            Lista di righe, ordinate per ID
+        """
+        return [dict(r) for r in self._dati(tabella).per_tipo_macro.get(tipo_macro, [])]
+
+    def invalida(self, tabella: Optional[str] = None):
+        """
+        Scarta le righe di una tabella, o di tutte se tabella è None.
+
+        Args:
+            tabella: Nome della tabella da scartare (optional)
+        """
+        with self._lock:
+            if tabella is None:
+                self._tabelle.clear()
+            else:
+                self._tabelle.pop(tabella, None)
+            self._generazione += 1
+            self._statistiche["invalidazioni"] += 1
+
+    def statistiche(self) -> Dict[str, Any]:
+        """
+        Restituisce i contatori di utilizzo della cache.
+
+        Returns:
+            Dizionario con hit, miss, invalidazioni, hit_ratio e tabelle caricate
+        """
+        with self._lock:
+            stats = dict(self._statistiche)
+            totale = stats["hit"] + stats["miss"]
+            stats["hit_ratio"] = round(stats["hit"] / totale, 3) if totale else 0.0
+            stats["tabelle_caricate"] = sorted(self._tabelle)
+            return stats
+
+
+# Istanza condivisa dal processo
+cache_riferimento = CacheRiferimento()
@@ -6,12 +6,15 @@ Repository per la gestione delle categorie di transazione.
 from typing import List, Optional, Dict
 from src.models.models import CategoriaTransazione
 from src.repositories.base_repository import BaseRepository
-from src.database.database_connection import verifica_unicita
+from src.repositories.cache_riferimento import cache_riferimento
+from src.database.database_connection import verifica_unicita, execute_query
 
 
 class CategoriaRepository(BaseRepository[CategoriaTransazione]):
     """Repository per la gestione delle categorie di transazione."""
     
+    usa_cache_riferimento = True
+    
     @property
     def table_name(self) -> str:
         return "categoria_transazione"
@@ -26,11 +29,13 @@ class CategoriaRepository(BaseRepository[CategoriaTransazione]):
     
     def to_entity(self, row: Dict) -> CategoriaTransazione:
         """Converte una riga del database in CategoriaTransazione."""
-        return CategoriaTransazione(
+        entity = CategoriaTransazione(
             id_categoria=row['id_categoria'],
             nome_categoria=row['nome_categoria'],
             tipo_macro=row['tipo_macro']
         )
+        entity.segna_come_salvata()
+        return entity
     
     def to_dict(self, entity: CategoriaTransazione) -> Dict:
         """Converte CategoriaTransazione in dizionario per il database."""
@@ -72,10 +77,11 @@ class CategoriaRepository(BaseRepository[CategoriaTransazione]):
         Raises:
             ValueError: Se il nuovo nome esiste già
         """
-        # Verifica unicità nome escludendo l'ID corrente
-        if not verifica_unicita(self.table_name, 'nome_categoria', 
-                               entity.nome_categoria, entity.id_categoria, 
-                               self.id_column):
+        # Verifica unicità nome escludendo l'ID corrente, solo se cambiato
+        if self._campi_cambiati(entity, 'nome_categoria') and not verifica_unicita(
+                self.table_name, 'nome_categoria',
+                entity.nome_categoria, entity.id_categoria,
+                self.id_column):
             raise ValueError(f"Categoria '{entity.nome_categoria}' già esistente")
         
         return super().update(entity)
@@ -90,12 +96,8 @@ class CategoriaRepository(BaseRepository[CategoriaTransazione]):
         Returns:
             Categoria se trovata, None altrimenti
         """
-        query = f"SELECT * FROM {self.table_name} WHERE nome_categoria = ?"
-        results = execute_query(query, (nome_categoria,))
-        
-        if results:
-            return self.to_entity(results[0])
-        return None
+        row = cache_riferimento.per_nome(self.table_name, nome_categoria)
+        return self.to_entity(row) if row is not None else None
     
     def get_by_tipo_macro(self, tipo_macro: str) -> List[CategoriaTransazione]:
         """
@@ -107,9 +109,9 @@ class CategoriaRepository(BaseRepository[CategoriaTransazione]):
         Returns:
             Lista di categorie del tipo specificato
         """
-        query = f"SELECT * FROM {self.table_name} WHERE tipo_macro = ? ORDER BY nome_categoria"
-        results = execute_query(query, (tipo_macro,))
-        return [self.to_entity(row) for row in results]
+        rows = cache_riferimento.per_tipo_macro(self.table_name, tipo_macro)
+        rows.sort(key=lambda r: r["nome_categoria"])
+        return [self.to_entity(row) for row in rows]
     
     def get_categorie_immobiliari(self) -> List[CategoriaTransazione]:
         """
@@ -171,6 +173,17 @@ class CategoriaRepository(BaseRepository[CategoriaTransazione]):
         
         return super().delete(entity_id)
     
+    def _valida_batch(self, entities: List[CategoriaTransazione], aggiornamento: bool = False):
+        """Verifica l'unicità dei nomi categoria con una query per blocco."""
+        duplicato = self._primo_valore_duplicato(entities, 'nome_categoria', aggiornamento)
+        if duplicato is not None:
+            raise ValueError(f"Categoria '{duplicato}' già esistente")
+    
+    def _valida_eliminazione_batch(self, entity_ids: List[int]):
+        """Impedisce l'eliminazione di categorie utilizzate in transazioni."""
+        if self._ids_esistenti("transazione", "id_categoria", entity_ids):
+            raise ValueError("Impossibile eliminare categoria in uso nelle transazioni")
+    
     def get_statistiche_utilizzo(self) -> List[Dict]:
         """
         Ottiene statistiche sull'utilizzo delle categorie.
@@ -178,16 +191,18 @@ class CategoriaRepository(BaseRepository[CategoriaTransazione]):
         Returns:
             Lista con statistiche per categoria
         """
+        # Legge l'aggregato mensile: il costo dipende da mesi e categorie,
+        # non dal numero di transazioni
         query = """
             SELECT 
                 c.id_categoria,
                 c.nome_categoria,
                 c.tipo_macro,
-                COUNT(t.id_transazione) as numero_transazioni,
-                SUM(CASE WHEN t.importo > 0 THEN t.importo ELSE 0 END) as totale_entrate,
-                SUM(CASE WHEN t.importo < 0 THEN ABS(t.importo) ELSE 0 END) as totale_uscite
+                COALESCE(SUM(a.numero), 0) as numero_transazioni,
+                COALESCE(ROUND(SUM(a.entrate), 2), 0) as totale_entrate,
+                COALESCE(ROUND(SUM(a.uscite), 2), 0) as totale_uscite
             FROM categoria_transazione c
-            LEFT JOIN transazione t ON c.id_categoria = t.id_categoria
+            LEFT JOIN aggregato_mensile a ON c.id_categoria = a.id_categoria
             GROUP BY c.id_categoria
             ORDER BY numero_transazioni DESC
         """
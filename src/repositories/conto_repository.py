@@ -6,12 +6,18 @@ Repository per la gestione dei conti finanziari.
 from typing import List, Optional, Dict
 from src.models.models import ContoFinanziario, TipoConto
 from src.repositories.base_repository import BaseRepository
-from src.database.database_connection import verifica_unicita, execute_query
+from src.repositories.cache_riferimento import cache_riferimento
+from src.database.database_connection import (
+    verifica_unicita, execute_query, execute_non_query, execute_returning,
+    transaction, log_audit, SUPPORTA_RETURNING
+)
 
 
 class ContoRepository(BaseRepository[ContoFinanziario]):
     """Repository per la gestione dei conti finanziari."""
 
+    usa_cache_riferimento = True
+
     @property
     def table_name(self) -> str:
         return "conto_finanziario"
@@ -25,13 +31,15 @@ class ContoRepository(BaseRepository[ContoFinanziario]):
         return ContoFinanziario
 
     def to_entity(self, row: Dict) -> ContoFinanziario:
-        return ContoFinanziario(
+        entity = ContoFinanziario(
             id_conto=row["id_conto"],
             nome_conto=row["nome_conto"],
             saldo_iniziale=row["saldo_iniziale"],
             tipo_conto=TipoConto(row["tipo_conto"]),
             saldo_attuale=row["saldo_attuale"]
         )
+        entity.segna_come_salvata()
+        return entity
 
     def to_dict(self, entity: ContoFinanziario) -> Dict:
         return {
@@ -49,17 +57,92 @@ class ContoRepository(BaseRepository[ContoFinanziario]):
         return super().create(entity)
 
     def update(self, entity: ContoFinanziario) -> ContoFinanziario:
-        # Verifica unicità nome_conto escludendo l'ID corrente
-        if not verifica_unicita(self.table_name, "nome_conto", entity.nome_conto, entity.id_conto, self.id_column):
+        # Verifica unicità nome_conto escludendo l'ID corrente, solo se cambiato
+        if self._campi_cambiati(entity, "nome_conto") and not verifica_unicita(self.table_name, "nome_conto", entity.nome_conto, entity.id_conto, self.id_column):
             raise ValueError(f"Conto '{entity.nome_conto}' già esistente")
         return super().update(entity)
 
+    def _valida_batch(self, entities: List[ContoFinanziario], aggiornamento: bool = False):
+        # Unicità nome_conto con una query per blocco
+        duplicato = self._primo_valore_duplicato(entities, "nome_conto", aggiornamento)
+        if duplicato is not None:
+            raise ValueError(f"Conto '{duplicato}' già esistente")
+
+    def applica_variazioni_saldo(self, variazioni: Dict[int, float]) -> Dict[int, float]:
+        """
+        Somma una variazione al saldo_attuale di uno o più conti.
+        
+        Ogni conto richiede un solo UPDATE, indipendente dal numero di
+        transazioni: è l'aggiornamento incrementale usato dopo le scritture
+        sulle transazioni. Se chiamato dentro un'unità di lavoro già aperta,
+        ne fa parte.
+        
+        Args:
+            variazioni: Dizionario id_conto -> importo da sommare al saldo
+            
+        Returns:
+            Dizionario id_conto -> nuovo saldo_attuale (solo conti con variazione non nulla)
+            
+        Raises:
+            ValueError: Se un conto non esiste
+        """
+        nuovi_saldi = {}
+        query = f"""
+            UPDATE {self.table_name}
+            SET saldo_attuale = ROUND(COALESCE(saldo_attuale, saldo_iniziale) + ?, 2)
+            WHERE {self.id_column} = ?
+        """
+        with transaction():
+            for id_conto, variazione in variazioni.items():
+                variazione = round(variazione, 2)
+                if not variazione:
+                    continue
+                if SUPPORTA_RETURNING:
+                    rows = execute_returning(query + " RETURNING saldo_attuale", (variazione, id_conto))
+                else:
+                    rows = []
+                    if execute_non_query(query, (variazione, id_conto)):
+                        rows = execute_query(
+                            f"SELECT saldo_attuale FROM {self.table_name} WHERE {self.id_column} = ?",
+                            (id_conto,)
+                        )
+                if not rows:
+                    raise ValueError(f"Conto con ID {id_conto} non trovato")
+                saldo = rows[0]["saldo_attuale"]
+                log_audit(self.table_name, "UPDATE", id_conto,
+                          dati_precedenti={"saldo_attuale": round(saldo - variazione, 2)},
+                          dati_nuovi={"saldo_attuale": saldo})
+                nuovi_saldi[id_conto] = saldo
+            if nuovi_saldi:
+                self._invalida_cache()
+        return nuovi_saldi
+
+    def get_saldi_calcolati(self) -> List[Dict]:
+        """
+        Confronta saldo registrato e saldo calcolato di tutti i conti con una sola query.
+        
+        Legge la vista v_saldi_conti, che somma gli importi per conto con un
+        solo raggruppamento.
+        
+        Returns:
+            Lista di dizionari con id_conto, nome_conto, saldo_registrato,
+            saldo_calcolato, scostamento (calcolato - registrato),
+            numero_transazioni e ultima_transazione, ordinati per id_conto
+        """
+        query = """
+            SELECT id_conto, nome_conto, saldo_iniziale,
+                   saldo_registrato,
+                   ROUND(saldo_calcolato, 2) AS saldo_calcolato,
+                   ROUND(ROUND(saldo_calcolato, 2) - COALESCE(saldo_registrato, 0), 2) AS scostamento,
+                   numero_transazioni, ultima_transazione
+            FROM v_saldi_conti
+            ORDER BY id_conto
+        """
+        return execute_query(query)
+
     def get_by_nome(self, nome_conto: str) -> Optional[ContoFinanziario]:
-        query = f"SELECT * FROM {self.table_name} WHERE nome_conto = ?"
-        results = execute_query(query, (nome_conto,))
-        if results:
-            return self.to_entity(results[0])
-        return None
+        row = cache_riferimento.per_nome(self.table_name, nome_conto)
+        return self.to_entity(row) if row is not None else None
 
     def get_by_tipo(self, tipo_conto: str) -> List[ContoFinanziario]:
         query = f"SELECT * FROM {self.table_name} WHERE tipo_conto = ? ORDER BY nome_conto"
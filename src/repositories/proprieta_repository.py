@@ -6,12 +6,15 @@ Repository per la gestione delle proprietà immobiliari.
 from typing import List, Optional, Dict
 from datetime import datetime, date
 from src.models.models import Proprieta, TipoProprieta
-from src.repositories.base_repository import BaseRepository
+from src.repositories.base_repository import BaseRepository, a_blocchi
+from src.repositories.cache_riferimento import cache_riferimento
 from src.database.database_connection import verifica_unicita, execute_query
 
 class ProprietaRepository(BaseRepository[Proprieta]):
     """Repository per la gestione delle proprietà immobiliari."""
 
+    usa_cache_riferimento = True
+
     @property
     def table_name(self) -> str:
         return "proprieta"
@@ -29,7 +32,7 @@ class ProprietaRepository(BaseRepository[Proprieta]):
         data_acquisizione = None
         if row["data_acquisizione_o_inizio_contratto_affitto"]:
             data_acquisizione = datetime.strptime(row["data_acquisizione_o_inizio_contratto_affitto"], "%Y-%m-%d").date()
-        return Proprieta(
+        entity = Proprieta(
             id_proprieta=row["id_proprieta"],
             nome_o_indirizzo_breve=row["nome_o_indirizzo_breve"],
             tipo=TipoProprieta(row["tipo"]),
@@ -39,6 +42,8 @@ class ProprietaRepository(BaseRepository[Proprieta]):
             canone_affitto_mensile_passivo=row["canone_affitto_mensile_passivo"],
             eventuali_note_legali_o_scadenze_contrattuali=row["eventuali_note_legali_o_scadenze_contrattuali"]
         )
+        entity.segna_come_salvata()
+        return entity
 
     def to_dict(self, entity: Proprieta) -> Dict:
         # Gestione conversione date e float
@@ -64,17 +69,14 @@ class ProprietaRepository(BaseRepository[Proprieta]):
         return super().create(entity)
 
     def update(self, entity: Proprieta) -> Proprieta:
-        # Verifica unicità nome_o_indirizzo_breve escludendo l'ID corrente
-        if not verifica_unicita(self.table_name, "nome_o_indirizzo_breve", entity.nome_o_indirizzo_breve, entity.id_proprieta, self.id_column):
+        # Verifica unicità nome_o_indirizzo_breve escludendo l'ID corrente, solo se cambiato
+        if self._campi_cambiati(entity, "nome_o_indirizzo_breve") and not verifica_unicita(self.table_name, "nome_o_indirizzo_breve", entity.nome_o_indirizzo_breve, entity.id_proprieta, self.id_column):
             raise ValueError(f"Proprietà '{entity.nome_o_indirizzo_breve}' già esistente")
         return super().update(entity)
 
     def get_by_nome_o_indirizzo(self, nome: str) -> Optional[Proprieta]:
-        query = f"SELECT * FROM {self.table_name} WHERE nome_o_indirizzo_breve = ?"
-        results = execute_query(query, (nome,))
-        if results:
-            return self.to_entity(results[0])
-        return None
+        row = cache_riferimento.per_nome(self.table_name, nome)
+        return self.to_entity(row) if row is not None else None
 
     def get_by_tipo(self, tipo: TipoProprieta) -> List[Proprieta]:
         query = f"SELECT * FROM {self.table_name} WHERE tipo = ? ORDER BY nome_o_indirizzo_breve"
@@ -100,3 +102,24 @@ class ProprietaRepository(BaseRepository[Proprieta]):
             raise ValueError("Impossibile eliminare la proprietà: esistono categorie associate (tipo_macro).")
 
         return super().delete(entity_id)
+
+    def _valida_batch(self, entities: List[Proprieta], aggiornamento: bool = False):
+        # Unicità nome_o_indirizzo_breve con una query per blocco
+        duplicato = self._primo_valore_duplicato(entities, "nome_o_indirizzo_breve", aggiornamento)
+        if duplicato is not None:
+            raise ValueError(f"Proprietà '{duplicato}' già esistente")
+
+    def _valida_eliminazione_batch(self, entity_ids: List[int]):
+        # Stessi controlli di delete(), con una query per blocco
+        for blocco in a_blocchi(entity_ids):
+            segnaposto = ", ".join("?" for _ in blocco)
+            query_trans = f"SELECT 1 FROM transazione WHERE id_proprieta_associata IN ({segnaposto}) LIMIT 1"
+            if execute_query(query_trans, tuple(blocco)):
+                raise ValueError("Impossibile eliminare la proprietà: esistono transazioni associate.")
+            query_cat = f"""
+                SELECT 1 FROM categoria_transazione c
+                JOIN {self.table_name} p ON c.tipo_macro = 'Immobile ' || p.nome_o_indirizzo_breve
+                WHERE p.id_proprieta IN ({segnaposto}) LIMIT 1
+            """
+            if execute_query(query_cat, tuple(blocco)):
+                raise ValueError("Impossibile eliminare la proprietà: esistono categorie associate (tipo_macro).")
@@ -0,0 +1,86 @@
+"""
+# saldo_checkpoint_repository.py
+Repository per i checkpoint mensili dei saldi (tabella saldo_checkpoint).
+
+Un checkpoint memorizza la somma cumulata degli importi di un conto fino
+all'ultimo giorno di un mese. I trigger della migrazione 5 eliminano i
+checkpoint resi obsoleti da una scrittura sulle transazioni: solo quelli
+del conto coinvolto, dal mese della transazione in poi.
+"""
+
+from typing import List, Optional, Tuple
+from src.database.database_connection import (
+    execute_query, execute_non_query, execute_many
+)
+
+
+class SaldoCheckpointRepository:
+    """Repository per i checkpoint mensili dei saldi."""
+
+    table_name = "saldo_checkpoint"
+
+    def get_ultimo(self, id_conto: int, fino_a_anno_mese: str) -> Optional[Tuple[str, float]]:
+        """
+        Recupera il checkpoint più recente non successivo a un mese.
+
+        Args:
+            id_conto: ID del conto
+            fino_a_anno_mese: Mese massimo (YYYY-MM), incluso
+
+        Returns:
+            Tupla (anno_mese, somma_cumulata), None se non esiste
+        """
+        query = f"""
+            SELECT anno_mese, somma_cumulata FROM {self.table_name}
+            WHERE id_conto = ? AND anno_mese <= ?
+            ORDER BY anno_mese DESC
+            LIMIT 1
+        """
+        results = execute_query(query, (id_conto, fino_a_anno_mese))
+        if results:
+            return results[0]["anno_mese"], results[0]["somma_cumulata"]
+        return None
+
+    def get_by_conto(self, id_conto: int) -> List[Tuple[str, float]]:
+        """
+        Recupera tutti i checkpoint di un conto.
+
+        Args:
+            id_conto: ID del conto
+
+        Returns:
+            Lista di tuple (anno_mese, somma_cumulata) in ordine cronologico
+        """
+        query = f"SELECT anno_mese, somma_cumulata FROM {self.table_name} WHERE id_conto = ? ORDER BY anno_mese"
+        return [(r["anno_mese"], r["somma_cumulata"]) for r in execute_query(query, (id_conto,))]
+
+    def salva(self, id_conto: int, checkpoint: List[Tuple[str, float]]) -> int:
+        """
+        Salva (o sostituisce) checkpoint di un conto con un solo executemany.
+
+        Args:
+            id_conto: ID del conto
+            checkpoint: Lista di tuple (anno_mese, somma_cumulata)
+
+        Returns:
+            Numero di checkpoint salvati
+        """
+        if not checkpoint:
+            return 0
+        query = f"INSERT OR REPLACE INTO {self.table_name} (id_conto, anno_mese, somma_cumulata) VALUES (?, ?, ?)"
+        execute_many(query, [(id_conto, anno_mese, somma) for anno_mese, somma in checkpoint])
+        return len(checkpoint)
+
+    def elimina(self, id_conto: Optional[int] = None) -> int:
+        """
+        Elimina i checkpoint di un conto, o di tutti i conti.
+
+        Args:
+            id_conto: ID del conto (optional)
+
+        Returns:
+            Numero di checkpoint eliminati
+        """
+        if id_conto is None:
+            return execute_non_query(f"DELETE FROM {self.table_name}")
+        return execute_non_query(f"DELETE FROM {self.table_name} WHERE id_conto = ?", (id_conto,))
@@ -3,17 +3,165 @@
 Repository per la gestione delle transazioni finanziarie.
 """
 
-from typing import List, Optional, Dict
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Dict, Sequence, Tuple
 from datetime import datetime, date
 from src.models.models import Transazione, TipoFlusso
-from src.repositories.base_repository import BaseRepository
+from src.repositories.base_repository import BaseRepository, a_blocchi
+from src.repositories.categoria_repository import CategoriaRepository
+from src.repositories.conto_repository import ContoRepository
+from src.repositories.proprieta_repository import ProprietaRepository
+from src.repositories.aggregato_mensile_repository import AggregatoMensileRepository
 from src.database.database_connection import (
-    verifica_esistenza_id, execute_query
+    verifica_esistenza_id, execute_query, execute_many, iter_query, transaction, log_audit_many,
+    log_audit, get_db_cursor, SUPPORTA_RETURNING
 )
 
+@dataclass
+class CriteriTransazione:
+    """
+    Criteri di ricerca componibili per le transazioni.
+
+    I filtri non impostati (None/False) vengono ignorati; quelli impostati
+    sono combinati in AND e compilati in un'unica SELECT parametrizzata.
+    """
+    data_inizio: Optional[date] = None
+    data_fine: Optional[date] = None
+    id_categoria: Optional[int] = None
+    id_conto: Optional[int] = None
+    id_proprieta: Optional[int] = None
+    tipo_flusso: Optional[TipoFlusso] = None
+    solo_fiscali: bool = False
+    solo_entrate: bool = False
+    solo_uscite: bool = False
+    importo_min: Optional[float] = None
+    importo_max: Optional[float] = None
+    testo: Optional[str] = None  # Cercato in descrizione e note
+    ordina_per: Optional[str] = "data DESC"
+    limite: Optional[int] = None
+    offset: int = 0
+
+    # Colonne ammesse in ORDER BY: ordina_per finisce nella query come testo
+    COLONNE_ORDINABILI = ("data", "importo", "descrizione", "id_transazione",
+                          "id_categoria", "id_conto_finanziario")
+
+    def clausola_where(self, alias: Optional[str] = None) -> Tuple[str, tuple]:
+        """
+        Compila i filtri in una clausola WHERE.
+
+        Args:
+            alias: Alias della tabella transazione da anteporre alle colonne,
+                necessario quando la query contiene JOIN
+
+        Returns:
+            Tupla (clausola senza 'WHERE', parametri); clausola vuota se
+            nessun filtro è impostato
+        """
+        p = f"{alias}." if alias else ""
+        condizioni = []
+        params = []
+        if self.data_inizio:
+            condizioni.append(f"{p}data >= ?")
+            params.append(self.data_inizio.strftime("%Y-%m-%d"))
+        if self.data_fine:
+            condizioni.append(f"{p}data <= ?")
+            params.append(self.data_fine.strftime("%Y-%m-%d"))
+        if self.id_categoria is not None:
+            condizioni.append(f"{p}id_categoria = ?")
+            params.append(self.id_categoria)
+        if self.id_conto is not None:
+            condizioni.append(f"{p}id_conto_finanziario = ?")
+            params.append(self.id_conto)
+        if self.id_proprieta is not None:
+            condizioni.append(f"{p}id_proprieta_associata = ?")
+            params.append(self.id_proprieta)
+        if self.tipo_flusso is not None:
+            # Confronto per valore: accetta anche il TipoFlusso di src.models.transazione
+            condizioni.append(f"{p}tipo_flusso = ?")
+            params.append(getattr(self.tipo_flusso, "value", self.tipo_flusso))
+        if self.solo_fiscali:
+            condizioni.append(f"{p}flag_deducibile_o_rilevante_fiscalmente = 1")
+        if self.solo_entrate:
+            condizioni.append(f"{p}importo > 0")
+        if self.solo_uscite:
+            condizioni.append(f"{p}importo < 0")
+        if self.importo_min is not None:
+            condizioni.append(f"{p}importo >= ?")
+            params.append(self.importo_min)
+        if self.importo_max is not None:
+            condizioni.append(f"{p}importo <= ?")
+            params.append(self.importo_max)
+        if self.testo:
+            condizioni.append(f"({p}descrizione LIKE ? ESCAPE '\\' OR {p}note_aggiuntive LIKE ? ESCAPE '\\')")
+            testo = self.testo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.extend([f"%{testo}%", f"%{testo}%"])
+        return " AND ".join(condizioni), tuple(params)
+
+    def clausola_ordine(self, alias: Optional[str] = None) -> str:
+        """
+        Valida ordina_per e lo completa con id_transazione come spareggio.
+
+        Args:
+            alias: Alias della tabella transazione da anteporre alle colonne
+
+        Returns:
+            Clausola ORDER BY senza 'ORDER BY', vuota se ordina_per è None
+
+        Raises:
+            ValueError: Se ordina_per contiene colonne o direzioni non ammesse
+        """
+        if not self.ordina_per:
+            return ""
+        p = f"{alias}." if alias else ""
+        termini = []
+        direzione = "ASC"
+        for termine in self.ordina_per.split(","):
+            parti = termine.split()
+            if not parti or len(parti) > 2 or parti[0] not in self.COLONNE_ORDINABILI:
+                raise ValueError(f"Ordinamento non valido: '{termine.strip()}'")
+            direzione = parti[1].upper() if len(parti) == 2 else "ASC"
+            if direzione not in ("ASC", "DESC"):
+                raise ValueError(f"Direzione di ordinamento non valida: '{parti[1]}'")
+            termini.append(f"{p}{parti[0]} {direzione}")
+        # Ordinamento stabile a parità di valori
+        if not any(t.startswith(f"{p}id_transazione ") for t in termini):
+            termini.append(f"{p}id_transazione {direzione}")
+        return ", ".join(termini)
+
+
 class TransazioneRepository(BaseRepository[Transazione]):
     """Repository per la gestione delle transazioni finanziarie."""
 
+    # Tabelle collegate lette dalle query con dettagli: attributo della
+    # Transazione -> (tabella, alias, colonna FK in transazione, colonne)
+    TABELLE_DETTAGLI = {
+        "categoria": ("categoria_transazione", "c", "id_categoria",
+                      ("id_categoria", "nome_categoria", "tipo_macro")),
+        "conto": ("conto_finanziario", "cf", "id_conto_finanziario",
+                  ("id_conto", "nome_conto", "saldo_iniziale", "tipo_conto", "saldo_attuale")),
+        "proprieta": ("proprieta", "p", "id_proprieta_associata",
+                      ("id_proprieta", "nome_o_indirizzo_breve", "tipo",
+                       "data_acquisizione_o_inizio_contratto_affitto",
+                       "valore_acquisto_o_stima_attuale", "canone_affitto_mensile_attivo",
+                       "canone_affitto_mensile_passivo",
+                       "eventuali_note_legali_o_scadenze_contrattuali")),
+    }
+
+    # Colonne ammesse in riepilogo_mensile: finiscono nella query come testo
+    COLONNE_RAGGRUPPABILI = ("id_conto_finanziario", "id_categoria", "id_proprieta_associata",
+                             "tipo_flusso", "flag_deducibile_o_rilevante_fiscalmente")
+
+    def __init__(self):
+        super().__init__()
+        self._aggregato = AggregatoMensileRepository()
+        self._repo_dettagli = {
+            "categoria": CategoriaRepository(),
+            "conto": ContoRepository(),
+            "proprieta": ProprietaRepository(),
+        }
+
     @property
     def table_name(self) -> str:
         return "transazione"
@@ -31,7 +179,7 @@ class TransazioneRepository(BaseRepository[Transazione]):
         data_trans = datetime.strptime(row["data"], "%Y-%m-%d").date()
         flag_fiscale = bool(row["flag_deducibile_o_rilevante_fiscalmente"])
         tipo_flusso = TipoFlusso(row["tipo_flusso"])
-        return Transazione(
+        entity = Transazione(
             id_transazione=row["id_transazione"],
             data=data_trans,
             importo=row["importo"],
@@ -43,6 +191,8 @@ class TransazioneRepository(BaseRepository[Transazione]):
             flag_deducibile_o_rilevante_fiscalmente=flag_fiscale,
             note_aggiuntive=row["note_aggiuntive"]
         )
+        entity.segna_come_salvata()
+        return entity
 
     def to_dict(self, entity: Transazione) -> Dict:
         data_str = entity.data.strftime("%Y-%m-%d") if isinstance(entity.data, date) else entity.data
@@ -69,77 +219,477 @@ class TransazioneRepository(BaseRepository[Transazione]):
             if not verifica_esistenza_id("proprieta", "id_proprieta", entity.id_proprieta_associata):
                 raise ValueError(f"Proprietà con ID {entity.id_proprieta_associata} non esistente")
 
+    def _valida_batch(self, entities: List[Transazione], aggiornamento: bool = False):
+        # Verifica FK con una query per tabella referenziata, sugli ID distinti
+        controlli = [
+            ("categoria_transazione", "id_categoria", "id_categoria", "Categoria"),
+            ("conto_finanziario", "id_conto", "id_conto_finanziario", "Conto finanziario"),
+            ("proprieta", "id_proprieta", "id_proprieta_associata", "Proprietà"),
+        ]
+        for tabella, colonna_id, attributo, etichetta in controlli:
+            richiesti = {getattr(e, attributo) for e in entities if getattr(e, attributo)}
+            mancanti = richiesti - self._ids_esistenti(tabella, colonna_id, richiesti)
+            if mancanti:
+                raise ValueError(f"{etichetta} con ID {min(mancanti)} non esistente")
+
     def create(self, entity: Transazione) -> Transazione:
-        self._valida_fk(entity)
-        return super().create(entity)
+        # Verifica FK e insert nella stessa unità di lavoro
+        with transaction():
+            self._valida_fk(entity)
+            return super().create(entity)
 
     def update(self, entity: Transazione) -> Transazione:
-        self._valida_fk(entity)
-        return super().update(entity)
+        with transaction():
+            # Le FK vanno riverificate solo se sono cambiate
+            if self._campi_cambiati(entity, "id_categoria", "id_conto_finanziario", "id_proprieta_associata"):
+                self._valida_fk(entity)
+            return super().update(entity)
+
+    @staticmethod
+    def calcola_impronta(id_conto: int, data: date, data_valuta: Optional[date], importo: float,
+                         descrizione: str, occorrenza: int = 0) -> str:
+        """
+        Calcola l'impronta di una riga di estratto conto.
+
+        La descrizione è normalizzata (minuscole, spazi compattati) e
+        l'importo convertito in centesimi, così piccole differenze di
+        formattazione tra due estratti non cambiano l'impronta.
+
+        Args:
+            id_conto: Conto della transazione
+            data: Data contabile
+            data_valuta: Data valuta (optional)
+            importo: Importo con segno
+            descrizione: Descrizione della riga
+            occorrenza: Posizione della riga tra quelle identiche dello
+                stesso estratto (0 per la prima)
+
+        Returns:
+            Hash SHA-256 esadecimale
+        """
+        descrizione_normalizzata = re.sub(r"\s+", " ", descrizione).strip().lower()
+        chiave = "|".join(str(v) for v in (
+            id_conto, data, data_valuta or "", round(importo * 100), descrizione_normalizzata, occorrenza
+        ))
+        return hashlib.sha256(chiave.encode("utf-8")).hexdigest()
+
+    def impronte_nel_periodo(self, id_conto: int, data_inizio: date, data_fine: date) -> List[Dict]:
+        """
+        Legge con una sola query le transazioni di un conto in un intervallo, per il controllo dei duplicati.
+
+        Args:
+            id_conto: Conto da considerare
+            data_inizio: Data iniziale (inclusa)
+            data_fine: Data finale (inclusa)
+
+        Returns:
+            Lista di dizionari con data, importo, descrizione e impronta
+            (None per le transazioni senza impronta)
+        """
+        query = f"""
+            SELECT data, importo, descrizione, impronta
+            FROM {self.table_name}
+            WHERE id_conto_finanziario = ? AND data >= ? AND data <= ?
+        """
+        return execute_query(query, (id_conto, data_inizio.strftime("%Y-%m-%d"), data_fine.strftime("%Y-%m-%d")))
+
+    def create_nuova(self, entity: Transazione, impronta: str) -> Optional[Transazione]:
+        """
+        Crea una transazione con la sua impronta, se non è già presente.
+
+        Un solo INSERT ... ON CONFLICT DO NOTHING sull'indice unico
+        dell'impronta, senza leggere prima le transazioni esistenti.
+
+        Args:
+            entity: Transazione da creare
+            impronta: Impronta della transazione (calcola_impronta)
+
+        Returns:
+            Transazione creata con ID assegnato, None se già presente
+
+        Raises:
+            ValueError: Se la validazione fallisce o manca l'impronta
+        """
+        if impronta is None:
+            raise ValueError("Impronta mancante: ogni transazione deve avere la propria impronta")
+        data = self.to_dict(entity)
+        data.pop(self.id_column, None)
+        data["impronta"] = impronta
+        columns = list(data.keys())
+        query = f"""
+            INSERT INTO {self.table_name} ({', '.join(columns)})
+            VALUES ({', '.join('?' for _ in columns)})
+            ON CONFLICT DO NOTHING
+        """
+
+        with transaction():
+            self._valida_fk(entity)
+            with get_db_cursor() as cursor:
+                if SUPPORTA_RETURNING:
+                    cursor.execute(query + f" RETURNING {self.id_column}", tuple(data.values()))
+                    riga = cursor.fetchone()
+                    new_id = riga[0] if riga else None
+                else:
+                    cursor.execute(query, tuple(data.values()))
+                    new_id = cursor.lastrowid if cursor.rowcount > 0 else None
+            if new_id is None:
+                return None
+            self._invalida_cache()
+            log_audit(self.table_name, "INSERT", new_id, dati_nuovi=data)
+        return self.to_entity({**data, self.id_column: new_id})
+
+    def create_many_nuove(self, entities: List[Transazione], impronte: List[str]) -> List[Transazione]:
+        """
+        Crea le transazioni con la loro impronta, saltando quelle già presenti.
+
+        Usa un solo executemany con INSERT ... ON CONFLICT DO NOTHING
+        sull'indice unico dell'impronta: una riga già importata viene
+        ignorata senza errori.
+
+        Args:
+            entities: Transazioni da creare
+            impronte: Impronta di ciascuna transazione (calcola_impronta)
+
+        Returns:
+            Transazioni effettivamente create, con ID assegnato, nell'ordine
+            di entities
+
+        Raises:
+            ValueError: Se la validazione fallisce, le liste hanno lunghezze
+                diverse o manca un'impronta
+        """
+        if len(entities) != len(impronte):
+            raise ValueError("Serve un'impronta per ogni transazione")
+        if any(impronta is None for impronta in impronte):
+            raise ValueError("Impronta mancante: ogni transazione deve avere la propria impronta")
+        if not entities:
+            return []
+
+        righe = []
+        viste = set()
+        for entity, impronta in zip(entities, impronte):
+            # Stessa impronta due volte nel batch: vale la prima
+            if impronta in viste:
+                continue
+            viste.add(impronta)
+            data = self.to_dict(entity)
+            data.pop(self.id_column, None)
+            data["impronta"] = impronta
+            righe.append(data)
+        columns = list(righe[0].keys())
+        query = f"""
+            INSERT INTO {self.table_name} ({', '.join(columns)})
+            VALUES ({', '.join('?' for _ in columns)})
+            ON CONFLICT DO NOTHING
+        """
+
+        with transaction():
+            self._valida_batch(entities)
+            ultimo_id = execute_query(f"SELECT COALESCE(MAX({self.id_column}), 0) AS id FROM {self.table_name}")[0]["id"]
+            execute_many(query, [tuple(data[col] for col in columns) for data in righe])
+            # Con il writer in esclusiva, le righe con ID maggiore sono quelle appena inserite
+            id_per_impronta = {
+                r["impronta"]: r[self.id_column] for r in execute_query(
+                    f"SELECT {self.id_column}, impronta FROM {self.table_name} WHERE {self.id_column} > ?",
+                    (ultimo_id,)
+                )
+            }
+            create = [(id_per_impronta[data["impronta"]], data) for data in righe
+                      if data["impronta"] in id_per_impronta]
+            if create:
+                self._invalida_cache()
+                log_audit_many(self.table_name, "INSERT",
+                               [(new_id, None, data) for new_id, data in create])
+
+        self.logger.info(f"Creati {len(create)} record in {self.table_name} ({len(entities) - len(create)} già presenti)")
+        return [self.to_entity({**data, self.id_column: new_id}) for new_id, data in create]
+
+    def _select_dettagli(self) -> str:
+        """
+        Restituisce SELECT e JOIN per leggere le transazioni con le entità collegate.
+
+        Le colonne delle tabelle collegate hanno alias '<attributo>__<colonna>'.
+        """
+        colonne = ["t.*"]
+        join = []
+        for attributo, (tabella, alias, fk, colonne_tabella) in self.TABELLE_DETTAGLI.items():
+            colonne.extend(f"{alias}.{col} AS {attributo}__{col}" for col in colonne_tabella)
+            # La proprietà è facoltativa: LEFT JOIN
+            tipo_join = "LEFT JOIN" if attributo == "proprieta" else "JOIN"
+            join.append(f"{tipo_join} {tabella} {alias} ON t.{fk} = {alias}.{colonne_tabella[0]}")
+        return f"SELECT {', '.join(colonne)} FROM {self.table_name} t {' '.join(join)}"
+
+    def _to_entity_dettagliata(self, row: Dict) -> Transazione:
+        """Converte una riga della query con dettagli in Transazione con entità collegate."""
+        entity = self.to_entity(row)
+        for attributo, (_, _, _, colonne_tabella) in self.TABELLE_DETTAGLI.items():
+            if row[f"{attributo}__{colonne_tabella[0]}"] is None:
+                continue
+            dati = {col: row[f"{attributo}__{col}"] for col in colonne_tabella}
+            setattr(entity, attributo, self._repo_dettagli[attributo].to_entity(dati))
+        return entity
+
+    def _query_criteri(self, criteri: CriteriTransazione, con_dettagli: bool = False) -> Tuple[str, tuple]:
+        """Costruisce la SELECT (con ORDER BY, LIMIT e OFFSET) per dei criteri."""
+        alias = "t" if con_dettagli else None
+        where, params = criteri.clausola_where(alias)
+        query = self._select_dettagli() if con_dettagli else f"SELECT * FROM {self.table_name}"
+        if where:
+            query += f" WHERE {where}"
+        ordine = criteri.clausola_ordine(alias)
+        if ordine:
+            query += f" ORDER BY {ordine}"
+        if criteri.limite is not None:
+            query += " LIMIT ? OFFSET ?"
+            params += (criteri.limite, criteri.offset)
+        elif criteri.offset:
+            query += " LIMIT -1 OFFSET ?"
+            params += (criteri.offset,)
+        return query, params
+
+    def cerca(self, criteri: CriteriTransazione, con_dettagli: bool = False) -> List[Transazione]:
+        """
+        Cerca le transazioni che soddisfano i criteri con una sola SELECT.
+
+        Args:
+            criteri: Filtri, ordinamento e paginazione
+            con_dettagli: Se True, valorizza anche categoria, conto e
+                proprieta di ogni transazione nella stessa query (JOIN)
+
+        Returns:
+            Lista delle transazioni trovate
+        """
+        query, params = self._query_criteri(criteri, con_dettagli)
+        converti = self._to_entity_dettagliata if con_dettagli else self.to_entity
+        return [converti(row) for row in execute_query(query, params)]
+
+    def iter_cerca(self, criteri: CriteriTransazione, dimensione_blocco: int = 500,
+                   con_dettagli: bool = False) -> Iterator[Transazione]:
+        """
+        Come cerca(), ma restituisce le transazioni una alla volta.
+
+        Le righe vengono lette a blocchi con fetchmany, quindi la memoria
+        usata non dipende dal numero di transazioni trovate.
+
+        Args:
+            criteri: Filtri, ordinamento e paginazione
+            dimensione_blocco: Righe lette dal database per volta
+            con_dettagli: Se True, valorizza anche le entità collegate
+
+        Yields:
+            Transazioni trovate
+        """
+        query, params = self._query_criteri(criteri, con_dettagli)
+        converti = self._to_entity_dettagliata if con_dettagli else self.to_entity
+        for row in iter_query(query, params, dimensione_blocco):
+            yield converti(row)
+
+    def cerca_pagina(self, criteri: CriteriTransazione,
+                     cursore: Optional[Tuple[date, int]] = None,
+                     limite: int = 20,
+                     discendente: bool = True,
+                     con_dettagli: bool = False) -> Tuple[List[Transazione], Optional[Tuple[date, int]]]:
+        """
+        Restituisce una pagina di transazioni con paginazione keyset su (data, id_transazione).
+
+        A differenza di LIMIT/OFFSET, il costo di ogni pagina non cresce con
+        il numero di pagine già lette: la ricerca riparte dall'ultima chiave
+        vista usando l'indice su data. ordina_per, limite e offset dei
+        criteri vengono ignorati.
+
+        Args:
+            criteri: Filtri di ricerca
+            cursore: Chiave (data, id_transazione) restituita dalla pagina
+                precedente, None per la prima pagina
+            limite: Numero massimo di transazioni per pagina
+            discendente: True per partire dalle più recenti
+            con_dettagli: Se True, valorizza anche le entità collegate
+
+        Returns:
+            Tupla (transazioni della pagina, cursore della pagina successiva
+            o None se non ci sono altre transazioni)
+        """
+        alias = "t" if con_dettagli else None
+        p = f"{alias}." if alias else ""
+        where, params = criteri.clausola_where(alias)
+        condizioni = [where] if where else []
+        if cursore is not None:
+            condizioni.append(f"({p}data, {p}id_transazione) {'<' if discendente else '>'} (?, ?)")
+            params += (cursore[0].strftime("%Y-%m-%d"), cursore[1])
+        verso = "DESC" if discendente else "ASC"
+
+        query = self._select_dettagli() if con_dettagli else f"SELECT * FROM {self.table_name}"
+        if condizioni:
+            query += f" WHERE {' AND '.join(condizioni)}"
+        # Una riga in più per sapere se esiste una pagina successiva
+        query += f" ORDER BY {p}data {verso}, {p}id_transazione {verso} LIMIT ?"
+        results = execute_query(query, params + (limite + 1,))
+
+        converti = self._to_entity_dettagliata if con_dettagli else self.to_entity
+        transazioni = [converti(row) for row in results[:limite]]
+        prossimo = None
+        if len(results) > limite:
+            ultima = transazioni[-1]
+            prossimo = (ultima.data, ultima.id_transazione)
+        return transazioni, prossimo
+
+    def conta(self, criteri: CriteriTransazione) -> int:
+        """
+        Conta le transazioni che soddisfano i criteri, ignorando la paginazione.
+
+        Args:
+            criteri: Filtri di ricerca
+
+        Returns:
+            Numero di transazioni
+        """
+        where, params = criteri.clausola_where()
+        return self.count(where or None, params or None)
+
+    def versione(self) -> int:
+        """
+        Restituisce il contatore delle scritture sulle transazioni.
+
+        Il contatore è incrementato dai trigger della migrazione 7 a ogni
+        insert, update o delete: due letture con lo stesso valore vedono le
+        stesse transazioni.
+
+        Returns:
+            Valore corrente del contatore
+        """
+        return execute_query("SELECT versione FROM versione_tabella WHERE tabella = 'transazione'")[0]["versione"]
+
+    def somma_importi(self, criteri: CriteriTransazione) -> float:
+        """
+        Somma gli importi delle transazioni che soddisfano i criteri.
+
+        Il calcolo avviene in SQL; filtrando per solo conto la query usa
+        l'indice coprente (id_conto_finanziario, importo).
+
+        Args:
+            criteri: Filtri di ricerca (ordinamento e paginazione ignorati)
+
+        Returns:
+            Somma degli importi, 0.0 se non ci sono transazioni
+        """
+        where, params = criteri.clausola_where()
+        query = f"SELECT COALESCE(SUM(importo), 0) AS totale FROM {self.table_name}"
+        if where:
+            query += f" WHERE {where}"
+        return execute_query(query, params)[0]["totale"]
+
+    def somme_per_periodo(self, criteri: CriteriTransazione, periodo: str = "giorno") -> List[Tuple[str, float]]:
+        """
+        Somma gli importi raggruppandoli per giorno o per mese.
+
+        Args:
+            criteri: Filtri di ricerca (ordinamento e paginazione ignorati)
+            periodo: 'giorno' (chiave YYYY-MM-DD) o 'mese' (chiave YYYY-MM)
+
+        Returns:
+            Lista di tuple (periodo, somma) in ordine cronologico, solo per
+            i periodi con almeno una transazione
+
+        Raises:
+            ValueError: Se periodo non è 'giorno' o 'mese'
+        """
+        lunghezze = {"giorno": 10, "mese": 7}
+        if periodo not in lunghezze:
+            raise ValueError("Periodo non supportato. Usa 'giorno' o 'mese'.")
+        where, params = criteri.clausola_where()
+        query = f"""
+            SELECT substr(data, 1, {lunghezze[periodo]}) AS periodo, SUM(importo) AS somma
+            FROM {self.table_name}
+            {f"WHERE {where}" if where else ""}
+            GROUP BY periodo
+            ORDER BY periodo
+        """
+        return [(r["periodo"], r["somma"]) for r in execute_query(query, params)]
+
+    def riepilogo_mensile(self, criteri: CriteriTransazione, raggruppa_per: Sequence[str] = ()) -> List[Dict]:
+        """
+        Totali mensili di entrate e uscite in un'unica query raggruppata.
+
+        Se i criteri lo consentono (mesi interi, nessun filtro su importo o
+        testo) legge l'aggregato mensile invece delle transazioni.
+
+        Args:
+            criteri: Filtri di ricerca (ordinamento e paginazione ignorati)
+            raggruppa_per: Colonne aggiuntive di raggruppamento, scelte tra
+                COLONNE_RAGGRUPPABILI
+
+        Returns:
+            Lista di dizionari con anno_mese (YYYY-MM), le colonne di
+            raggruppamento, numero, entrate (somma degli importi positivi)
+            e uscite (somma dei valori assoluti degli importi negativi)
+
+        Raises:
+            ValueError: Se una colonna di raggruppamento non è ammessa
+        """
+        if self._aggregato.supporta(criteri):
+            return self._aggregato.riepilogo(criteri, raggruppa_per)
+        for colonna in raggruppa_per:
+            if colonna not in self.COLONNE_RAGGRUPPABILI:
+                raise ValueError(f"Raggruppamento non valido: '{colonna}'")
+        colonne = "".join(f", {c}" for c in raggruppa_per)
+        where, params = criteri.clausola_where()
+        query = f"""
+            SELECT substr(data, 1, 7) AS anno_mese{colonne},
+                   COUNT(*) AS numero,
+                   COALESCE(SUM(CASE WHEN importo > 0 THEN importo END), 0) AS entrate,
+                   COALESCE(-SUM(CASE WHEN importo < 0 THEN importo END), 0) AS uscite
+            FROM {self.table_name}
+            {f"WHERE {where}" if where else ""}
+            GROUP BY anno_mese{colonne}
+            ORDER BY anno_mese{colonne}
+        """
+        return execute_query(query, params)
+
+    def somme_giornaliere_per_conto(self, id_conti: List[int], data_inizio: date, data_fine: date) -> List[Tuple[int, str, float]]:
+        """
+        Somma gli importi per conto e per giorno in un intervallo di date.
+
+        Args:
+            id_conti: ID dei conti da considerare
+            data_inizio: Data iniziale (inclusa)
+            data_fine: Data finale (inclusa)
+
+        Returns:
+            Lista di tuple (id_conto, data YYYY-MM-DD, somma) ordinate per conto e data
+        """
+        risultati = []
+        for blocco in a_blocchi(list(dict.fromkeys(id_conti))):
+            segnaposti = ", ".join("?" for _ in blocco)
+            query = f"""
+                SELECT id_conto_finanziario, data, SUM(importo) AS somma
+                FROM {self.table_name}
+                WHERE id_conto_finanziario IN ({segnaposti}) AND data >= ? AND data <= ?
+                GROUP BY id_conto_finanziario, data
+                ORDER BY id_conto_finanziario, data
+            """
+            params = tuple(blocco) + (data_inizio.strftime("%Y-%m-%d"), data_fine.strftime("%Y-%m-%d"))
+            risultati.extend(
+                (r["id_conto_finanziario"], r["data"], r["somma"]) for r in execute_query(query, params)
+            )
+        return risultati
 
     def get_by_periodo(self, data_inizio: date, data_fine: date, order_by: Optional[str] = "data DESC") -> List[Transazione]:
-        query = f"SELECT * FROM {self.table_name} WHERE data >= ? AND data <= ?"
-        if order_by:
-            query += f" ORDER BY {order_by}"
-        results = execute_query(query, (data_inizio.strftime("%Y-%m-%d"), data_fine.strftime("%Y-%m-%d")))
-        return [self.to_entity(row) for row in results]
+        return self.cerca(CriteriTransazione(data_inizio=data_inizio, data_fine=data_fine, ordina_per=order_by))
 
     def get_by_conto_id(self, id_conto: int, data_inizio: Optional[date] = None, data_fine: Optional[date] = None) -> List[Transazione]:
-        query = f"SELECT * FROM {self.table_name} WHERE id_conto_finanziario = ?"
-        params = [id_conto]
-        if data_inizio:
-            query += " AND data >= ?"
-            params.append(data_inizio.strftime("%Y-%m-%d"))
-        if data_fine:
-            query += " AND data <= ?"
-            params.append(data_fine.strftime("%Y-%m-%d"))
-        query += " ORDER BY data DESC"
-        results = execute_query(query, tuple(params))
-        return [self.to_entity(row) for row in results]
+        return self.cerca(CriteriTransazione(id_conto=id_conto, data_inizio=data_inizio, data_fine=data_fine))
 
     def get_by_categoria_id(self, id_categoria: int, data_inizio: Optional[date] = None, data_fine: Optional[date] = None) -> List[Transazione]:
-        query = f"SELECT * FROM {self.table_name} WHERE id_categoria = ?"
-        params = [id_categoria]
-        if data_inizio:
-            query += " AND data >= ?"
-            params.append(data_inizio.strftime("%Y-%m-%d"))
-        if data_fine:
-            query += " AND data <= ?"
-            params.append(data_fine.strftime("%Y-%m-%d"))
-        query += " ORDER BY data DESC"
-        results = execute_query(query, tuple(params))
-        return [self.to_entity(row) for row in results]
+        return self.cerca(CriteriTransazione(id_categoria=id_categoria, data_inizio=data_inizio, data_fine=data_fine))
 
     def get_by_proprieta_id(self, id_proprieta: int, data_inizio: Optional[date] = None, data_fine: Optional[date] = None) -> List[Transazione]:
-        query = f"SELECT * FROM {self.table_name} WHERE id_proprieta_associata = ?"
-        params = [id_proprieta]
-        if data_inizio:
-            query += " AND data >= ?"
-            params.append(data_inizio.strftime("%Y-%m-%d"))
-        if data_fine:
-            query += " AND data <= ?"
-            params.append(data_fine.strftime("%Y-%m-%d"))
-        query += " ORDER BY data DESC"
-        results = execute_query(query, tuple(params))
-        return [self.to_entity(row) for row in results]
+        return self.cerca(CriteriTransazione(id_proprieta=id_proprieta, data_inizio=data_inizio, data_fine=data_fine))
 
     def get_by_tipo_flusso(self, tipo_flusso: TipoFlusso, data_inizio: Optional[date] = None, data_fine: Optional[date] = None) -> List[Transazione]:
-        query = f"SELECT * FROM {self.table_name} WHERE tipo_flusso = ?"
-        params = [tipo_flusso.value]
-        if data_inizio:
-            query += " AND data >= ?"
-            params.append(data_inizio.strftime("%Y-%m-%d"))
-        if data_fine:
-            query += " AND data <= ?"
-            params.append(data_fine.strftime("%Y-%m-%d"))
-        query += " ORDER BY data DESC"
-        results = execute_query(query, tuple(params))
-        return [self.to_entity(row) for row in results]
+        return self.cerca(CriteriTransazione(tipo_flusso=tipo_flusso, data_inizio=data_inizio, data_fine=data_fine))
 
     def get_fiscalmente_rilevanti(self, data_inizio: date, data_fine: date) -> List[Transazione]:
-        query = f"SELECT * FROM {self.table_name} WHERE flag_deducibile_o_rilevante_fiscalmente = 1 AND data >= ? AND data <= ? ORDER BY data DESC"
-        results = execute_query(query, (data_inizio.strftime("%Y-%m-%d"), data_fine.strftime("%Y-%m-%d")))
-        return [self.to_entity(row) for row in results]
+        return self.cerca(CriteriTransazione(solo_fiscali=True, data_inizio=data_inizio, data_fine=data_fine))
 
     def get_entrate_da_affitto_per_proprieta(self, id_proprieta: int, data_inizio: date, data_fine: date) -> List[Transazione]:
         # Recupera solo le entrate (importo > 0) associate a una proprietà, e a categorie "Affitto Incassato ..."
@@ -0,0 +1,275 @@
+"""
+# cache_report.py
+Cache dei risultati di ReportGenerator.
+
+La chiave è (metodo, argomenti, versione dei dati). La versione dei dati
+viene dalla tabella versione_tabella, aggiornata da trigger a ogni
+scrittura su transazioni, categorie, conti e proprietà (migrazioni 3 e 7):
+un report salvato resta valido finché i dati non cambiano, anche tra una
+sessione CLI e l'altra se la cache è persistente.
+
+Il file della cache persistente è JSON: i report contengono solo valori
+semplici, date e dizionari con chiavi tuple o intere, codificati con
+oggetti etichettati (vedi _codifica). Il file viene scritto con salva(),
+non a ogni report calcolato.
+"""
+
+import copy
+import functools
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from src.config import settings
+from src.database.database_connection import (
+    get_db_connection, execute_query, in_transaction
+)
+
+# Versione del formato del file di cache: un file di formato diverso viene ignorato
+_FORMATO_FILE = 2
+
+
+def _codifica(valore: Any) -> Any:
+    """
+    Converte un report in valori JSON.
+
+    Tuple, date e dizionari con chiavi non stringa diventano oggetti con
+    un'unica chiave etichetta (__tupla__, __data__, __coppie__).
+    """
+    if isinstance(valore, dict):
+        if all(isinstance(k, str) for k in valore):
+            return {k: _codifica(v) for k, v in valore.items()}
+        return {"__coppie__": [[_codifica(k), _codifica(v)] for k, v in valore.items()]}
+    if isinstance(valore, tuple):
+        return {"__tupla__": [_codifica(v) for v in valore]}
+    if isinstance(valore, list):
+        return [_codifica(v) for v in valore]
+    if isinstance(valore, date):
+        return {"__data__": valore.isoformat()}
+    if valore is None or isinstance(valore, (str, int, float, bool)):
+        return valore
+    raise TypeError(f"Valore non serializzabile nella cache dei report: {type(valore).__name__}")
+
+
+def _decodifica(valore: Any) -> Any:
+    """Inverso di _codifica."""
+    if isinstance(valore, list):
+        return [_decodifica(v) for v in valore]
+    if not isinstance(valore, dict):
+        return valore
+    if len(valore) == 1:
+        etichetta, contenuto = next(iter(valore.items()))
+        if etichetta == "__tupla__":
+            return tuple(_decodifica(v) for v in contenuto)
+        if etichetta == "__data__":
+            return date.fromisoformat(contenuto)
+        if etichetta == "__coppie__":
+            return {_decodifica(k): _decodifica(v) for k, v in contenuto}
+    return {k: _decodifica(v) for k, v in valore.items()}
+
+
+class CacheReport:
+    """Cache LRU dei report, invalidata dalla versione dei dati."""
+
+    def __init__(self, max_voci: Optional[int] = None, percorso_file: Optional[str] = None):
+        """
+        Inizializza la cache.
+
+        Args:
+            max_voci: Numero massimo di report memorizzati (default in settings)
+            percorso_file: File in cui salvare la cache tra le sessioni (optional);
+                None per una cache solo in memoria
+        """
+        self.logger = logging.getLogger(__name__)
+        self.max_voci = max_voci or settings.REPORT_CACHE_MAX_VOCI
+        self.percorso_file = Path(percorso_file) if percorso_file else None
+        self._lock = threading.RLock()
+        # Tutte le voci sono calcolate sulla versione dei dati self._versione
+        self._voci: "OrderedDict[str, Any]" = OrderedDict()
+        self._versione: Optional[Tuple] = None
+        self._modificata = False
+        self._statistiche = {"hit": 0, "miss": 0, "invalidazioni": 0, "evizioni": 0}
+        if self.percorso_file:
+            self._carica()
+
+    @classmethod
+    def predefinita(cls) -> "CacheReport":
+        """
+        Crea la cache per la CLI secondo settings: solo in memoria, salvo
+        GESTFIN_REPORT_CACHE_PERSISTENTE=1 (file accanto al database, non
+        per un database in memoria).
+        """
+        persistente = os.environ.get("GESTFIN_REPORT_CACHE_PERSISTENTE")
+        persistente = settings.REPORT_CACHE_PERSISTENTE if persistente is None else persistente == "1"
+        db_path = get_db_connection().config.db_path
+        percorso = None
+        if persistente and db_path != ":memory:":
+            percorso = str(Path(db_path).parent / "cache_report.json")
+        return cls(percorso_file=percorso)
+
+    def versione_dati(self) -> Optional[Tuple]:
+        """
+        Restituisce la versione corrente dei dati.
+
+        Returns:
+            Tupla (database, identificativo istanza, somma dei contatori di
+            versione), None se il database non ha i contatori (migrazione 7)
+        """
+        righe = {r["tabella"]: r["versione"] for r in execute_query(
+            "SELECT tabella, versione FROM versione_tabella"
+        )}
+        istanza = righe.pop("istanza_database", None)
+        if istanza is None or "transazione" not in righe:
+            return None
+        return (get_db_connection().config.db_path, istanza, sum(righe.values()))
+
+    def _chiave(self, metodo: str, args: Tuple, kwargs: Dict) -> str:
+        # repr è stabile per gli argomenti normalizzati (numeri, date, enum, tuple)
+        return repr((metodo, args, tuple(sorted(kwargs.items()))))
+
+    def _allinea_versione(self, versione: Tuple):
+        """Scarta i report calcolati su una versione dei dati diversa. Chiamare con il lock."""
+        if versione == self._versione:
+            return
+        if self._voci:
+            self._statistiche["invalidazioni"] += len(self._voci)
+            self._voci.clear()
+            self._modificata = True
+        self._versione = versione
+
+    def esegui(self, metodo: str, funzione: Callable, args: Tuple, kwargs: Dict) -> Any:
+        """
+        Restituisce il report dalla cache, calcolandolo se necessario.
+
+        Dentro un'unità di lavoro aperta la cache viene ignorata: i dati
+        potrebbero includere modifiche non confermate.
+
+        Args:
+            metodo: Nome del metodo di ReportGenerator
+            funzione: Funzione che calcola il report
+            args: Argomenti posizionali (hashabili)
+            kwargs: Argomenti per nome (valori hashabili)
+
+        Returns:
+            Copia del report, modificabile dal chiamante
+        """
+        if in_transaction():
+            return funzione(*args, **kwargs)
+        versione = self.versione_dati()
+        if versione is None:
+            return funzione(*args, **kwargs)
+
+        chiave = self._chiave(metodo, args, kwargs)
+        with self._lock:
+            self._allinea_versione(versione)
+            if chiave in self._voci:
+                self._voci.move_to_end(chiave)
+                self._statistiche["hit"] += 1
+                return copy.deepcopy(self._voci[chiave])
+            self._statistiche["miss"] += 1
+
+        risultato = funzione(*args, **kwargs)
+        with self._lock:
+            # Memorizza solo se nessuna scrittura è avvenuta durante il calcolo
+            if self.versione_dati() == versione:
+                self._allinea_versione(versione)
+                self._voci[chiave] = copy.deepcopy(risultato)
+                while len(self._voci) > self.max_voci:
+                    self._voci.popitem(last=False)
+                    self._statistiche["evizioni"] += 1
+                self._modificata = True
+        return risultato
+
+    def svuota(self):
+        """Scarta tutti i report memorizzati, anche dal file."""
+        with self._lock:
+            self._statistiche["invalidazioni"] += len(self._voci)
+            self._voci.clear()
+            self._modificata = True
+            self.salva()
+
+    def statistiche(self) -> Dict[str, Any]:
+        """
+        Restituisce i contatori di utilizzo della cache.
+
+        Returns:
+            Dizionario con hit, miss, invalidazioni, evizioni, hit_ratio e voci
+        """
+        with self._lock:
+            stats = dict(self._statistiche)
+            totale = stats["hit"] + stats["miss"]
+            stats["hit_ratio"] = round(stats["hit"] / totale, 3) if totale else 0.0
+            stats["voci"] = len(self._voci)
+            return stats
+
+    def _carica(self):
+        """Legge la cache dal file, ignorando file assenti, illeggibili o di formato diverso."""
+        try:
+            with open(self.percorso_file, "r", encoding="utf-8") as f:
+                dati = json.load(f)
+            if dati.get("formato") != _FORMATO_FILE:
+                return
+            versione = tuple(dati["versione"]) if dati["versione"] is not None else None
+            voci = OrderedDict((chiave, _decodifica(report)) for chiave, report in dati["voci"])
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            self.logger.warning(f"Cache dei report non leggibile, verrà ricreata: {e}")
+            return
+        self._versione = versione
+        self._voci = voci
+
+    def salva(self):
+        """
+        Scrive la cache sul file (se persistente e modificata) con
+        sostituzione atomica. Da chiamare a fine sessione.
+        """
+        with self._lock:
+            if not self.percorso_file or not self._modificata:
+                return
+            temporaneo = self.percorso_file.with_suffix(".tmp")
+            try:
+                dati = {
+                    "formato": _FORMATO_FILE,
+                    "versione": list(self._versione) if self._versione is not None else None,
+                    "voci": [[chiave, _codifica(report)] for chiave, report in self._voci.items()],
+                }
+                with open(temporaneo, "w", encoding="utf-8") as f:
+                    json.dump(dati, f)
+                os.replace(temporaneo, self.percorso_file)
+            except (OSError, TypeError) as e:
+                self.logger.warning(f"Impossibile salvare la cache dei report: {e}")
+                return
+            self._modificata = False
+
+
+def _normalizza_argomento(valore: Any) -> Hashable:
+    """Rende hashabile un argomento: liste, tuple e iterabili diventano tuple, gli insiemi tuple ordinate."""
+    if isinstance(valore, (set, frozenset)):
+        return tuple(sorted(valore))
+    if isinstance(valore, (list, tuple)) or (hasattr(valore, "__iter__") and not isinstance(valore, (str, bytes, dict))):
+        return tuple(valore)
+    return valore
+
+
+def memorizza_report(metodo: Callable) -> Callable:
+    """
+    Decoratore per i metodi di ReportGenerator: usa self.cache se impostata.
+
+    Gli argomenti vengono normalizzati (iterabili -> tuple) prima del
+    calcolo, così un generatore non viene consumato due volte.
+    """
+    @functools.wraps(metodo)
+    def wrapper(self, *args, **kwargs):
+        args = tuple(_normalizza_argomento(a) for a in args)
+        kwargs = {k: _normalizza_argomento(v) for k, v in kwargs.items()}
+        cache = getattr(self, "cache", None)
+        if cache is None:
+            return metodo(self, *args, **kwargs)
+        return cache.esegui(metodo.__name__, functools.partial(metodo, self), args, kwargs)
+    return wrapper
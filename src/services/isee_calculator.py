@@ -0,0 +1,101 @@
+from typing import Dict, Iterable, Optional
+from datetime import date
+from src.repositories.conto_repository import ContoRepository
+from src.repositories.transazione_repository import TransazioneRepository
+from src.services.storico_saldi import StoricoSaldi
+from src.database.database_connection import lettura_coerente
+
+
+class ISEECalculator:
+    """
+    Dati patrimoniali dei conti per la dichiarazione ISEE: saldo al 31/12 e
+    giacenza media annua (media dei saldi di fine giornata dell'anno).
+
+    La giacenza si calcola in un solo passaggio sulle somme giornaliere
+    ordinate: ogni movimento pesa per i giorni che mancano a fine anno,
+    senza ricostruire il saldo giorno per giorno.
+    """
+
+    def __init__(self,
+                 conto_repo: Optional[ContoRepository] = None,
+                 transazione_repo: Optional[TransazioneRepository] = None,
+                 storico_saldi: Optional[StoricoSaldi] = None):
+        self.conto_repo = conto_repo or ContoRepository()
+        self.transazione_repo = transazione_repo or TransazioneRepository()
+        self.storico_saldi = storico_saldi or StoricoSaldi(self.conto_repo, self.transazione_repo)
+
+    def calcola(self, id_conti: Iterable[int], anno: int) -> Dict[int, Dict]:
+        """
+        Calcola saldo al 31/12 e giacenza media annua per un insieme di conti.
+        Restituisce un dizionario {id_conto: {"anno", "saldo_inizio_anno", "saldo_fine_anno", "giacenza_media", "giorni"}}.
+        """
+        id_conti = list(dict.fromkeys(id_conti))
+        inizio, fine = date(anno, 1, 1), date(anno, 12, 31)
+        giorni = (fine - inizio).days + 1
+
+        # Saldo di apertura dai checkpoint mensili, poi una sola query per tutti i movimenti
+        # dell'anno; tutte le letture sullo stesso lettore, senza attendere un import in corso
+        with lettura_coerente():
+            apertura = {
+                id_conto: self.storico_saldi.saldo_al(id_conto, date(anno - 1, 12, 31))
+                for id_conto in id_conti
+            }
+            movimenti = self.transazione_repo.somme_giornaliere_per_conto(id_conti, inizio, fine)
+
+        # Somma dei saldi di fine giornata: apertura per tutti i giorni, più
+        # ogni movimento per i giorni dal suo (incluso) al 31/12
+        somma_saldi = {id_conto: saldo * giorni for id_conto, saldo in apertura.items()}
+        variazioni = {id_conto: 0.0 for id_conto in id_conti}
+        for id_conto, giorno, importo in movimenti:
+            giorni_residui = (fine - date.fromisoformat(giorno)).days + 1
+            somma_saldi[id_conto] += importo * giorni_residui
+            variazioni[id_conto] += importo
+
+        return {
+            id_conto: {
+                "anno": anno,
+                "saldo_inizio_anno": round(apertura[id_conto], 2),
+                "saldo_fine_anno": round(apertura[id_conto] + variazioni[id_conto], 2),
+                "giacenza_media": round(somma_saldi[id_conto] / giorni, 2),
+                "giorni": giorni,
+            }
+            for id_conto in id_conti
+        }
+
+    def calcola_totale(self, id_conti: Iterable[int], anno: int) -> Dict:
+        """
+        Somma saldo al 31/12 e giacenza media di un insieme di conti.
+        Restituisce un dizionario con anno, saldo_fine_anno, giacenza_media e il dettaglio per conto.
+        """
+        dettaglio = self.calcola(id_conti, anno)
+        return {
+            "anno": anno,
+            "saldo_fine_anno": round(sum(d["saldo_fine_anno"] for d in dettaglio.values()), 2),
+            "giacenza_media": round(sum(d["giacenza_media"] for d in dettaglio.values()), 2),
+            "dettaglio_conti": dettaglio,
+        }
+
+    def confronta_con_estratto(self, id_conto: int, info_isee: Dict, tolleranza: float = 0.01) -> Dict:
+        """
+        Confronta i valori calcolati con quelli stampati sull'estratto conto (BPERParser, chiave "info_isee").
+        info_isee deve contenere "anno" e almeno uno tra "giacenza_media" e "saldo_fine_anno".
+        La banca calcola la giacenza sulle date valuta: piccoli scostamenti sulla giacenza sono attesi
+        se le date valuta differiscono da quelle registrate.
+        Restituisce calcolati, estratti, scostamenti (calcolato - estratto) e il flag coerente.
+        """
+        if not info_isee or "anno" not in info_isee:
+            raise ValueError("Dati ISEE dell'estratto conto mancanti o senza anno di riferimento")
+        calcolati = self.calcola([id_conto], info_isee["anno"])[id_conto]
+        risultato = {"anno": info_isee["anno"], "coerente": True}
+        for chiave in ("saldo_fine_anno", "giacenza_media"):
+            estratto = info_isee.get(chiave)
+            risultato[f"{chiave}_calcolato"] = calcolati[chiave]
+            risultato[f"{chiave}_estratto"] = estratto
+            if estratto is None:
+                risultato[f"scostamento_{chiave}"] = None
+                continue
+            scostamento = round(calcolati[chiave] - estratto, 2)
+            risultato[f"scostamento_{chiave}"] = scostamento
+            if abs(scostamento) > tolleranza:
+                risultato["coerente"] = False
+        return risultato
@@ -1,23 +1,32 @@
-from typing import Optional, Dict, List
+from typing import Optional, Dict, Iterable, List, Tuple
 from datetime import date, datetime, timedelta
-from src.repositories.transazione_repository import TransazioneRepository
+from src.repositories.transazione_repository import TransazioneRepository, CriteriTransazione
 from src.repositories.proprieta_repository import ProprietaRepository
 from src.repositories.categoria_repository import CategoriaRepository
 from src.repositories.conto_repository import ContoRepository
+from src.repositories.aggregato_mensile_repository import AggregatoMensileRepository
 from src.models.models import TipoFlusso, TipoProprieta
+from src.services.cache_report import CacheReport, memorizza_report
 
 class ReportGenerator:
     def __init__(self,
                  transazione_repo: Optional[TransazioneRepository] = None,
                  proprieta_repo: Optional[ProprietaRepository] = None,
                  categoria_repo: Optional[CategoriaRepository] = None,
-                 conto_repo: Optional[ContoRepository] = None):
+                 conto_repo: Optional[ContoRepository] = None,
+                 aggregato_repo: Optional[AggregatoMensileRepository] = None,
+                 cache: Optional[CacheReport] = None):
+        # cache: se impostata, i report vengono riusati finché i dati non cambiano
+        self.cache = cache
         self.transazione_repo = transazione_repo or TransazioneRepository()
         self.proprieta_repo = proprieta_repo or ProprietaRepository()
         self.categoria_repo = categoria_repo or CategoriaRepository()
         self.conto_repo = conto_repo or ContoRepository()
+        self.aggregato_repo = aggregato_repo or AggregatoMensileRepository()
 
-    def generate_cash_flow_personale(self, anno: int, mese: Optional[int] = None) -> Dict:
+    @staticmethod
+    def _periodo(anno: int, mese: Optional[int] = None) -> Tuple[date, date, str]:
+        """Restituisce data iniziale, data finale ed etichetta di un mese o di un anno."""
         if mese:
             data_inizio = date(anno, mese, 1)
             if mese == 12:
@@ -29,9 +38,10 @@ class ReportGenerator:
             data_inizio = date(anno, 1, 1)
             data_fine = date(anno, 12, 31)
             periodo_str = f"Anno {anno}"
-        transazioni = self.transazione_repo.get_by_tipo_flusso(TipoFlusso.PERSONALE, data_inizio, data_fine)
-        totale_entrate = sum(t.importo for t in transazioni if t.importo > 0)
-        totale_uscite = -sum(t.importo for t in transazioni if t.importo < 0)
+        return data_inizio, data_fine, periodo_str
+
+    @staticmethod
+    def _componi_cash_flow(periodo_str: str, totale_entrate: float, totale_uscite: float) -> Dict:
         risparmio = totale_entrate - totale_uscite
         return {
             "periodo": periodo_str,
@@ -40,46 +50,287 @@ class ReportGenerator:
             "risparmio_deficit_personale": round(risparmio, 2)
         }
 
-    def generate_pl_proprieta(self, id_proprieta: int, anno: int, mese: Optional[int] = None) -> Dict:
-        prop = self.proprieta_repo.get_by_id(id_proprieta)
-        if not prop:
-            raise ValueError(f"Proprietà con ID {id_proprieta} non trovata")
-        if mese:
-            data_inizio = date(anno, mese, 1)
-            if mese == 12:
-                data_fine = date(anno, 12, 31)
-            else:
-                data_fine = date(anno, mese + 1, 1) - timedelta(days=1)
-            periodo_str = data_inizio.strftime("%B %Y")
-        else:
-            data_inizio = date(anno, 1, 1)
-            data_fine = date(anno, 12, 31)
-            periodo_str = f"Anno {anno}"
-        if prop.tipo == TipoProprieta.POSSESSO_AFFITTATA:
-            entrate = self.transazione_repo.get_entrate_da_affitto_per_proprieta(id_proprieta, data_inizio, data_fine)
-            totale_affitti = sum(t.importo for t in entrate)
-        else:
+    @staticmethod
+    def _componi_pl(prop, periodo_str: str, totale_affitti: float, totale_spese: float) -> Dict:
+        affittata = prop.tipo == TipoProprieta.POSSESSO_AFFITTATA
+        if not affittata:
             totale_affitti = 0.0
-        transazioni = self.transazione_repo.get_by_proprieta_id(id_proprieta, data_inizio, data_fine)
-        totale_spese = -sum(t.importo for t in transazioni if t.importo < 0)
         profit_loss = totale_affitti - totale_spese
         return {
             "nome_proprieta": prop.nome_o_indirizzo_breve,
             "periodo": periodo_str,
             "tipo_proprieta": prop.tipo.value,
-            "totale_affitti_incassati": round(totale_affitti, 2) if prop.tipo == TipoProprieta.POSSESSO_AFFITTATA else None,
+            "totale_affitti_incassati": round(totale_affitti, 2) if affittata else None,
             "totale_spese_proprieta": round(totale_spese, 2),
             "profit_loss_netto": round(profit_loss, 2)
         }
 
+    def _categorie_affitto(self) -> set:
+        """ID delle categorie di affitto incassato: stesso criterio di get_entrate_da_affitto_per_proprieta (LIKE 'Affitto Incassato%')."""
+        return {
+            c.id_categoria for c in self.categoria_repo.get_all()
+            if c.nome_categoria.lower().startswith("affitto incassato")
+        }
+
+    @memorizza_report
+    def generate_cash_flow_personale(self, anno: int, mese: Optional[int] = None) -> Dict:
+        data_inizio, data_fine, periodo_str = self._periodo(anno, mese)
+        righe = self.transazione_repo.riepilogo_mensile(CriteriTransazione(
+            tipo_flusso=TipoFlusso.PERSONALE, data_inizio=data_inizio, data_fine=data_fine, ordina_per=None
+        ))
+        totale_entrate = sum(r["entrate"] for r in righe)
+        totale_uscite = sum(r["uscite"] for r in righe)
+        return self._componi_cash_flow(periodo_str, totale_entrate, totale_uscite)
+
+    @memorizza_report
+    def generate_pl_proprieta(self, id_proprieta: int, anno: int, mese: Optional[int] = None) -> Dict:
+        prop = self.proprieta_repo.get_by_id(id_proprieta)
+        if not prop:
+            raise ValueError(f"Proprietà con ID {id_proprieta} non trovata")
+        data_inizio, data_fine, periodo_str = self._periodo(anno, mese)
+        righe = self.transazione_repo.riepilogo_mensile(
+            CriteriTransazione(id_proprieta=id_proprieta, data_inizio=data_inizio, data_fine=data_fine, ordina_per=None),
+            raggruppa_per=("id_categoria",)
+        )
+        categorie_affitto = self._categorie_affitto()
+        totale_affitti = sum(r["entrate"] for r in righe if r["id_categoria"] in categorie_affitto)
+        totale_spese = sum(r["uscite"] for r in righe)
+        return self._componi_pl(prop, periodo_str, totale_affitti, totale_spese)
+
+    @memorizza_report
+    def generate_cash_flow_personale_periodi(self, anni: Iterable[int], includi_annuale: bool = True) -> Dict[Tuple[int, Optional[int]], Dict]:
+        """
+        Cash flow personale di ogni mese (e anno) degli anni indicati con un'unica query raggruppata.
+        Restituisce {(anno, mese): report}, con mese None per il totale annuo; ogni report ha la stessa
+        forma di generate_cash_flow_personale.
+        """
+        anni = sorted(set(anni))
+        if not anni:
+            return {}
+        righe = self.transazione_repo.riepilogo_mensile(CriteriTransazione(
+            tipo_flusso=TipoFlusso.PERSONALE,
+            data_inizio=date(anni[0], 1, 1), data_fine=date(anni[-1], 12, 31), ordina_per=None
+        ))
+        per_mese = {r["anno_mese"]: r for r in righe}
+        risultati = {}
+        for anno in anni:
+            entrate_anno = uscite_anno = 0.0
+            for mese in range(1, 13):
+                riga = per_mese.get(f"{anno:04d}-{mese:02d}")
+                entrate = riga["entrate"] if riga else 0.0
+                uscite = riga["uscite"] if riga else 0.0
+                entrate_anno += entrate
+                uscite_anno += uscite
+                risultati[(anno, mese)] = self._componi_cash_flow(self._periodo(anno, mese)[2], entrate, uscite)
+            if includi_annuale:
+                risultati[(anno, None)] = self._componi_cash_flow(self._periodo(anno)[2], entrate_anno, uscite_anno)
+        return risultati
+
+    @memorizza_report
+    def generate_pl_proprieta_periodi(self, anni: Iterable[int], id_proprieta: Optional[Iterable[int]] = None,
+                                      includi_annuale: bool = True) -> Dict[Tuple[int, int, Optional[int]], Dict]:
+        """
+        P&L di ogni proprietà (tutte, o quelle indicate) per ogni mese e anno con un'unica query raggruppata.
+        Restituisce {(id_proprieta, anno, mese): report}, con mese None per il totale annuo; ogni report ha
+        la stessa forma di generate_pl_proprieta.
+        """
+        anni = sorted(set(anni))
+        if id_proprieta is None:
+            props = self.proprieta_repo.get_all()
+        else:
+            props = []
+            for id_p in dict.fromkeys(id_proprieta):
+                prop = self.proprieta_repo.get_by_id(id_p)
+                if not prop:
+                    raise ValueError(f"Proprietà con ID {id_p} non trovata")
+                props.append(prop)
+        if not anni or not props:
+            return {}
+        categorie_affitto = self._categorie_affitto()
+        righe = self.transazione_repo.riepilogo_mensile(
+            CriteriTransazione(data_inizio=date(anni[0], 1, 1), data_fine=date(anni[-1], 12, 31), ordina_per=None),
+            raggruppa_per=("id_proprieta_associata", "id_categoria")
+        )
+        affitti: Dict[Tuple[int, str], float] = {}
+        spese: Dict[Tuple[int, str], float] = {}
+        for r in righe:
+            if r["id_proprieta_associata"] is None:
+                continue
+            chiave = (r["id_proprieta_associata"], r["anno_mese"])
+            if r["id_categoria"] in categorie_affitto:
+                affitti[chiave] = affitti.get(chiave, 0.0) + r["entrate"]
+            spese[chiave] = spese.get(chiave, 0.0) + r["uscite"]
+        risultati = {}
+        for prop in props:
+            for anno in anni:
+                affitti_anno = spese_anno = 0.0
+                for mese in range(1, 13):
+                    chiave = (prop.id_proprieta, f"{anno:04d}-{mese:02d}")
+                    affitti_mese, spese_mese = affitti.get(chiave, 0.0), spese.get(chiave, 0.0)
+                    affitti_anno += affitti_mese
+                    spese_anno += spese_mese
+                    risultati[(prop.id_proprieta, anno, mese)] = self._componi_pl(
+                        prop, self._periodo(anno, mese)[2], affitti_mese, spese_mese
+                    )
+                if includi_annuale:
+                    risultati[(prop.id_proprieta, anno, None)] = self._componi_pl(
+                        prop, self._periodo(anno)[2], affitti_anno, spese_anno
+                    )
+        return risultati
+
+    @memorizza_report
+    def generate_portafoglio_proprieta(self, anno_inizio: Optional[int] = None, anno_fine: Optional[int] = None) -> Dict:
+        """
+        P&L e rendimenti di tutte le proprietà per ogni anno, con un'unica query raggruppata sull'aggregato mensile.
+        Per ogni (proprietà, anno) restituisce i campi di generate_pl_proprieta più altre_entrate,
+        valore_acquisto_o_stima_attuale, rendimento_annuo_lordo (affitti incassati / valore) e
+        rendimento_annuo_netto (P&L netto / valore), in percentuale, e il rendimento teorico da canone
+        (Proprieta.calcola_rendimento_annuo_lordo). Include i totali di portafoglio per anno.
+        Senza anni indicati considera tutti gli anni con movimenti sulle proprietà.
+        """
+        props = {p.id_proprieta: p for p in self.proprieta_repo.get_all()}
+        righe = self.aggregato_repo.totali_annui_per_proprieta(anno_inizio, anno_fine)
+        per_chiave = {(r["anno"], r["id_proprieta"]): r for r in righe}
+        if anno_inizio is not None and anno_fine is not None:
+            anni = list(range(anno_inizio, anno_fine + 1))
+        else:
+            anni = sorted({r["anno"] for r in righe})
+
+        def percentuale(valore: float, base: Optional[float]) -> Optional[float]:
+            return round(valore / base * 100, 2) if base else None
+
+        per_proprieta = []
+        totali_per_anno = {}
+        for anno in anni:
+            totali = {"totale_affitti_incassati": 0.0, "totale_spese_proprieta": 0.0,
+                      "profit_loss_netto": 0.0, "valore_proprieta_affittate": 0.0}
+            for id_p, prop in sorted(props.items(), key=lambda kv: kv[1].nome_o_indirizzo_breve):
+                r = per_chiave.get((anno, id_p))
+                affitti = r["affitti"] if r else 0.0
+                spese = r["uscite"] if r else 0.0
+                report = self._componi_pl(prop, f"Anno {anno}", affitti, spese)
+                affittata = report["totale_affitti_incassati"] is not None
+                teorico = prop.calcola_rendimento_annuo_lordo()
+                report.update({
+                    "id_proprieta": id_p,
+                    "anno": anno,
+                    "altre_entrate": round((r["entrate"] - r["affitti"]) if r else 0.0, 2),
+                    "valore_acquisto_o_stima_attuale": prop.valore_acquisto_o_stima_attuale,
+                    "rendimento_annuo_lordo": percentuale(report["totale_affitti_incassati"], prop.valore_acquisto_o_stima_attuale) if affittata else None,
+                    "rendimento_annuo_netto": percentuale(report["profit_loss_netto"], prop.valore_acquisto_o_stima_attuale),
+                    "rendimento_lordo_teorico": round(teorico, 2) if teorico is not None else None,
+                })
+                per_proprieta.append(report)
+                totali["totale_affitti_incassati"] += report["totale_affitti_incassati"] or 0.0
+                totali["totale_spese_proprieta"] += report["totale_spese_proprieta"]
+                totali["profit_loss_netto"] += report["profit_loss_netto"]
+                if affittata:
+                    totali["valore_proprieta_affittate"] += prop.valore_acquisto_o_stima_attuale or 0.0
+            totali = {k: round(v, 2) for k, v in totali.items()}
+            totali["rendimento_annuo_lordo"] = percentuale(totali["totale_affitti_incassati"], totali["valore_proprieta_affittate"])
+            totali_per_anno[anno] = totali
+        return {"per_proprieta": per_proprieta, "totali_per_anno": totali_per_anno}
+
+    @staticmethod
+    def _componi_variazione(voce: Dict, a: Dict, b: Dict) -> Dict:
+        """Aggiunge a voce i totali dei due periodi, netto e variazione (A - B, in percentuale su |B|)."""
+        for suffisso, tot in (("a", a), ("b", b)):
+            voce[f"numero_{suffisso}"] = tot["numero"]
+            voce[f"entrate_{suffisso}"] = round(tot["entrate"], 2)
+            voce[f"uscite_{suffisso}"] = round(tot["uscite"], 2)
+            voce[f"netto_{suffisso}"] = round(tot["entrate"] - tot["uscite"], 2)
+        for campo in ("entrate", "uscite", "netto"):
+            valore_a, valore_b = voce[f"{campo}_a"], voce[f"{campo}_b"]
+            voce[f"variazione_{campo}"] = round(valore_a - valore_b, 2)
+            voce[f"variazione_{campo}_percentuale"] = round((valore_a - valore_b) / abs(valore_b) * 100, 2) if valore_b else None
+        return voce
+
+    @memorizza_report
+    def generate_confronto_periodi(self, inizio_a: date, fine_a: date, inizio_b: date, fine_b: date,
+                                   tipo_flusso: Optional[TipoFlusso] = None) -> Dict:
+        """
+        Confronta due periodi (A rispetto a B) per categoria e per tipo_macro con un'unica query raggruppata
+        sull'aggregato mensile. I periodi devono coprire mesi interi e possono sovrapporsi.
+        Ogni voce ha numero, entrate, uscite e netto con suffisso _a e _b, la variazione assoluta
+        (A - B) e quella percentuale rispetto a |B| (None se B è zero).
+        Restituisce periodo_a, periodo_b, per_categoria, per_tipo_macro e totale.
+        """
+        for inizio, fine in ((inizio_a, fine_a), (inizio_b, fine_b)):
+            if inizio > fine or not AggregatoMensileRepository.supporta(
+                    CriteriTransazione(data_inizio=inizio, data_fine=fine)):
+                raise ValueError(f"Il periodo {inizio} - {fine} deve coprire mesi interi")
+        righe = self.aggregato_repo.confronto_per_categoria(
+            (inizio_a.strftime("%Y-%m"), fine_a.strftime("%Y-%m")),
+            (inizio_b.strftime("%Y-%m"), fine_b.strftime("%Y-%m")),
+            tipo_flusso
+        )
+
+        def vuoto():
+            return {"numero": 0, "entrate": 0.0, "uscite": 0.0}
+
+        per_categoria = []
+        macro: Dict[str, Tuple[Dict, Dict]] = {}
+        totale = (vuoto(), vuoto())
+        for r in righe:
+            a = {"numero": r["numero_a"], "entrate": r["entrate_a"], "uscite": r["uscite_a"]}
+            b = {"numero": r["numero_b"], "entrate": r["entrate_b"], "uscite": r["uscite_b"]}
+            per_categoria.append(self._componi_variazione({
+                "id_categoria": r["id_categoria"],
+                "nome_categoria": r["nome_categoria"],
+                "tipo_macro": r["tipo_macro"],
+            }, a, b))
+            for accumulo in (macro.setdefault(r["tipo_macro"], (vuoto(), vuoto())), totale):
+                for destinazione, origine in zip(accumulo, (a, b)):
+                    for campo in destinazione:
+                        destinazione[campo] += origine[campo]
+
+        def etichetta(inizio: date, fine: date) -> str:
+            if (inizio.year, inizio.month) == (fine.year, fine.month):
+                return self._periodo(inizio.year, inizio.month)[2]
+            if (inizio.month, fine.month, inizio.year) == (1, 12, fine.year):
+                return self._periodo(inizio.year)[2]
+            return f"{inizio:%m/%Y} - {fine:%m/%Y}"
+
+        return {
+            "periodo_a": etichetta(inizio_a, fine_a),
+            "periodo_b": etichetta(inizio_b, fine_b),
+            "per_categoria": per_categoria,
+            "per_tipo_macro": [
+                self._componi_variazione({"tipo_macro": tipo_macro}, a, b)
+                for tipo_macro, (a, b) in sorted(macro.items())
+            ],
+            "totale": self._componi_variazione({}, *totale),
+        }
+
+    def generate_confronto_anno_precedente(self, anno: int, mese: Optional[int] = None,
+                                           tipo_flusso: Optional[TipoFlusso] = None) -> Dict:
+        """Confronta un anno (o un mese) con lo stesso periodo dell'anno precedente (YoY)."""
+        inizio_a, fine_a, _ = self._periodo(anno, mese)
+        inizio_b, fine_b, _ = self._periodo(anno - 1, mese)
+        return self.generate_confronto_periodi(inizio_a, fine_a, inizio_b, fine_b, tipo_flusso)
+
+    def generate_confronto_ultimi_12_mesi(self, anno: int, mese: int,
+                                          tipo_flusso: Optional[TipoFlusso] = None) -> Dict:
+        """Confronta i 12 mesi che terminano con anno/mese (inclusi) con i 12 mesi precedenti."""
+        fine_a = self._periodo(anno, mese)[1]
+        inizio_a = date(anno - 1, mese, 1) + timedelta(days=31)
+        inizio_a = inizio_a.replace(day=1)
+        inizio_b = inizio_a.replace(year=inizio_a.year - 1)
+        fine_b = inizio_a - timedelta(days=1)
+        return self.generate_confronto_periodi(inizio_a, fine_a, inizio_b, fine_b, tipo_flusso)
+
+    @memorizza_report
     def generate_riepilogo_fiscale(self, anno: int) -> Dict:
         data_inizio = date(anno, 1, 1)
         data_fine = date(anno, 12, 31)
-        trans_deducibili = self.transazione_repo.get_fiscalmente_rilevanti(data_inizio, data_fine)
+        # Categoria letta nella stessa query (JOIN), senza una get_by_id per riga
+        trans_deducibili = self.transazione_repo.cerca(
+            CriteriTransazione(solo_fiscali=True, data_inizio=data_inizio, data_fine=data_fine),
+            con_dettagli=True
+        )
         elenco = []
         for t in trans_deducibili:
-            # Recupera nome categoria
-            cat = self.categoria_repo.get_by_id(t.id_categoria)
+            cat = t.categoria
             elenco.append({
                 "data": t.data.strftime("%Y-%m-%d"),
                 "descrizione": t.descrizione,
@@ -90,10 +341,19 @@ class ReportGenerator:
         # Riepilogo entrate da affitto per proprietà
         riepilogo_affitti = {}
         props = self.proprieta_repo.get_by_tipo(TipoProprieta.POSSESSO_AFFITTATA)
+        categorie_affitto = self._categorie_affitto()
+        affitti_per_proprieta: Dict[int, float] = {}
+        for r in self.transazione_repo.riepilogo_mensile(
+            CriteriTransazione(data_inizio=data_inizio, data_fine=data_fine, ordina_per=None),
+            raggruppa_per=("id_proprieta_associata", "id_categoria")
+        ):
+            if r["id_proprieta_associata"] is not None and r["id_categoria"] in categorie_affitto:
+                affitti_per_proprieta[r["id_proprieta_associata"]] = (
+                    affitti_per_proprieta.get(r["id_proprieta_associata"], 0.0) + r["entrate"]
+                )
         totale_affitti = 0.0
         for p in props:
-            entrate = self.transazione_repo.get_entrate_da_affitto_per_proprieta(p.id_proprieta, data_inizio, data_fine)
-            totale = sum(t.importo for t in entrate)
+            totale = affitti_per_proprieta.get(p.id_proprieta, 0.0)
             riepilogo_affitti[p.nome_o_indirizzo_breve] = round(totale, 2)
             totale_affitti += totale
         return {
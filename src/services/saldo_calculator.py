@@ -1,8 +1,8 @@
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from src.repositories.conto_repository import ContoRepository
-from src.repositories.transazione_repository import TransazioneRepository
+from src.repositories.transazione_repository import TransazioneRepository, CriteriTransazione
 from src.models.models import ContoFinanziario, Transazione
-from src.database.database_connection import get_db_cursor
+from src.database.database_connection import transaction
 
 class SaldoCalculator:
     def __init__(self, conto_repo: Optional[ContoRepository] = None, transazione_repo: Optional[TransazioneRepository] = None):
@@ -12,52 +12,98 @@ class SaldoCalculator:
     def ricalcola_e_aggiorna_saldo_conto(self, id_conto: int) -> ContoFinanziario:
         """
         Ricalcola il saldo attuale del conto partendo dal saldo iniziale e sommando tutte le transazioni associate.
+        La somma è calcolata in SQL sull'indice coprente (id_conto_finanziario, importo).
         Aggiorna il saldo_attuale nel database in modo atomico.
+        Se chiamato dentro un'unità di lavoro già aperta, ne fa parte.
         """
-        with get_db_cursor():
+        with transaction():
             conto = self.conto_repo.get_by_id(id_conto)
             if not conto:
                 raise ValueError(f"Conto con ID {id_conto} non trovato")
-            transazioni = self.transazione_repo.get_by_conto_id(id_conto)
-            saldo = conto.saldo_iniziale
-            for t in transazioni:
-                saldo += t.importo
-            conto.saldo_attuale = round(saldo, 2)
+            conto.saldo_attuale = self.calcola_saldo_conto(conto)
             self.conto_repo.update(conto)
             return conto
 
-    def aggiorna_saldo_dopo_modifica_transazione(self, transazione: Transazione, operazione: str, transazione_precedente: Optional[Transazione] = None):
+    def calcola_saldo_conto(self, conto: ContoFinanziario) -> float:
+        """
+        Calcola il saldo del conto (saldo iniziale più somma delle transazioni) senza salvarlo.
+        """
+        somma = self.transazione_repo.somma_importi(CriteriTransazione(id_conto=conto.id_conto))
+        return round(conto.saldo_iniziale + somma, 2)
+
+    def aggiorna_saldo_dopo_modifica_transazione(self, transazione: Transazione, operazione: str, transazione_precedente: Optional[Transazione] = None, ricalcolo_completo: bool = False):
         """
         Aggiorna i saldi dei conti dopo una modifica a una transazione.
         operazione: 'create', 'update', 'delete'
-        transazione_precedente: necessario per update se cambia conto
+        transazione_precedente: valori prima della modifica, necessario per l'aggiornamento incrementale di un update
+        ricalcolo_completo: se True ricalcola i saldi da zero invece di applicare la variazione
+        Per default applica solo la variazione dell'importo (costo costante, indipendente dallo storico);
+        un update senza transazione_precedente ricade sul ricalcolo completo.
+        Tutti i conti coinvolti vengono aggiornati in un'unica transazione.
+        """
+        if operazione not in ('create', 'update', 'delete'):
+            raise ValueError("Operazione non supportata. Usa 'create', 'update' o 'delete'.")
+        with transaction():
+            if ricalcolo_completo or (operazione == 'update' and transazione_precedente is None):
+                conti = {transazione.id_conto_finanziario}
+                if transazione_precedente:
+                    conti.add(transazione_precedente.id_conto_finanziario)
+                for id_conto in sorted(conti):
+                    self.ricalcola_e_aggiorna_saldo_conto(id_conto)
+                return
+            self.conto_repo.applica_variazioni_saldo(
+                self.variazioni_saldo(transazione, operazione, transazione_precedente)
+            )
+
+    @staticmethod
+    def variazioni_saldo(transazione: Transazione, operazione: str, transazione_precedente: Optional[Transazione] = None) -> Dict[int, float]:
+        """
+        Calcola la variazione di saldo per conto prodotta da una modifica a una transazione.
+        Restituisce un dizionario {id_conto: variazione}.
         """
+        variazioni: Dict[int, float] = {}
         if operazione == 'create':
-            self.ricalcola_e_aggiorna_saldo_conto(transazione.id_conto_finanziario)
+            variazioni[transazione.id_conto_finanziario] = transazione.importo
         elif operazione == 'delete':
-            self.ricalcola_e_aggiorna_saldo_conto(transazione.id_conto_finanziario)
+            variazioni[transazione.id_conto_finanziario] = -transazione.importo
         elif operazione == 'update':
-            # Se cambia conto, aggiorna entrambi
-            if transazione_precedente and transazione_precedente.id_conto_finanziario != transazione.id_conto_finanziario:
-                self.ricalcola_e_aggiorna_saldo_conto(transazione_precedente.id_conto_finanziario)
-                self.ricalcola_e_aggiorna_saldo_conto(transazione.id_conto_finanziario)
-            else:
-                self.ricalcola_e_aggiorna_saldo_conto(transazione.id_conto_finanziario)
+            # Storna il vecchio importo dal vecchio conto e somma il nuovo al nuovo conto
+            variazioni[transazione_precedente.id_conto_finanziario] = -transazione_precedente.importo
+            variazioni[transazione.id_conto_finanziario] = (
+                variazioni.get(transazione.id_conto_finanziario, 0) + transazione.importo
+            )
         else:
             raise ValueError("Operazione non supportata. Usa 'create', 'update' o 'delete'.")
+        return variazioni
 
     def verifica_coerenza_saldi_tutti_conti(self) -> Dict[int, bool]:
         """
         Verifica la coerenza tra saldo_attuale e saldo calcolato per tutti i conti.
         Restituisce un dizionario {id_conto: True/False}.
         """
-        risultati = {}
-        conti = self.conto_repo.get_all()
-        for conto in conti:
-            transazioni = self.transazione_repo.get_by_conto_id(conto.id_conto)
-            saldo_calcolato = conto.saldo_iniziale
-            for t in transazioni:
-                saldo_calcolato += t.importo
-            saldo_calcolato = round(saldo_calcolato, 2)
-            risultati[conto.id_conto] = (saldo_calcolato == round(conto.saldo_attuale or 0, 2))
-        return risultati
+        return {r["id_conto"]: not r["scostamento"] for r in self.calcola_scostamenti_saldi()}
+
+    def calcola_scostamenti_saldi(self, correggi: bool = False) -> List[Dict]:
+        """
+        Calcola lo scostamento tra saldo registrato e saldo calcolato di tutti i conti con una sola query.
+        Restituisce una lista di dizionari (uno per conto) con saldo_registrato, saldo_calcolato,
+        scostamento e il flag corretto.
+        correggi: se True allinea saldo_attuale al saldo calcolato per i conti con scostamento,
+        in un'unica transazione.
+        """
+        if not correggi:
+            righe = self.conto_repo.get_saldi_calcolati()
+            for r in righe:
+                r["corretto"] = False
+            return righe
+        # Lettura e correzione nella stessa transazione: nessuna scrittura può inserirsi in mezzo
+        with transaction():
+            righe = self.calcola_scostamenti_saldi()
+            da_correggere = {r["id_conto"]: r for r in righe if r["scostamento"]}
+            conti = [c for c in self.conto_repo.get_all() if c.id_conto in da_correggere]
+            for conto in conti:
+                conto.saldo_attuale = da_correggere[conto.id_conto]["saldo_calcolato"]
+            self.conto_repo.update_many(conti)
+            for r in da_correggere.values():
+                r["corretto"] = True
+        return righe
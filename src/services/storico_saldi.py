@@ -0,0 +1,170 @@
+from typing import List, Optional, Tuple
+from datetime import date, timedelta
+from src.repositories.conto_repository import ContoRepository
+from src.repositories.transazione_repository import TransazioneRepository, CriteriTransazione
+from src.repositories.saldo_checkpoint_repository import SaldoCheckpointRepository
+from src.models.models import ContoFinanziario
+from src.database.database_connection import transaction, lettura_coerente
+
+
+def _anno_mese(giorno: date) -> str:
+    return giorno.strftime("%Y-%m")
+
+
+def _primo_del_mese(anno_mese: str) -> date:
+    anno, mese = anno_mese.split("-")
+    return date(int(anno), int(mese), 1)
+
+
+def _fine_mese(anno_mese: str) -> date:
+    inizio = _primo_del_mese(anno_mese)
+    return (inizio.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def _mese_successivo(anno_mese: str) -> str:
+    return _anno_mese(_fine_mese(anno_mese) + timedelta(days=1))
+
+
+def _mese_precedente(anno_mese: str) -> str:
+    return _anno_mese(_primo_del_mese(anno_mese) - timedelta(days=1))
+
+
+class StoricoSaldi:
+    """
+    Saldi storici dei conti: saldo a una data e serie giornaliere.
+
+    Il saldo a una data si ottiene dal checkpoint mensile più vicino più la
+    somma delle transazioni dall'inizio del mese alla data (al massimo un
+    mese di transazioni). I checkpoint mancanti vengono calcolati e salvati
+    alla prima richiesta, solo per i mesi già chiusi; i trigger sul database
+    eliminano quelli resi obsoleti da scritture datate nel passato.
+
+    Le letture usano un lettore del pool (lettura_coerente), così non
+    attendono un import in corso; la connessione di scrittura serve solo
+    per salvare checkpoint mancanti.
+    """
+
+    def __init__(self,
+                 conto_repo: Optional[ContoRepository] = None,
+                 transazione_repo: Optional[TransazioneRepository] = None,
+                 checkpoint_repo: Optional[SaldoCheckpointRepository] = None):
+        self.conto_repo = conto_repo or ContoRepository()
+        self.transazione_repo = transazione_repo or TransazioneRepository()
+        self.checkpoint_repo = checkpoint_repo or SaldoCheckpointRepository()
+
+    def _get_conto(self, id_conto: int) -> ContoFinanziario:
+        conto = self.conto_repo.get_by_id(id_conto)
+        if not conto:
+            raise ValueError(f"Conto con ID {id_conto} non trovato")
+        return conto
+
+    def saldo_al(self, id_conto: int, giorno: date) -> float:
+        """
+        Restituisce il saldo del conto a fine giornata della data indicata.
+        """
+        conto = self._get_conto(id_conto)
+        with lettura_coerente():
+            return round(conto.saldo_iniziale + self._somma_fino_a(id_conto, giorno), 2)
+
+    def saldo_fine_mese(self, id_conto: int, anno: int, mese: int) -> float:
+        """
+        Restituisce il saldo del conto all'ultimo giorno del mese indicato.
+        """
+        return self.saldo_al(id_conto, _fine_mese(f"{anno:04d}-{mese:02d}"))
+
+    def serie_giornaliera(self, id_conto: int, data_inizio: date, data_fine: date) -> List[Tuple[date, float]]:
+        """
+        Restituisce il saldo a fine giornata per ogni giorno dell'intervallo (estremi inclusi).
+        Richiede il saldo al giorno precedente e una sola query raggruppata sull'intervallo.
+        """
+        if data_fine < data_inizio:
+            raise ValueError("La data di fine deve essere successiva alla data di inizio")
+        conto = self._get_conto(id_conto)
+        with lettura_coerente():
+            saldo = conto.saldo_iniziale + self._somma_fino_a(id_conto, data_inizio - timedelta(days=1))
+            movimenti = dict(self.transazione_repo.somme_per_periodo(
+                CriteriTransazione(id_conto=id_conto, data_inizio=data_inizio, data_fine=data_fine, ordina_per=None),
+                "giorno"
+            ))
+        serie = []
+        giorno = data_inizio
+        while giorno <= data_fine:
+            saldo += movimenti.get(giorno.isoformat(), 0.0)
+            serie.append((giorno, round(saldo, 2)))
+            giorno += timedelta(days=1)
+        return serie
+
+    def ricostruisci_checkpoint(self, id_conto: Optional[int] = None) -> int:
+        """
+        Elimina e ricalcola i checkpoint di un conto (o di tutti) fino all'ultimo mese chiuso.
+        Restituisce il numero di checkpoint salvati.
+        """
+        ultimo_mese_chiuso = _mese_precedente(_anno_mese(date.today()))
+        conti = [id_conto] if id_conto is not None else [c.id_conto for c in self.conto_repo.get_all()]
+        salvati = 0
+        with transaction():
+            self.checkpoint_repo.elimina(id_conto)
+            for id_c in conti:
+                salvati += len(self._materializza_checkpoint(id_c, ultimo_mese_chiuso))
+        return salvati
+
+    def _somma_fino_a(self, id_conto: int, giorno: date) -> float:
+        """Somma degli importi del conto fino alla data inclusa: checkpoint più transazioni del mese."""
+        anno_mese_prec = _mese_precedente(_anno_mese(giorno))
+        ultimo_mese_chiuso = _mese_precedente(_anno_mese(date.today()))
+        # I checkpoint coprono solo mesi chiusi: per date future o del mese
+        # corrente si parte dall'ultimo mese chiuso
+        base_mese = min(anno_mese_prec, ultimo_mese_chiuso)
+        somma = self._somma_fine_mese(id_conto, base_mese)
+        somma += self.transazione_repo.somma_importi(CriteriTransazione(
+            id_conto=id_conto, data_inizio=_fine_mese(base_mese) + timedelta(days=1), data_fine=giorno
+        ))
+        return somma
+
+    def _somma_fine_mese(self, id_conto: int, anno_mese: str) -> float:
+        """Somma cumulata del conto a fine mese, salvando i checkpoint mancanti fino a quel mese."""
+        ultimo = self.checkpoint_repo.get_ultimo(id_conto, anno_mese)
+        if ultimo and ultimo[0] == anno_mese:
+            return ultimo[1]
+        versione = self.transazione_repo.versione()
+        checkpoint = self._calcola_checkpoint(id_conto, anno_mese, ultimo)
+        if not checkpoint:
+            return 0.0
+        # Breve scrittura solo per i checkpoint mancanti; se nel frattempo le
+        # transazioni sono cambiate, i valori letti non vengono salvati
+        with transaction():
+            if self.transazione_repo.versione() == versione:
+                self.checkpoint_repo.salva(id_conto, checkpoint)
+        return checkpoint[-1][1]
+
+    def _materializza_checkpoint(self, id_conto: int, fino_a_anno_mese: str,
+                                 ultimo: Optional[Tuple[str, float]] = None) -> List[Tuple[str, float]]:
+        """Calcola e salva i checkpoint dal mese successivo a ultimo fino a fino_a_anno_mese."""
+        checkpoint = self._calcola_checkpoint(id_conto, fino_a_anno_mese, ultimo)
+        self.checkpoint_repo.salva(id_conto, checkpoint)
+        return checkpoint
+
+    def _calcola_checkpoint(self, id_conto: int, fino_a_anno_mese: str,
+                            ultimo: Optional[Tuple[str, float]] = None) -> List[Tuple[str, float]]:
+        """
+        Calcola i checkpoint dal mese successivo a ultimo fino a fino_a_anno_mese,
+        con una sola query raggruppata per mese. Senza ultimo parte dal mese della prima transazione.
+        """
+        data_inizio = _fine_mese(ultimo[0]) + timedelta(days=1) if ultimo else None
+        somme = dict(self.transazione_repo.somme_per_periodo(
+            CriteriTransazione(id_conto=id_conto, data_inizio=data_inizio,
+                               data_fine=_fine_mese(fino_a_anno_mese), ordina_per=None),
+            "mese"
+        ))
+        if ultimo:
+            mese, cumulata = _mese_successivo(ultimo[0]), ultimo[1]
+        elif somme:
+            mese, cumulata = min(somme), 0.0
+        else:
+            return []
+        checkpoint = []
+        while mese <= fino_a_anno_mese:
+            cumulata += somme.get(mese, 0.0)
+            checkpoint.append((mese, round(cumulata, 2)))
+            mese = _mese_successivo(mese)
+        return checkpoint
@@ -0,0 +1,12 @@
+import pytest
+
+from src.database.database_connection import DatabaseConfig, init_database, set_db_config
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Database temporaneo con schema, categorie predefinite e migrazioni applicate."""
+    connessione = set_db_config(DatabaseConfig(str(tmp_path / "test.db")))
+    init_database()
+    yield connessione
+    connessione.close()
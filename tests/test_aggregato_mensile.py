@@ -0,0 +1,94 @@
+from datetime import date
+
+import pytest
+
+from src.database.database_connection import execute_non_query
+from src.models.conto_finanziario import ContoFinanziario
+from src.models.transazione import Transazione, TipoFlusso
+from src.repositories.aggregato_mensile_repository import AggregatoMensileRepository
+from src.repositories.conto_repository import ContoRepository
+from src.repositories.transazione_repository import TransazioneRepository
+
+
+@pytest.fixture
+def conti(database):
+    repo = ContoRepository()
+    return [repo.create(ContoFinanziario(nome_conto=f"Conto {i}", saldo_iniziale=0.0)) for i in (1, 2)]
+
+
+@pytest.fixture
+def transazioni(conti):
+    repo = TransazioneRepository()
+    create = repo.create_many([
+        Transazione(data=date(2024, 1 + i % 6, 1 + i), importo=(100.0 + i if i % 4 == 0 else -(10.0 + i)),
+                    descrizione=f"Movimento {i}", id_categoria=1 + i % 3,
+                    id_conto_finanziario=conti[i % 2].id_conto)
+        for i in range(24)
+    ])
+    assert AggregatoMensileRepository().verifica() == []
+    return create
+
+
+def test_creazione(conti):
+    repo = TransazioneRepository()
+    repo.create(Transazione(data=date(2024, 3, 3), importo=-12.5, descrizione="Singola",
+                            id_categoria=1, id_conto_finanziario=conti[0].id_conto))
+    nuove = [Transazione(data=date(2024, 3, 3), importo=-7.0, descrizione="Nuova",
+                         id_categoria=1, id_conto_finanziario=conti[0].id_conto)]
+    repo.create_many_nuove(nuove, [TransazioneRepository.calcola_impronta(
+        conti[0].id_conto, date(2024, 3, 3), None, -7.0, "Nuova")])
+    assert AggregatoMensileRepository().verifica() == []
+
+
+@pytest.mark.parametrize("campo, valore", [
+    ("importo", 999.99),
+    ("importo", -0.01),
+    ("data", date(2024, 11, 30)),
+    ("id_categoria", 5),
+    ("tipo_flusso", TipoFlusso.FISCALE),
+    ("flag_deducibile_o_rilevante_fiscalmente", True),
+])
+def test_modifica(transazioni, campo, valore):
+    repo = TransazioneRepository()
+    transazione = repo.get_by_id(transazioni[0].id_transazione)
+    setattr(transazione, campo, valore)
+    repo.update(transazione)
+    assert AggregatoMensileRepository().verifica() == []
+
+
+def test_modifica_conto(transazioni, conti):
+    repo = TransazioneRepository()
+    transazione = repo.get_by_id(transazioni[0].id_transazione)
+    transazione.id_conto_finanziario = conti[1].id_conto
+    transazione.data = date(2024, 12, 1)
+    repo.update(transazione)
+    assert AggregatoMensileRepository().verifica() == []
+
+
+def test_modifica_multipla(transazioni):
+    repo = TransazioneRepository()
+    modificate = [repo.get_by_id(t.id_transazione) for t in transazioni[:6]]
+    for i, t in enumerate(modificate):
+        t.importo = -(1.0 + i)
+        t.data = date(2024, 7, 1 + i)
+    repo.update_many(modificate)
+    assert AggregatoMensileRepository().verifica() == []
+
+
+def test_eliminazione(transazioni):
+    repo = TransazioneRepository()
+    assert repo.delete(transazioni[0].id_transazione)
+    repo.delete_many([t.id_transazione for t in transazioni[1:5]])
+    assert AggregatoMensileRepository().verifica() == []
+
+    # Eliminate tutte le transazioni non restano celle vuote
+    repo.delete_many([t.id_transazione for t in transazioni[5:]])
+    assert AggregatoMensileRepository().verifica() == []
+
+
+def test_verifica_rileva_e_ricostruisci_corregge(transazioni):
+    aggregato = AggregatoMensileRepository()
+    execute_non_query(f"UPDATE {aggregato.table_name} SET entrate = entrate + 1")
+    assert aggregato.verifica()
+    aggregato.ricostruisci()
+    assert aggregato.verifica() == []
@@ -0,0 +1,96 @@
+import os
+from datetime import date
+
+import pytest
+
+from src.ingestion.bper_parser_improved import BPERParser
+from src.ingestion.cache_parsing import CacheParsing
+
+RISULTATO = {
+    "info_conto": {"iban": "IT00X0000000000000000000000", "data_inizio": date(2024, 1, 1)},
+    "transazioni": [
+        {"data_transazione": date(2024, 1, 5), "data_valuta": None, "importo": -12.5,
+         "descrizione": "PAGAMENTO POS", "numero_progressivo": 1},
+    ],
+    "statistiche": {"categorie": {"Altro": {"numero": 1, "totale": -12.5}}},
+}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheParsing(str(tmp_path / "cache"), max_byte=10 * 1024 * 1024)
+
+
+def _file(tmp_path, nome: str, contenuto: bytes) -> str:
+    percorso = tmp_path / nome
+    percorso.write_bytes(contenuto)
+    return str(percorso)
+
+
+def test_scrittura_e_lettura_conservano_le_date(cache, tmp_path):
+    chiave = cache.chiave(_file(tmp_path, "estratto.pdf", b"%PDF estratto"), 1)
+    assert cache.leggi(chiave) is None
+    cache.scrivi(chiave, RISULTATO)
+    assert cache.contiene(chiave)
+    assert cache.leggi(chiave) == RISULTATO
+    stats = cache.statistiche()
+    assert (stats["hit"], stats["miss"], stats["voci"]) == (1, 1, 1)
+
+
+def test_chiave_dipende_dal_contenuto_e_dalla_versione(cache, tmp_path):
+    originale = _file(tmp_path, "estratto.pdf", b"%PDF estratto")
+    copia = _file(tmp_path, "copia rinominata.pdf", b"%PDF estratto")
+    diverso = _file(tmp_path, "altro.pdf", b"%PDF altro estratto")
+    cache.scrivi(cache.chiave(originale, 1), RISULTATO)
+
+    assert cache.leggi(cache.chiave(copia, 1)) == RISULTATO
+    assert cache.leggi(cache.chiave(diverso, 1)) is None
+    # Una nuova versione del parser non legge i risultati della precedente
+    assert cache.leggi(cache.chiave(originale, 2)) is None
+
+    assert cache.invalida(copia) == 1
+    assert cache.leggi(cache.chiave(originale, 1)) is None
+
+
+def test_voce_illeggibile_eliminata(cache, tmp_path):
+    chiave = cache.chiave(_file(tmp_path, "estratto.pdf", b"%PDF estratto"), 1)
+    cache.scrivi(chiave, RISULTATO)
+    cache._percorso(chiave).write_bytes(b"non compresso")
+    assert cache.leggi(chiave) is None
+    assert not cache.contiene(chiave)
+
+
+def test_eliminazione_delle_voci_meno_usate(tmp_path):
+    pesante = {"transazioni": [{"descrizione": os.urandom(16).hex()} for _ in range(200)]}
+    sonda = CacheParsing(str(tmp_path / "sonda"))
+    sonda.scrivi("sonda", pesante)
+    dimensione = sonda.statistiche()["byte"]
+    # Spazio per due voci, non per tre
+    cache = CacheParsing(str(tmp_path / "cache"), max_byte=dimensione * 2 + dimensione // 2)
+
+    cache.scrivi("a", pesante)
+    cache.scrivi("b", pesante)
+    # 'a' è la meno recente finché non viene letta: poi esce 'b' quando arriva 'c'
+    passato = os.stat(cache._percorso("b")).st_mtime - 10
+    os.utime(cache._percorso("a"), (passato - 10, passato - 10))
+    os.utime(cache._percorso("b"), (passato, passato))
+    assert cache.leggi("a") is not None
+    cache.scrivi("c", pesante)
+
+    assert cache.contiene("a") and cache.contiene("c")
+    assert not cache.contiene("b")
+    stats = cache.statistiche()
+    assert stats["evizioni"] == 1
+    assert stats["byte"] <= stats["max_byte"]
+
+
+def test_parse_legge_dalla_cache_senza_estrarre_il_testo(cache, tmp_path, monkeypatch):
+    pdf = _file(tmp_path, "estratto.pdf", b"%PDF estratto")
+    estrazioni = []
+    monkeypatch.setattr(BPERParser, "_extract_page_texts",
+                        lambda self, percorso: estrazioni.append(percorso) or ["ESTRATTO CONTO"])
+    parser = BPERParser(cache=cache)
+    risultato = parser.parse(pdf)
+    assert parser.parse(pdf) == risultato
+    assert estrazioni == [pdf]
+    assert cache.statistiche()["hit"] == 1
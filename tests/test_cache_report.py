@@ -0,0 +1,46 @@
+import json
+from datetime import date
+
+from src.models.conto_finanziario import ContoFinanziario
+from src.models.transazione import Transazione
+from src.repositories.conto_repository import ContoRepository
+from src.repositories.transazione_repository import TransazioneRepository
+from src.services.cache_report import CacheReport, _codifica, _decodifica
+from src.services.report_generator import ReportGenerator
+
+
+def test_codifica_json_reversibile():
+    report = {(2024, None): {"periodo": "Anno 2024", "valori": [1, 2.5, None]},
+              2024: {"data": date(2024, 1, 31), "coppia": (1, "a")}}
+    assert _decodifica(json.loads(json.dumps(_codifica(report)))) == report
+
+
+def test_cache_persistente_scritta_solo_con_salva(database, tmp_path):
+    percorso = tmp_path / "cache_report.json"
+    conto = ContoRepository().create(ContoFinanziario(nome_conto="Conto report", saldo_iniziale=0.0))
+    TransazioneRepository().create(Transazione(data=date(2024, 2, 1), importo=-10.0, descrizione="Spesa",
+                                               id_categoria=1, id_conto_finanziario=conto.id_conto))
+    generatore = ReportGenerator(cache=CacheReport(percorso_file=str(percorso)))
+    periodi = generatore.generate_cash_flow_personale_periodi([2024])
+    portafoglio = generatore.generate_portafoglio_proprieta(2023, 2024)
+    assert not percorso.exists()
+    generatore.cache.salva()
+
+    # Una nuova sessione legge i report dal file
+    cache = CacheReport(percorso_file=str(percorso))
+    generatore = ReportGenerator(cache=cache)
+    assert generatore.generate_cash_flow_personale_periodi([2024]) == periodi
+    assert generatore.generate_portafoglio_proprieta(2023, 2024) == portafoglio
+    assert cache.statistiche()["hit"] == 2
+
+    # Dopo una scrittura i report salvati non valgono più
+    TransazioneRepository().create(Transazione(data=date(2024, 2, 2), importo=-5.0, descrizione="Altra spesa",
+                                               id_categoria=1, id_conto_finanziario=conto.id_conto))
+    generatore.generate_cash_flow_personale_periodi([2024])
+    assert cache.statistiche()["miss"] == 1
+
+
+def test_file_non_valido_ignorato(database, tmp_path):
+    percorso = tmp_path / "cache_report.json"
+    percorso.write_text("non è json")
+    assert CacheReport(percorso_file=str(percorso)).statistiche()["voci"] == 0
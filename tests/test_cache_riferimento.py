@@ -0,0 +1,111 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from src.models.categoria_transazione import CATEGORIE_PREDEFINITE, CategoriaTransazione
+from src.models.conto_finanziario import ContoFinanziario
+from src.models.transazione import Transazione
+from src.repositories.cache_riferimento import cache_riferimento
+from src.repositories.categoria_repository import CategoriaRepository
+from src.repositories.conto_repository import ContoRepository
+from src.repositories.transazione_repository import TransazioneRepository
+
+TABELLA = "categoria_transazione"
+
+
+def _contatori():
+    return cache_riferimento.statistiche()
+
+
+def _differenza(prima, dopo, chiave):
+    return dopo[chiave] - prima[chiave]
+
+
+def test_ricerche_per_id_nome_e_tipo_macro(database):
+    repo = CategoriaRepository()
+    categoria = repo.get_by_nome("Trasporti")
+    assert categoria is not None
+    assert repo.get_by_id(categoria.id_categoria).nome_categoria == "Trasporti"
+    assert repo.get_by_nome("Categoria inesistente") is None
+    assert repo.get_by_id(999999) is None
+
+    personali = repo.get_by_tipo_macro("Personale")
+    attese = sorted(nome for nome, tipo in CATEGORIE_PREDEFINITE if tipo == "Personale")
+    assert [c.nome_categoria for c in personali] == attese
+
+
+def test_contatori_hit_e_miss(database):
+    cache_riferimento.invalida(TABELLA)
+    prima = _contatori()
+    cache_riferimento.per_nome(TABELLA, "Trasporti")
+    cache_riferimento.per_id(TABELLA, 1)
+    cache_riferimento.per_tipo_macro(TABELLA, "Personale")
+    dopo = _contatori()
+    assert _differenza(prima, dopo, "miss") == 1
+    assert _differenza(prima, dopo, "hit") == 2
+    assert TABELLA in dopo["tabelle_caricate"]
+
+
+def test_le_copie_restituite_non_modificano_la_cache(database):
+    riga = cache_riferimento.per_nome(TABELLA, "Trasporti")
+    riga["nome_categoria"] = "Modificata"
+    assert cache_riferimento.per_nome(TABELLA, "Trasporti") is not None
+
+
+def test_scrittura_da_repository_invalida(database):
+    repo = CategoriaRepository()
+    assert repo.get_by_nome("Viaggi") is None
+    prima = _contatori()
+    nuova = repo.create(CategoriaTransazione(nome_categoria="Viaggi", tipo_macro="Personale"))
+    assert _differenza(prima, _contatori(), "invalidazioni") >= 1
+    assert TABELLA not in _contatori()["tabelle_caricate"]
+    assert repo.get_by_nome("Viaggi").id_categoria == nuova.id_categoria
+
+    nuova.nome_categoria = "Viaggi e Vacanze"
+    repo.update(nuova)
+    assert repo.get_by_nome("Viaggi") is None
+    assert repo.get_by_id(nuova.id_categoria).nome_categoria == "Viaggi e Vacanze"
+
+
+def test_commit_da_altra_connessione_invalida(database):
+    assert cache_riferimento.per_nome(TABELLA, "Trasporti") is not None
+    prima = _contatori()
+
+    esterna = sqlite3.connect(database.config.db_path)
+    try:
+        esterna.execute(
+            "UPDATE categoria_transazione SET nome_categoria = 'Mobilità' "
+            "WHERE nome_categoria = 'Trasporti'"
+        )
+        esterna.commit()
+    finally:
+        esterna.close()
+
+    assert cache_riferimento.per_nome(TABELLA, "Trasporti") is None
+    assert cache_riferimento.per_nome(TABELLA, "Mobilità") is not None
+    dopo = _contatori()
+    assert _differenza(prima, dopo, "invalidazioni_esterne") == 1
+    assert _differenza(prima, dopo, "miss") == 1
+
+
+def test_commit_su_altre_tabelle_non_invalida(database):
+    conto = ContoRepository().create(ContoFinanziario(nome_conto="Conto cache", saldo_iniziale=0.0))
+    cache_riferimento.per_nome(TABELLA, "Trasporti")
+    prima = _contatori()
+
+    # Il writer del pool è un'altra connessione rispetto a quella di data_version
+    TransazioneRepository().create(Transazione(
+        data=date(2024, 5, 1), importo=-10.0, descrizione="Biglietto",
+        id_categoria=1, id_conto_finanziario=conto.id_conto
+    ))
+
+    assert cache_riferimento.per_nome(TABELLA, "Trasporti") is not None
+    dopo = _contatori()
+    assert _differenza(prima, dopo, "invalidazioni_esterne") == 0
+    assert _differenza(prima, dopo, "miss") == 0
+
+
+def test_tabella_non_gestita(database):
+    with pytest.raises(ValueError):
+        cache_riferimento.tutte("transazione")
@@ -0,0 +1,75 @@
+from datetime import date
+
+import pytest
+
+from src.models.conto_finanziario import ContoFinanziario
+from src.models.transazione import Transazione
+from src.repositories.conto_repository import ContoRepository
+from src.repositories.transazione_repository import CriteriTransazione, TransazioneRepository
+
+
+@pytest.fixture
+def conto(database):
+    conto = ContoRepository().create(ContoFinanziario(nome_conto="Conto pagine", saldo_iniziale=0.0))
+    # Più transazioni nello stesso giorno: lo spareggio su id_transazione conta
+    TransazioneRepository().create_many([
+        Transazione(data=date(2024, 1 + i // 3, 1 + i % 2), importo=-(i + 1.0),
+                    descrizione=f"Movimento {i}", id_categoria=1,
+                    id_conto_finanziario=conto.id_conto)
+        for i in range(23)
+    ])
+    return conto
+
+
+def _tutte_le_pagine(repo, criteri, limite, discendente, con_dettagli=False):
+    pagine = []
+    cursore = None
+    while True:
+        pagina, cursore = repo.cerca_pagina(criteri, cursore, limite, discendente, con_dettagli)
+        pagine.append(pagina)
+        if cursore is None:
+            return pagine
+
+
+@pytest.mark.parametrize("discendente", [True, False])
+def test_pagine_coprono_tutte_le_transazioni_in_ordine(conto, discendente):
+    repo = TransazioneRepository()
+    criteri = CriteriTransazione(id_conto=conto.id_conto)
+    pagine = _tutte_le_pagine(repo, criteri, 5, discendente)
+
+    assert [len(p) for p in pagine] == [5, 5, 5, 5, 3]
+    chiavi = [(t.data, t.id_transazione) for p in pagine for t in p]
+    assert chiavi == sorted(chiavi, reverse=discendente)
+    assert len(set(chiavi)) == 23
+
+    ordina_per = "data DESC" if discendente else "data ASC"
+    attese = repo.cerca(CriteriTransazione(id_conto=conto.id_conto, ordina_per=ordina_per))
+    assert [id_t for _, id_t in chiavi] == [t.id_transazione for t in attese]
+
+
+def test_cursore_della_pagina_riprende_dalla_sua_ultima_riga(conto):
+    repo = TransazioneRepository()
+    criteri = CriteriTransazione(id_conto=conto.id_conto)
+    prima, cursore = repo.cerca_pagina(criteri, limite=4)
+    assert cursore == (prima[-1].data, prima[-1].id_transazione)
+    seconda, _ = repo.cerca_pagina(criteri, cursore, limite=4)
+    assert not {t.id_transazione for t in prima} & {t.id_transazione for t in seconda}
+
+
+def test_ultima_pagina_esatta_non_ha_cursore(conto):
+    repo = TransazioneRepository()
+    pagina, cursore = repo.cerca_pagina(CriteriTransazione(id_conto=conto.id_conto), limite=23)
+    assert len(pagina) == 23
+    assert cursore is None
+
+
+def test_filtri_e_dettagli_rispettati(conto):
+    repo = TransazioneRepository()
+    criteri = CriteriTransazione(id_conto=conto.id_conto, importo_max=-10.0,
+                                 ordina_per="importo", limite=1, offset=5)
+    pagine = _tutte_le_pagine(repo, criteri, 4, True, con_dettagli=True)
+    transazioni = [t for p in pagine for t in p]
+    # ordina_per, limite e offset dei criteri sono ignorati
+    assert len(transazioni) == repo.conta(criteri) == 14
+    assert all(t.importo <= -10.0 for t in transazioni)
+    assert all(t.conto is not None and t.conto.id_conto == conto.id_conto for t in transazioni)
@@ -0,0 +1,82 @@
+from datetime import date
+
+import pytest
+
+from src.models.conto_finanziario import ContoFinanziario
+from src.models.transazione import Transazione
+from src.repositories.conto_repository import ContoRepository
+from src.repositories.transazione_repository import CriteriTransazione, TransazioneRepository
+
+
+def test_clausola_where_vuota_senza_filtri():
+    assert CriteriTransazione().clausola_where() == ("", ())
+
+
+def test_clausola_where_parametrizzata_con_alias():
+    criteri = CriteriTransazione(data_inizio=date(2024, 1, 1), id_conto=3,
+                                 solo_uscite=True, importo_min=-100.0)
+    where, params = criteri.clausola_where("t")
+    assert where == ("t.data >= ? AND t.id_conto_finanziario = ? AND t.importo < 0 "
+                     "AND t.importo >= ?")
+    assert params == ("2024-01-01", 3, -100.0)
+
+
+def test_testo_con_caratteri_jolly_escapati():
+    where, params = CriteriTransazione(testo="100%_a\\b").clausola_where()
+    assert "ESCAPE" in where
+    assert params == ("%100\\%\\_a\\\\b%", "%100\\%\\_a\\\\b%")
+
+
+@pytest.mark.parametrize("ordina_per, atteso", [
+    ("data DESC", "data DESC, id_transazione DESC"),
+    ("importo", "importo ASC, id_transazione ASC"),
+    ("data asc, importo desc", "data ASC, importo DESC, id_transazione DESC"),
+    ("id_transazione DESC", "id_transazione DESC"),
+    (None, ""),
+])
+def test_clausola_ordine_ammessa(ordina_per, atteso):
+    assert CriteriTransazione(ordina_per=ordina_per).clausola_ordine() == atteso
+
+
+def test_clausola_ordine_con_alias():
+    assert CriteriTransazione(ordina_per="data").clausola_ordine("t") == "t.data ASC, t.id_transazione ASC"
+
+
+@pytest.mark.parametrize("ordina_per", [
+    "note_aggiuntive",
+    "data; DROP TABLE transazione",
+    "data DESC, (SELECT 1)",
+    "data SIDEWAYS",
+    "data DESC NULLS LAST",
+    "data,",
+])
+def test_clausola_ordine_rifiuta_colonne_e_direzioni_non_ammesse(ordina_per):
+    with pytest.raises(ValueError):
+        CriteriTransazione(ordina_per=ordina_per).clausola_ordine()
+
+
+def test_cerca_combina_i_filtri(database):
+    conto = ContoRepository().create(ContoFinanziario(nome_conto="Conto criteri", saldo_iniziale=0.0))
+    repo = TransazioneRepository()
+    repo.create_many([
+        Transazione(data=date(2024, 3, giorno), importo=importo, descrizione=descrizione,
+                    id_categoria=1, id_conto_finanziario=conto.id_conto)
+        for giorno, importo, descrizione in [
+            (1, 1200.0, "Stipendio"),
+            (5, -35.5, "Spesa 50% sconto"),
+            (9, -80.0, "Spesa supermercato"),
+            (20, -15.0, "Cinema"),
+        ]
+    ])
+
+    trovate = repo.cerca(CriteriTransazione(id_conto=conto.id_conto, solo_uscite=True,
+                                            testo="spesa", ordina_per="importo"))
+    assert [t.descrizione for t in trovate] == ["Spesa supermercato", "Spesa 50% sconto"]
+
+    # '%' nel testo è cercato letteralmente
+    trovate = repo.cerca(CriteriTransazione(id_conto=conto.id_conto, testo="50%"))
+    assert [t.descrizione for t in trovate] == ["Spesa 50% sconto"]
+
+    criteri = CriteriTransazione(id_conto=conto.id_conto, data_fine=date(2024, 3, 9))
+    assert repo.conta(criteri) == 3
+    assert repo.somma_importi(criteri) == pytest.approx(1200.0 - 35.5 - 80.0)
@@ -0,0 +1,88 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from src.database.database_connection import execute_query
+from src.ingestion.bper_integration import BPERImporter
+from src.models.conto_finanziario import ContoFinanziario
+from src.repositories import transazione_repository
+from src.repositories.conto_repository import ContoRepository
+from src.repositories.transazione_repository import TransazioneRepository
+
+SALDO_INIZIALE = 1000.0
+
+
+def _righe(numero: int) -> list:
+    return [{
+        'data_transazione': date(2024, 4, 1 + i % 28),
+        'data_valuta': date(2024, 4, 1 + i % 28),
+        'importo': -(i + 1.0),
+        'descrizione': f"PAGAMENTO POS NEGOZIO {i}",
+        'categoria_suggerita': 'Altro',
+    } for i in range(numero)]
+
+
+@pytest.fixture
+def importer(database):
+    return BPERImporter()
+
+
+@pytest.fixture
+def conto(database):
+    return ContoRepository().create(ContoFinanziario(nome_conto="Conto bulk", saldo_iniziale=SALDO_INIZIALE))
+
+
+def _importa(importer, righe, conto):
+    return importer._import_transactions_bulk(righe, conto.id_conto, importer._ensure_categories())
+
+
+def _audit_transazioni() -> int:
+    return execute_query("SELECT COUNT(*) AS n FROM audit_log WHERE tabella = 'transazione'")[0]["n"]
+
+
+def _verifica_nulla_importato(conto, audit_prima):
+    assert TransazioneRepository().get_by_conto_id(conto.id_conto) == []
+    assert ContoRepository().get_by_id(conto.id_conto).saldo_attuale == pytest.approx(SALDO_INIZIALE)
+    assert _audit_transazioni() == audit_prima
+
+
+def test_importazione_aggiorna_il_saldo_una_volta(importer, conto, monkeypatch):
+    variazioni = []
+    originale = importer.conto_repo.applica_variazioni_saldo
+    monkeypatch.setattr(importer.conto_repo, "applica_variazioni_saldo",
+                        lambda v: variazioni.append(v) or originale(v))
+    risultati = _importa(importer, _righe(30), conto)
+
+    assert risultati['importate'] == 30
+    assert variazioni == [{conto.id_conto: pytest.approx(-465.0)}]
+    assert risultati['saldo_conto'] == pytest.approx(SALDO_INIZIALE - 465.0)
+    assert len(TransazioneRepository().get_by_conto_id(conto.id_conto)) == 30
+
+
+def test_errore_sul_saldo_annulla_gli_inserimenti(importer, conto, monkeypatch):
+    audit_prima = _audit_transazioni()
+
+    def fallisce(variazioni):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(importer.conto_repo, "applica_variazioni_saldo", fallisce)
+
+    with pytest.raises(sqlite3.OperationalError):
+        _importa(importer, _righe(10), conto)
+    _verifica_nulla_importato(conto, audit_prima)
+
+
+def test_errore_sull_audit_annulla_inserimenti_e_saldo(importer, conto, monkeypatch):
+    audit_prima = _audit_transazioni()
+
+    def fallisce(*args, **kwargs):
+        raise sqlite3.OperationalError("disk I/O error")
+    monkeypatch.setattr(transazione_repository, "log_audit_many", fallisce)
+
+    with pytest.raises(sqlite3.OperationalError):
+        _importa(importer, _righe(10), conto)
+    _verifica_nulla_importato(conto, audit_prima)
+
+    # Rimosso l'errore, la stessa importazione va a buon fine
+    monkeypatch.undo()
+    assert _importa(importer, _righe(10), conto)['importate'] == 10
@@ -0,0 +1,129 @@
+from datetime import date
+
+import pytest
+
+from src.ingestion.bper_integration import BPERImporter
+from src.models.conto_finanziario import ContoFinanziario
+from src.models.transazione import Transazione
+from src.repositories.conto_repository import ContoRepository
+from src.repositories.transazione_repository import TransazioneRepository
+
+
+def _riga(giorno: int, importo: float, descrizione: str) -> dict:
+    return {
+        'data_transazione': date(2024, 3, giorno),
+        'data_valuta': date(2024, 3, giorno),
+        'importo': importo,
+        'descrizione': descrizione,
+        'categoria_suggerita': 'Altro',
+    }
+
+
+@pytest.fixture
+def importer(database):
+    return BPERImporter()
+
+
+@pytest.fixture
+def conto(database):
+    return ContoRepository().create(ContoFinanziario(nome_conto="Conto test", saldo_iniziale=1000.0))
+
+
+def _importa(importer, righe, conto, bulk=True):
+    categorie = importer._ensure_categories()
+    if bulk:
+        return importer._import_transactions_bulk(righe, conto.id_conto, categorie)
+    return importer._import_transactions(righe, conto.id_conto, categorie)
+
+
+@pytest.mark.parametrize("bulk", [True, False])
+def test_reimportazione_non_inserisce_nulla(importer, conto, bulk):
+    righe = [_riga(1, -20.0, "PAGAMENTO POS BAR"), _riga(2, 1500.0, "BONIFICO STIPENDIO")]
+    assert _importa(importer, righe, conto, bulk)['importate'] == 2
+
+    risultati = _importa(importer, righe, conto, bulk)
+    assert risultati['importate'] == 0
+    assert risultati['duplicate'] == 2
+    assert len(TransazioneRepository().get_by_conto_id(conto.id_conto)) == 2
+
+
+@pytest.mark.parametrize("bulk", [True, False])
+def test_righe_identiche_nello_stesso_estratto(importer, conto, bulk):
+    righe = [_riga(5, -2.5, "PAGAMENTO POS CAFFE"), _riga(5, -2.5, "PAGAMENTO POS CAFFE")]
+    assert _importa(importer, righe, conto, bulk)['importate'] == 2
+    # Lo stesso estratto riconosce entrambe le occorrenze
+    assert _importa(importer, righe, conto, bulk)['duplicate'] == 2
+    # Un estratto con una terza riga uguale importa solo quella
+    assert _importa(importer, righe + [_riga(5, -2.5, "PAGAMENTO POS CAFFE")], conto, bulk)['importate'] == 1
+
+
+@pytest.mark.parametrize("bulk", [True, False])
+def test_transazioni_senza_impronta_riconosciute(importer, conto, bulk):
+    riga = _riga(10, -45.9, "ADDEBITO SDD ITALIA POWER LUCE")
+    # Transazione inserita a mano, senza impronta
+    TransazioneRepository().create(Transazione(
+        data=riga['data_transazione'], importo=riga['importo'], descrizione=riga['descrizione'],
+        id_categoria=1, id_conto_finanziario=conto.id_conto
+    ))
+    risultati = _importa(importer, [riga, _riga(11, -10.0, "PREL. ATM")], conto, bulk)
+    assert risultati['importate'] == 1
+    assert risultati['duplicate'] == 1
+
+
+def test_saldo_varia_solo_per_le_righe_inserite(importer, conto):
+    repo = ContoRepository()
+    _importa(importer, [_riga(1, -20.0, "PAGAMENTO POS BAR")], conto)
+    saldo_prima = repo.get_by_id(conto.id_conto).saldo_attuale
+
+    righe = [_riga(1, -20.0, "PAGAMENTO POS BAR"), _riga(3, -30.0, "PAGAMENTO POS FARMACIA"),
+             _riga(4, 200.0, "BONIFICO RIMBORSO")]
+    risultati = _importa(importer, righe, conto)
+    assert risultati['importate'] == 2
+    assert risultati['saldo_conto'] == pytest.approx(saldo_prima + 170.0)
+    assert repo.get_by_id(conto.id_conto).saldo_attuale == pytest.approx(saldo_prima + 170.0)
+
+    # Nessuna riga nuova: il saldo non cambia
+    assert _importa(importer, righe, conto)['saldo_conto'] == pytest.approx(saldo_prima + 170.0)
+
+
+@pytest.mark.parametrize("bulk", [True, False])
+def test_righe_senza_data_segnalate_come_errori(importer, conto, bulk):
+    senza_data = [{**_riga(1, -5.0, "RIGA SENZA DATA"), 'data_transazione': None} for _ in range(2)]
+    risultati = _importa(importer, senza_data + [_riga(2, -7.0, "PAGAMENTO POS EDICOLA")], conto, bulk)
+    assert risultati['importate'] == 1
+    assert risultati['errori'] == 2
+
+
+def test_create_many_nuove_rifiuta_impronte_mancanti(conto):
+    transazione = Transazione(data=date(2024, 3, 1), importo=-1.0, descrizione="Test",
+                              id_categoria=1, id_conto_finanziario=conto.id_conto)
+    with pytest.raises(ValueError):
+        TransazioneRepository().create_many_nuove([transazione, transazione], [None, None])
+
+
+def test_importazione_riga_per_riga_legge_le_presenti_una_volta(importer, conto, monkeypatch):
+    righe = [_riga(giorno, -1.0 * giorno, f"PAGAMENTO POS {giorno}") for giorno in range(1, 11)]
+    _importa(importer, righe[:5], conto, bulk=False)
+
+    letture = []
+    originale = importer.transazione_repo.impronte_nel_periodo
+    monkeypatch.setattr(importer.transazione_repo, "impronte_nel_periodo",
+                        lambda *args: letture.append(args) or originale(*args))
+    risultati = _importa(importer, righe, conto, bulk=False)
+    assert len(letture) == 1
+    assert risultati['importate'] == 5
+    assert risultati['duplicate'] == 5
+
+
+def test_create_nuova_ignora_impronta_esistente(conto):
+    repo = TransazioneRepository()
+    impronta = TransazioneRepository.calcola_impronta(conto.id_conto, date(2024, 3, 1), None, -1.0, "Test")
+
+    def nuova():
+        return Transazione(data=date(2024, 3, 1), importo=-1.0, descrizione="Test",
+                           id_categoria=1, id_conto_finanziario=conto.id_conto)
+    creata = repo.create_nuova(nuova(), impronta)
+    assert creata.id_transazione is not None
+    assert repo.get_by_id(creata.id_transazione).descrizione == "Test"
+    assert repo.create_nuova(nuova(), impronta) is None
+    assert len(repo.get_by_conto_id(conto.id_conto)) == 1
@@ -0,0 +1,98 @@
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from src.database.database_connection import transaction
+from src.models.conto_finanziario import ContoFinanziario
+from src.models.transazione import Transazione
+from src.repositories.conto_repository import ContoRepository
+from src.repositories.transazione_repository import TransazioneRepository
+from src.services.isee_calculator import ISEECalculator
+
+
+def _transazione(id_conto: int, giorno: date, importo: float) -> Transazione:
+    return Transazione(data=giorno, importo=importo, descrizione=f"Movimento {giorno}",
+                       id_categoria=1, id_conto_finanziario=id_conto)
+
+
+@pytest.fixture
+def conti(database):
+    repo = ContoRepository()
+    primo = repo.create(ContoFinanziario(nome_conto="Conto ISEE", saldo_iniziale=1000.0))
+    secondo = repo.create(ContoFinanziario(nome_conto="Libretto", saldo_iniziale=0.0))
+    TransazioneRepository().create_many([
+        _transazione(primo.id_conto, date(2022, 12, 15), 100.0),   # saldo al 01/01/2023: 1100
+        _transazione(primo.id_conto, date(2023, 7, 2), 365.0),     # pesa 183 giorni
+        _transazione(primo.id_conto, date(2023, 12, 31), -200.0),  # pesa 1 giorno
+        _transazione(primo.id_conto, date(2024, 1, 1), -999.0),    # fuori anno
+        _transazione(secondo.id_conto, date(2023, 1, 1), 730.0),   # pesa tutti i 365 giorni
+    ])
+    return primo, secondo
+
+
+def test_giacenza_media_calcolata_a_mano(conti):
+    primo, secondo = conti
+    risultato = ISEECalculator().calcola([primo.id_conto, secondo.id_conto], 2023)
+
+    # (1100 * 365 + 365 * 183 - 200 * 1) / 365 = 468095 / 365 = 1282.45
+    assert risultato[primo.id_conto] == {
+        "anno": 2023,
+        "saldo_inizio_anno": 1100.0,
+        "saldo_fine_anno": 1265.0,
+        "giacenza_media": round((1100 * 365 + 365 * 183 - 200) / 365, 2),
+        "giorni": 365,
+    }
+    assert risultato[primo.id_conto]["giacenza_media"] == 1282.45
+    assert risultato[secondo.id_conto]["giacenza_media"] == 730.0
+    assert risultato[secondo.id_conto]["saldo_fine_anno"] == 730.0
+
+    totale = ISEECalculator().calcola_totale([primo.id_conto, secondo.id_conto], 2023)
+    assert totale["saldo_fine_anno"] == 1995.0
+    assert totale["giacenza_media"] == 2012.45
+
+
+def test_anno_bisestile(conti):
+    primo, _ = conti
+    risultato = ISEECalculator().calcola([primo.id_conto], 2024)[primo.id_conto]
+    assert risultato["giorni"] == 366
+    assert risultato["saldo_inizio_anno"] == 1265.0
+    # -999 dal primo giorno: pesa tutto l'anno
+    assert risultato["giacenza_media"] == 266.0
+
+
+def test_confronto_con_estratto(conti):
+    primo, _ = conti
+    confronto = ISEECalculator().confronta_con_estratto(
+        primo.id_conto, {"anno": 2023, "giacenza_media": 1282.40, "saldo_fine_anno": 1265.0}
+    )
+    assert confronto["scostamento_giacenza_media"] == 0.05
+    assert confronto["scostamento_saldo_fine_anno"] == 0.0
+    assert not confronto["coerente"]
+    with pytest.raises(ValueError):
+        ISEECalculator().confronta_con_estratto(primo.id_conto, {})
+
+
+def test_calcolo_non_attende_una_scrittura_in_corso(conti):
+    primo, secondo = conti
+    calcolatore = ISEECalculator()
+    atteso = calcolatore.calcola([primo.id_conto, secondo.id_conto], 2023)
+
+    in_scrittura, fine = threading.Event(), threading.Event()
+
+    def import_in_corso():
+        with transaction():
+            in_scrittura.set()
+            fine.wait(2.0)
+
+    thread = threading.Thread(target=import_in_corso)
+    thread.start()
+    try:
+        assert in_scrittura.wait(2.0)
+        inizio = time.monotonic()
+        assert calcolatore.calcola([primo.id_conto, secondo.id_conto], 2023) == atteso
+        assert time.monotonic() - inizio < 1.0
+    finally:
+        fine.set()
+        thread.join()
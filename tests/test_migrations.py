@@ -0,0 +1,45 @@
+import sqlite3
+
+import pytest
+
+from src.database.database_connection import execute_query, transaction
+from src.database.migrations import apply_migration, get_current_schema_version, migrate_to_latest
+
+
+def _tabelle():
+    return {r["name"] for r in execute_query("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_migrazione_interrotta_non_lascia_modifiche(database):
+    versione = get_current_schema_version()
+    with pytest.raises(sqlite3.OperationalError):
+        apply_migration(versione + 1, """
+            CREATE TABLE migrazione_di_prova (id INTEGER);
+            ALTER TABLE transazione ADD COLUMN colonna_di_prova TEXT;
+            SELECT * FROM tabella_inesistente;
+        """, "Migrazione che fallisce a metà")
+
+    assert "migrazione_di_prova" not in _tabelle()
+    colonne = {r["name"] for r in execute_query("PRAGMA table_info(transazione)")}
+    assert "colonna_di_prova" not in colonne
+    assert get_current_schema_version() == versione
+
+    # Ripetuta dopo la correzione, la stessa migrazione si applica senza errori
+    apply_migration(versione + 1, """
+        CREATE TABLE migrazione_di_prova (id INTEGER);
+        ALTER TABLE transazione ADD COLUMN colonna_di_prova TEXT;
+    """, "Migrazione con l'apostrofo dell'esempio")
+    assert "migrazione_di_prova" in _tabelle()
+    assert get_current_schema_version() == versione + 1
+
+
+def test_migrazioni_idempotenti(database):
+    versione = get_current_schema_version()
+    migrate_to_latest()
+    assert get_current_schema_version() == versione
+
+
+def test_migrazione_rifiutata_dentro_una_transazione(database):
+    with pytest.raises(RuntimeError):
+        with transaction():
+            apply_migration(get_current_schema_version() + 1, "SELECT 1;", "Dentro una transazione")
@@ -0,0 +1,91 @@
+import sqlite3
+import threading
+
+import pytest
+
+from src.database.database_connection import iter_query, transaction
+
+
+def _in_altro_thread(funzione):
+    risultato = []
+    thread = threading.Thread(target=lambda: risultato.append(funzione()))
+    thread.start()
+    thread.join()
+    return risultato[0]
+
+
+def test_lettore_resta_al_generatore_oltre_la_scope_esterna(database):
+    pool = database.pool
+    with pool.connection(readonly=True) as esterna:
+        righe = iter_query("SELECT id_categoria FROM categoria_transazione", dimensione_blocco=1)
+        next(righe)
+
+    # Il generatore ha ancora un cursore aperto: il lettore non è tornato al pool
+    def prendi_lettore():
+        with pool.connection(readonly=True) as conn:
+            return conn
+    assert _in_altro_thread(prendi_lettore) is not esterna
+    assert len(list(righe)) > 0
+
+    # Esaurito il generatore, entrambi i lettori sono di nuovo liberi
+    stats = pool.stats()
+    assert stats["lettori_aperti"] == 2
+    assert stats["lettori_liberi"] == 2
+
+
+def test_lettura_annidata_chiusa_dopo_la_esterna(database):
+    pool = database.pool
+    esterna = pool.connection(readonly=True)
+    conn = esterna.__enter__()
+    annidata = pool.connection(readonly=True)
+    assert annidata.__enter__() is conn
+    esterna.__exit__(None, None, None)
+    assert pool.stats()["lettori_liberi"] == 0
+    annidata.__exit__(None, None, None)
+    assert pool.stats()["lettori_liberi"] == 1
+    # Una nuova richiesta riparte da zero e riottiene un lettore libero
+    with pool.connection(readonly=True) as di_nuovo:
+        assert di_nuovo is conn
+
+
+def test_get_connection_non_condivide_il_writer(database):
+    with pytest.warns(DeprecationWarning):
+        legacy = database.get_connection()
+    with transaction() as writer:
+        assert writer is not legacy
+        # Il writer resta in uso esclusivo: un altro thread non lo ottiene
+        assert not database.pool._writer_lock.acquire(blocking=False)
+
+
+def test_close_dal_thread_con_il_writer_solleva(database):
+    pool = database.pool
+    with transaction():
+        with pytest.raises(sqlite3.ProgrammingError):
+            pool.close()
+    # Il pool non è stato chiuso e resta utilizzabile
+    with pool.connection(readonly=True) as conn:
+        assert conn.execute("SELECT 1").fetchone()[0] == 1
+
+
+def test_close_attende_il_writer_al_massimo_timeout(database):
+    pool = database.pool
+    pool.config.timeout = 0.1
+    preso = threading.Event()
+    fine = threading.Event()
+
+    def tieni_writer():
+        with pool.connection():
+            preso.set()
+            fine.wait()
+
+    thread = threading.Thread(target=tieni_writer)
+    thread.start()
+    preso.wait()
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            pool.close()
+    finally:
+        fine.set()
+        thread.join()
+    pool.close()
+    assert pool.stats()["lettori_aperti"] == 0
@@ -0,0 +1,121 @@
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from src.database.database_connection import transaction
+
+from src.models.conto_finanziario import ContoFinanziario
+from src.models.transazione import Transazione
+from src.repositories.conto_repository import ContoRepository
+from src.repositories.saldo_checkpoint_repository import SaldoCheckpointRepository
+from src.repositories.transazione_repository import TransazioneRepository
+from src.services.storico_saldi import StoricoSaldi
+
+SALDO_INIZIALE = 1000.0
+# Una transazione al giorno 10 di ogni mese del 2024
+IMPORTI = {mese: (-50.0 * mese if mese % 3 else 400.0) for mese in range(1, 13)}
+
+
+@pytest.fixture
+def conto(database):
+    conto = ContoRepository().create(ContoFinanziario(nome_conto="Conto storico", saldo_iniziale=SALDO_INIZIALE))
+    TransazioneRepository().create_many([
+        Transazione(data=date(2024, mese, 10), importo=importo, descrizione=f"Movimento {mese}",
+                    id_categoria=1, id_conto_finanziario=conto.id_conto)
+        for mese, importo in IMPORTI.items()
+    ])
+    return conto
+
+
+def _saldo_atteso(id_conto: int, giorno: date) -> float:
+    """Saldo ricalcolato da zero, senza checkpoint."""
+    transazioni = TransazioneRepository().get_by_conto_id(id_conto)
+    return round(SALDO_INIZIALE + sum(t.importo for t in transazioni if t.data <= giorno), 2)
+
+
+def _verifica_saldi(storico: StoricoSaldi, id_conto: int):
+    for mese in (3, 6, 9, 12):
+        giorno = date(2024, mese, 28)
+        assert storico.saldo_al(id_conto, giorno) == pytest.approx(_saldo_atteso(id_conto, giorno))
+    serie = storico.serie_giornaliera(id_conto, date(2024, 11, 1), date(2024, 11, 30))
+    assert [s for _, s in serie] == pytest.approx([_saldo_atteso(id_conto, g) for g, _ in serie])
+
+
+def _materializza(storico: StoricoSaldi, id_conto: int):
+    _verifica_saldi(storico, id_conto)
+    assert SaldoCheckpointRepository().get_by_conto(id_conto)
+
+
+def test_transazione_retrodatata_invalida_i_checkpoint_successivi(conto):
+    storico = StoricoSaldi()
+    _materializza(storico, conto.id_conto)
+
+    TransazioneRepository().create(Transazione(
+        data=date(2024, 2, 15), importo=-333.33, descrizione="Retrodatata",
+        id_categoria=1, id_conto_finanziario=conto.id_conto
+    ))
+    # Restano solo i checkpoint precedenti al mese della transazione
+    assert all(mese < "2024-02" for mese, _ in SaldoCheckpointRepository().get_by_conto(conto.id_conto))
+    _verifica_saldi(storico, conto.id_conto)
+
+
+@pytest.mark.parametrize("modifica", ["importo", "data_precedente", "data_successiva", "conto"])
+def test_modifica_aggiorna_i_saldi_dei_mesi_successivi(conto, modifica):
+    storico = StoricoSaldi()
+    repo = TransazioneRepository()
+    altro = ContoRepository().create(ContoFinanziario(nome_conto="Altro conto", saldo_iniziale=SALDO_INIZIALE))
+    repo.create(Transazione(data=date(2024, 1, 5), importo=10.0, descrizione="Apertura",
+                            id_categoria=1, id_conto_finanziario=altro.id_conto))
+    _materializza(storico, conto.id_conto)
+    _materializza(storico, altro.id_conto)
+
+    transazione = next(t for t in repo.get_by_conto_id(conto.id_conto) if t.data.month == 5)
+    if modifica == "importo":
+        transazione.importo = 1234.56
+    elif modifica == "data_precedente":
+        transazione.data = date(2024, 1, 20)
+    elif modifica == "data_successiva":
+        transazione.data = date(2024, 10, 20)
+    else:
+        transazione.id_conto_finanziario = altro.id_conto
+    repo.update(transazione)
+
+    _verifica_saldi(storico, conto.id_conto)
+    _verifica_saldi(storico, altro.id_conto)
+
+
+def test_eliminazione_aggiorna_i_saldi_dei_mesi_successivi(conto):
+    storico = StoricoSaldi()
+    repo = TransazioneRepository()
+    _materializza(storico, conto.id_conto)
+
+    transazione = next(t for t in repo.get_by_conto_id(conto.id_conto) if t.data.month == 4)
+    assert repo.delete(transazione.id_transazione)
+    _verifica_saldi(storico, conto.id_conto)
+
+
+def test_letture_non_attendono_una_scrittura_in_corso(conto):
+    storico = StoricoSaldi()
+    _materializza(storico, conto.id_conto)
+    atteso = _saldo_atteso(conto.id_conto, date(2024, 8, 31))
+
+    in_scrittura, fine = threading.Event(), threading.Event()
+
+    def import_in_corso():
+        with transaction():
+            in_scrittura.set()
+            fine.wait(2.0)
+
+    thread = threading.Thread(target=import_in_corso)
+    thread.start()
+    try:
+        assert in_scrittura.wait(2.0)
+        inizio = time.monotonic()
+        assert storico.saldo_al(conto.id_conto, date(2024, 8, 31)) == pytest.approx(atteso)
+        assert len(storico.serie_giornaliera(conto.id_conto, date(2024, 8, 1), date(2024, 8, 31))) == 31
+        assert time.monotonic() - inizio < 1.0
+    finally:
+        fine.set()
+        thread.join()
@@ -0,0 +1,79 @@
+import pytest
+
+from src.database.database_connection import (
+    execute_non_query, execute_query, in_transaction, transaction
+)
+
+
+def _inserisci(nome: str):
+    execute_non_query(
+        "INSERT INTO categoria_transazione (nome_categoria, tipo_macro) VALUES (?, 'Personale')", (nome,)
+    )
+
+
+def _presenti(*nomi: str) -> set:
+    righe = execute_query(
+        f"SELECT nome_categoria FROM categoria_transazione WHERE nome_categoria IN ({', '.join('?' for _ in nomi)})",
+        nomi
+    )
+    return {r["nome_categoria"] for r in righe}
+
+
+class Errore(Exception):
+    pass
+
+
+def test_errore_interno_annulla_solo_il_savepoint(database):
+    with transaction():
+        _inserisci("Esterna")
+        with pytest.raises(Errore):
+            with transaction():
+                _inserisci("Interna")
+                raise Errore()
+        _inserisci("Dopo")
+    assert _presenti("Esterna", "Interna", "Dopo") == {"Esterna", "Dopo"}
+
+
+def test_errore_esterno_annulla_tutto(database):
+    with pytest.raises(Errore):
+        with transaction():
+            _inserisci("Esterna")
+            with transaction():
+                _inserisci("Interna")
+            raise Errore()
+    assert _presenti("Esterna", "Interna") == set()
+
+
+def test_annidata_senza_savepoint_si_unisce_alla_esterna(database):
+    with pytest.raises(Errore):
+        with transaction():
+            _inserisci("Esterna")
+            with transaction(savepoint=False):
+                _inserisci("Interna")
+            raise Errore()
+    assert _presenti("Esterna", "Interna") == set()
+
+
+def test_profondita_ripristinata_dopo_un_errore(database):
+    assert not in_transaction()
+    with transaction():
+        with pytest.raises(Errore):
+            with transaction():
+                with transaction():
+                    raise Errore()
+        assert in_transaction()
+        # Un nuovo savepoint dopo l'errore funziona e viene confermato
+        with transaction():
+            _inserisci("Ripresa")
+    assert not in_transaction()
+    assert _presenti("Ripresa") == {"Ripresa"}
+
+    with pytest.raises(Errore):
+        with transaction():
+            raise Errore()
+    assert not in_transaction()
+    # La connessione di scrittura non è rimasta in una transazione aperta
+    with transaction() as conn:
+        _inserisci("Successiva")
+    assert not conn.in_transaction
+    assert _presenti("Successiva") == {"Successiva"}